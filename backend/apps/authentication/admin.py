@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, GDPRRecord, AuditLog, LoginAttempt
+from .models import UserProfile, GDPRRecord, AuditLog, LoginAttempt, UserAgent, ErasureRequest
 
 
 class UserProfileInline(admin.StackedInline):
@@ -22,7 +22,7 @@ class GDPRRecordAdmin(admin.ModelAdmin):
     list_display = ('user', 'consent_type', 'consent_given', 'consent_date', 'ip_address')
     list_filter = ('consent_type', 'consent_given', 'consent_date')
     search_fields = ('user__username', 'user__email')
-    readonly_fields = ('consent_date', 'ip_address', 'user_agent')
+    readonly_fields = ('consent_date', 'ip_address', 'user_agent', 'user_agent_ref')
     ordering = ('-consent_date',)
 
 
@@ -31,7 +31,7 @@ class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'action', 'model_name', 'object_repr', 'timestamp', 'ip_address')
     list_filter = ('action', 'model_name', 'timestamp')
     search_fields = ('user__username', 'object_repr', 'ip_address')
-    readonly_fields = ('id', 'timestamp', 'ip_address', 'user_agent', 'session_key')
+    readonly_fields = ('id', 'timestamp', 'ip_address', 'user_agent', 'user_agent_ref', 'session_key')
     ordering = ('-timestamp',)
     
     def has_add_permission(self, request):
@@ -49,7 +49,7 @@ class LoginAttemptAdmin(admin.ModelAdmin):
     list_display = ('username', 'ip_address', 'successful', 'timestamp', 'failure_reason')
     list_filter = ('successful', 'timestamp')
     search_fields = ('username', 'ip_address')
-    readonly_fields = ('timestamp', 'user_agent')
+    readonly_fields = ('timestamp', 'user_agent', 'user_agent_ref')
     ordering = ('-timestamp',)
     
     def has_add_permission(self, request):
@@ -60,4 +60,23 @@ class LoginAttemptAdmin(admin.ModelAdmin):
 
 
 admin.site.unregister(User)
-admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(User, CustomUserAdmin)
+
+
+@admin.register(UserAgent)
+class UserAgentAdmin(admin.ModelAdmin):
+    list_display = ('user_agent', 'created_at')
+    search_fields = ('user_agent',)
+    readonly_fields = ('user_agent_hash', 'user_agent', 'created_at')
+    ordering = ('-created_at',)
+
+
+@admin.register(ErasureRequest)
+class ErasureRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'requested_at', 'completed_at')
+    list_filter = ('status', 'requested_at')
+    readonly_fields = ('user', 'username', 'progress', 'error', 'requested_at', 'started_at', 'completed_at', 'updated_at')
+    ordering = ('-requested_at',)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,220 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .models import AuditLog
+from .utils import get_client_ip, intern_user_agent
+
+logger = logging.getLogger(__name__)
+
+# Put on the queue by shutdown() to wake a writer thread waiting for a batch
+_WAKE = object()
+
+
+class AuditLogWriter:
+    """
+    Writes AuditLog entries off the request path.
+
+    In 'async' mode entries go on a bounded queue that a background thread
+    drains with bulk_create once BATCH_SIZE entries are waiting or
+    FLUSH_INTERVAL seconds have passed. 'sync' mode writes inline. ON_FULL
+    picks what happens when the queue is full: 'block', 'drop' or 'inline'.
+    In 'async' mode the counters from stats() are logged every
+    STATS_INTERVAL seconds while entries are being written, and once more
+    at shutdown.
+    """
+
+    def __init__(self, mode='async', queue_size=10000, batch_size=200, flush_interval=2.0, on_full='inline',
+                 stats_interval=300.0):
+        self.mode = mode
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_full = on_full
+        self.stats_interval = stats_interval
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._reported = None
+
+    def write(self, entry):
+        if self.mode != 'async':
+            self._write_batch([entry])
+            return
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.on_full == 'block':
+                self._queue.put(entry)
+            elif self.on_full == 'drop':
+                with self._lock:
+                    self.dropped += 1
+            else:
+                self._write_batch([entry])
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is not _WAKE:
+                    batch.append(entry)
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    def shutdown(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            try:
+                self._queue.put_nowait(_WAKE)
+            except queue.Full:
+                # A full queue means the thread is not waiting for entries
+                pass
+            self._thread.join(timeout)
+        self.flush()
+        if self.mode == 'async':
+            self.log_stats()
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+        }
+
+    def log_stats(self):
+        """Log stats() unless nothing was written, dropped or failed since the last report"""
+        counters = (self.written, self.dropped, self.failed)
+        if counters == self._reported or not any(counters):
+            return
+        self._reported = counters
+        logger.info(f"Audit log writer: {self.stats()}")
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Forked worker: the parent's queue and thread are not ours
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_report = time.monotonic() + self.stats_interval
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                close_old_connections()
+                self._write_batch(batch)
+            if self.stats_interval and time.monotonic() >= next_report:
+                self.log_stats()
+                next_report = time.monotonic() + self.stats_interval
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _WAKE:
+                break
+            batch.append(entry)
+        return batch
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            AuditLog.objects.bulk_create(batch)
+            written, failed = len(batch), 0
+        except Exception:
+            # One bad entry should not take the whole batch down with it
+            written, failed = 0, 0
+            for entry in batch:
+                try:
+                    AuditLog.objects.bulk_create([entry])
+                    written += 1
+                except Exception:
+                    failed += 1
+                    logger.exception(f"Failed to write audit log entry: {entry.action} {entry.model_name}")
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            self.flushes += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        logger.debug(f"Flushed {written} audit log entries in {elapsed_ms:.1f}ms")
+
+
+def build_audit_entry(request, data):
+    """Build an unsaved AuditLog from the data recorded by log_audit_event"""
+    user = data.get('user')
+    if user is None:
+        user = getattr(request, 'user', None)
+    object_id = data.get('object_id')
+
+    return AuditLog(
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        action=data.get('action'),
+        model_name=data.get('model_name'),
+        object_id=str(object_id) if object_id is not None else None,
+        object_repr=str(data.get('object_repr') or '')[:200],
+        changes=data.get('changes', {}),
+        ip_address=get_client_ip(request),
+        user_agent_ref_id=intern_user_agent(request.META.get('HTTP_USER_AGENT', '')),
+        # Read the cookie rather than request.session so the session is never loaded
+        session_key=request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')[:40],
+    )
+
+
+_config = getattr(settings, 'AUDIT_LOG', {})
+
+audit_writer = AuditLogWriter(
+    mode=_config.get('MODE', 'async'),
+    queue_size=_config.get('QUEUE_SIZE', 10000),
+    batch_size=_config.get('BATCH_SIZE', 200),
+    flush_interval=_config.get('FLUSH_INTERVAL', 2.0),
+    on_full=_config.get('ON_FULL', 'inline'),
+    stats_interval=_config.get('STATS_INTERVAL', 300.0),
+)
+
+atexit.register(audit_writer.shutdown)
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .user_cache import get_version, user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that accepts the access token cookie, reuses the result
+    JWTCookieMiddleware already computed for the request, and loads users
+    through the per-worker user cache
+    """
+
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            return super().authenticate(request)
+        return self.authenticate_cookie(request)
+
+    def authenticate_cookie(self, request):
+        django_request = getattr(request, '_request', request)
+        if hasattr(django_request, '_jwt_cookie_auth'):
+            return django_request._jwt_cookie_auth
+
+        raw_token = request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE'])
+        if not raw_token:
+            return None
+        return self.authenticate_token(raw_token)
+
+    def authenticate_token(self, raw_token):
+        validated_token = self.get_validated_token(raw_token)
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            # Read before loading: a change saved during the load then leaves
+            # the entry stale-versioned instead of caching the old user
+            version = get_version(user_id)
+            # Inactive or missing users raise here and are never cached
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user, version)
+            return user
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+import zipfile
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from apps.nextcrm.exports import ChunkSink
+from apps.nextcrm.models import Contract, ContractAmendment
+from .models import AuditLog, GDPRRecord, LoginAttempt, UserProfile
+
+_config = getattr(settings, 'GDPR_EXPORT', {})
+CHUNK_SIZE = _config.get('CHUNK_SIZE', 2000)
+# Exports with more history rows than this run as a background job
+INLINE_MAX_ROWS = _config.get('INLINE_MAX_ROWS', 20000)
+STORAGE_DIR = str(_config.get('STORAGE_DIR', os.path.join(settings.BASE_DIR, 'var', 'gdpr_exports')))
+TOKEN_MAX_AGE = _config.get('TOKEN_MAX_AGE', 86400)
+FLUSH_BYTES = 64 * 1024
+
+TOKEN_SALT = 'apps.authentication.data_export'
+
+
+def _user_agent(row):
+    # New rows point at the interned UserAgent, older rows carry the text
+    interned = row.pop('user_agent_ref__user_agent', None)
+    row['user_agent'] = interned or row.get('user_agent', '')
+    return row
+
+
+# file name -> (queryset for user, fields, row hook)
+SECTIONS = (
+    ('account.jsonl', lambda user: type(user).objects.filter(pk=user.pk), (
+        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'last_login',
+    ), None),
+    ('profile.jsonl', lambda user: UserProfile.objects.filter(user=user), (
+        'phone', 'company', 'position', 'timezone', 'gdpr_consent', 'gdpr_consent_date',
+        'gdpr_consent_ip', 'is_mfa_enabled', 'last_login_ip', 'created_at', 'updated_at',
+    ), None),
+    ('gdpr_records.jsonl', lambda user: GDPRRecord.objects.filter(user=user).order_by('consent_date', 'id'), (
+        'consent_type', 'consent_given', 'consent_date', 'withdrawal_date', 'ip_address',
+        'user_agent', 'user_agent_ref__user_agent',
+    ), _user_agent),
+    ('audit_logs.jsonl', lambda user: AuditLog.objects.filter(user=user).order_by('timestamp', 'id'), (
+        'timestamp', 'action', 'model_name', 'object_id', 'object_repr', 'changes', 'ip_address',
+        'user_agent', 'user_agent_ref__user_agent',
+    ), _user_agent),
+    ('login_attempts.jsonl', lambda user: LoginAttempt.objects.filter(username=user.username).order_by('timestamp', 'id'), (
+        'timestamp', 'successful', 'failure_reason', 'ip_address', 'user_agent', 'user_agent_ref__user_agent',
+    ), _user_agent),
+    ('contracts.jsonl', lambda user: Contract.objects.filter(
+        Q(created_by=user) | Q(updated_by=user) | Q(approved_by=user)
+    ).order_by('created_at', 'id'), (
+        'id', 'contract_number', 'status', 'contract_date', 'counterparty__counterparty_name',
+        'commodity__commodity_name_short', 'quantity', 'unit_of_measure', 'price', 'total_value',
+        'created_by_id', 'updated_by_id', 'approved_by_id', 'approval_date', 'created_at', 'updated_at',
+    ), None),
+    ('contract_amendments.jsonl', lambda user: ContractAmendment.objects.filter(
+        Q(requested_by=user) | Q(approved_by=user)
+    ).order_by('created_at', 'id'), (
+        'id', 'contract__contract_number', 'amendment_number', 'amendment_type', 'description',
+        'old_values', 'new_values', 'requested_by_id', 'approved_by_id', 'approval_date', 'created_at',
+    ), None),
+)
+
+
+def history_size(user):
+    """Rows in the unbounded sections, to decide between inline and background"""
+    return (
+        AuditLog.objects.filter(user=user).count()
+        + LoginAttempt.objects.filter(username=user.username).count()
+    )
+
+
+def stream_export(user, on_section=None):
+    """
+    Zip of one JSONL file per section, yielded in chunks. Each section is read
+    with iterator(), so memory does not grow with the user's history.
+    `on_section(index, name)` is called as each section starts.
+    """
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, (name, queryset, fields, hook) in enumerate(SECTIONS):
+            if on_section is not None:
+                on_section(index, name)
+            with archive.open(name, 'w', force_zip64=True) as part:
+                for row in queryset(user).values(*fields).iterator(chunk_size=CHUNK_SIZE):
+                    if hook is not None:
+                        row = hook(row)
+                    part.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n')
+                    if sink.size >= FLUSH_BYTES:
+                        yield sink.drain()
+        archive.writestr('README.txt', (
+            f"Personal data export for {user.username}, generated {timezone.now().isoformat()}.\n"
+            "Each .jsonl file holds one JSON object per line.\n"
+        ))
+    yield sink.drain()
+
+
+def export_filename(user):
+    return f"data-export-{user.pk}-{timezone.now():%Y%m%d}.zip"
+
+
+def _path(export_id):
+    return os.path.join(STORAGE_DIR, f"{export_id}.zip")
+
+
+def make_download_token(export_id, user_id):
+    return signing.dumps({'export': export_id, 'user': user_id}, salt=TOKEN_SALT)
+
+
+def read_download_token(token):
+    """(export_id, user_id), or None when the token is forged or expired"""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return data['export'], data['user']
+
+
+def export_file(export_id):
+    path = _path(export_id)
+    return path if os.path.exists(path) else None
+
+
+def prune_exports():
+    """Remove export files whose download tokens have expired"""
+    cutoff = time.time() - TOKEN_MAX_AGE
+    try:
+        entries = list(os.scandir(STORAGE_DIR))
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for entry in entries:
+        if entry.name.endswith(('.zip', '.part')) and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def build_export(export_id, user, on_section=None):
+    """
+    Write the export to STORAGE_DIR and return its download token. Runs as
+    the gdpr_export job, see apps.authentication.jobs.
+    """
+    os.makedirs(STORAGE_DIR, exist_ok=True)
+    temporary = _path(export_id) + '.part'
+    try:
+        # The file holds personal data: owner-only permissions
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, 'wb') as handle:
+            for chunk in stream_export(user, on_section):
+                handle.write(chunk)
+        os.replace(temporary, _path(export_id))
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return make_download_token(export_id, user.pk)
@@ -1,9 +1,11 @@
 import json
 import logging
+import random
+import threading
 import time
-from collections import defaultdict
-from django.http import JsonResponse
+from collections import OrderedDict
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils.deprecation import MiddlewareMixin
 import jwt
 from datetime import datetime
@@ -14,16 +16,53 @@ class CORSDebugMiddleware(MiddlewareMixin):
     """
     Detailed CORS debugging middleware to identify exactly what's happening
     Includes rate limiting to prevent log flooding from repeated errors
+
+    Configured by settings.CORS_DEBUG. When disabled the middleware removes
+    itself from the chain at startup. When enabled only a sample of requests
+    is inspected (SAMPLE_RATE, overridden per path prefix by
+    PATH_SAMPLE_RATES), suppression state is a bounded LRU of
+    MAX_TRACKED_KEYS entries, and the analysis is only built for requests
+    that are actually logged.
     """
     
-    # Class-level cache for tracking repeated errors
-    _error_cache = defaultdict(list)
-    _suppressed_logs = defaultdict(int)
-    _max_repeats = 3
-    _time_window = 60  # 60 seconds
+    def __init__(self, get_response):
+        config = getattr(settings, 'CORS_DEBUG', {})
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed('CORS debugging is disabled')
+        super().__init__(get_response)
+
+        self.sample_rate = config.get('SAMPLE_RATE', 1.0)
+        # Longest prefix first so the most specific rate wins
+        self.path_sample_rates = sorted(
+            config.get('PATH_SAMPLE_RATES', {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.max_tracked_keys = config.get('MAX_TRACKED_KEYS', 1024)
+        self._max_repeats = config.get('MAX_REPEATS', 3)
+        self._time_window = config.get('TIME_WINDOW', 60)
+
+        # key -> [window_start, count_in_window, suppressed_in_window]
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _sampled(self, path):
+        rate = self.sample_rate
+        for prefix, prefix_rate in self.path_sample_rates:
+            if path.startswith(prefix):
+                rate = prefix_rate
+                break
+        return rate >= 1 or random.random() < rate
     
     def process_request(self, request):
         """Log all incoming request details"""
+        if not logger.isEnabledFor(logging.INFO) or not self._sampled(request.path):
+            return
+
+        # Mark the request as sampled; process_response builds its details lazily
+        request._cors_debug_sampled = True
+        if self._should_log_request(request.path, request.method):
+            logger.info(f"🔍 CORS DEBUG REQUEST: {json.dumps(self._request_info(request), indent=2)}")
+    
+    def _request_info(self, request):
         debug_info = {
             'method': request.method,
             'path': request.path,
@@ -68,19 +107,39 @@ class CORSDebugMiddleware(MiddlewareMixin):
         
         # Debug: Log all parsed cookies
         debug_info['all_parsed_cookies'] = list(request.COOKIES.keys())
-        
-        # Only log if not suppressed
-        should_log = self._should_log_request(request.path, request.method)
-        if should_log:
-            logger.info(f"🔍 CORS DEBUG REQUEST: {json.dumps(debug_info, indent=2)}")
-        
-        # Store debug info for later use
-        request._cors_debug_info = debug_info
+        return debug_info
         
     def process_response(self, request, response):
         """Log all outgoing response details"""
-        debug_info = getattr(request, '_cors_debug_info', {})
+        if not getattr(request, '_cors_debug_sampled', False):
+            return response
+
+        count, suppressed = self._hit(f"{response.status_code}:{request.path}")
+
+        # If this is the first auth error in this window, add detailed JWT analysis
+        if response.status_code == 401 and count == 1:
+            jwt_analysis = self._analyze_jwt_token({'request': self._request_info(request)}, request)
+            logger.info(f"🔐 JWT TOKEN ANALYSIS: {json.dumps(jwt_analysis, indent=2)}")
         
+        # Check if we should suppress repeated errors
+        if count > self._max_repeats:
+            if suppressed == 1:  # First time suppressing
+                logger.warning(f"🔁 Repeated authentication failure detected for {request.path} (status {response.status_code}). "
+                             f"Logging suppressed temporarily. Total occurrences: {count}")
+            return response
+        
+        debug_info = self._request_info(request)
+        response_info = self._response_info(response)
+        combined_info = {
+            'request': debug_info,
+            'response': response_info,
+            'analysis': self._analyze_cors_issue(debug_info, response_info)
+        }
+        logger.info(f"📤 CORS DEBUG RESPONSE: {json.dumps(combined_info, indent=2)}")
+        
+        return response
+    
+    def _response_info(self, response):
         response_info = {
             'status_code': response.status_code,
             'content_type': response.get('Content-Type', 'Not set'),
@@ -107,19 +166,7 @@ class CORSDebugMiddleware(MiddlewareMixin):
         for header in other_headers:
             if header in response:
                 response_info['response_headers'][header] = 'Present' if response[header] else 'Empty'
-        
-        combined_info = {
-            'request': debug_info,
-            'response': response_info,
-            'analysis': self._analyze_cors_issue(debug_info, response_info)
-        }
-        
-        # Check if this is a repeated error and should be logged
-        should_log = self._should_log_response(request.path, response.status_code, combined_info, request)
-        if should_log:
-            logger.info(f"📤 CORS DEBUG RESPONSE: {json.dumps(combined_info, indent=2)}")
-        
-        return response
+        return response_info
     
     def _analyze_cors_issue(self, request_info, response_info):
         """Analyze potential CORS issues"""
@@ -159,56 +206,26 @@ class CORSDebugMiddleware(MiddlewareMixin):
             'cors_status': 'OK' if not issues or (len(issues) == 1 and 'Authentication required' in issues) else 'PROBLEM'
         }
     
+    def _hit(self, key):
+        """Count key in its current window; returns (count, suppressed) for that window"""
+        now = time.time()
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or now - entry[0] >= self._time_window:
+                entry = [now, 0, 0]
+            entry[1] += 1
+            if entry[1] > self._max_repeats:
+                entry[2] += 1
+            self._counters[key] = entry
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_tracked_keys:
+                self._counters.popitem(last=False)
+            return entry[1], entry[2]
+    
     def _should_log_request(self, path, method):
         """Check if this request should be logged based on rate limiting"""
-        current_time = time.time()
-        key = f"{method}:{path}"
-        
-        # Clean old entries
-        self._error_cache[key] = [
-            timestamp for timestamp in self._error_cache[key] 
-            if current_time - timestamp < self._time_window
-        ]
-        
-        # Add current request
-        self._error_cache[key].append(current_time)
-        
-        # Check if we should suppress
-        if len(self._error_cache[key]) > self._max_repeats:
-            self._suppressed_logs[key] += 1
-            return False
-        
-        return True
-    
-    def _should_log_response(self, path, status_code, response_info, request=None):
-        """Check if this response should be logged and analyze JWT if it's an auth error"""
-        current_time = time.time()
-        key = f"{status_code}:{path}"
-        
-        # Clean old entries
-        self._error_cache[key] = [
-            timestamp for timestamp in self._error_cache[key] 
-            if current_time - timestamp < self._time_window
-        ]
-        
-        # Add current response
-        self._error_cache[key].append(current_time)
-        
-        # If this is the first auth error in this window, add detailed JWT analysis
-        if status_code == 401 and len(self._error_cache[key]) == 1:
-            jwt_analysis = self._analyze_jwt_token(response_info, request)
-            response_info['jwt_analysis'] = jwt_analysis
-            logger.info(f"🔐 JWT TOKEN ANALYSIS: {json.dumps(jwt_analysis, indent=2)}")
-        
-        # Check if we should suppress repeated errors
-        if len(self._error_cache[key]) > self._max_repeats:
-            self._suppressed_logs[key] += 1
-            if self._suppressed_logs[key] == 1:  # First time suppressing
-                logger.warning(f"🔁 Repeated authentication failure detected for {path} (status {status_code}). "
-                             f"Logging suppressed temporarily. Total occurrences: {len(self._error_cache[key])}")
-            return False
-        
-        return True
+        count, _ = self._hit(f"{method}:{path}")
+        return count <= self._max_repeats
     
     def _analyze_jwt_token(self, response_info, request=None):
         """Analyze JWT tokens in cookies for detailed debugging"""
@@ -0,0 +1,255 @@
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from apps.jobs.queue import enqueue
+from .models import AuditLog, ErasureRequest, GDPRRecord, LoginAttempt, UserProfile
+from .retention import default_archive_dir
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'GDPR_ERASURE', {})
+CHUNK_SIZE = _config.get('CHUNK_SIZE', 5000)
+# 'running' requests without a heartbeat for this long are taken over
+STALE_AFTER = timedelta(minutes=_config.get('STALE_AFTER_MINUTES', 10))
+IP_RETENTION_DAYS = _config.get('IP_RETENTION_DAYS', 90)
+
+# LoginAttempt.ip_address is NOT NULL
+SCRUBBED_IP = '0.0.0.0'
+
+
+def scrub_in_chunks(queryset, values, chunk_size=CHUNK_SIZE, last_pk=None, on_chunk=None):
+    """
+    Apply `values` to every row of `queryset` with one UPDATE per range of
+    `chunk_size` primary keys, each in its own short transaction, so no lock
+    is held on the table for longer than one chunk. Walks forward from
+    `last_pk`; `on_chunk(last_pk, count)` runs after each committed chunk.
+    Returns the number of rows updated.
+    """
+    total = 0
+    while True:
+        pending = queryset.order_by('pk')
+        if last_pk is not None:
+            pending = pending.filter(pk__gt=last_pk)
+        pks = list(pending.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return total
+        with transaction.atomic():
+            count = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(**values)
+        total += count
+        last_pk = pks[-1]
+        if on_chunk is not None:
+            on_chunk(last_pk, count)
+
+
+def _erasure_steps(erasure):
+    """(name, queryset, values) for everything to scrub for this request's user"""
+    user_id = erasure.user_id
+    return (
+        ('audit_logs', AuditLog.objects.filter(user_id=user_id), {
+            'ip_address': None, 'user_agent': '', 'user_agent_ref': None, 'session_key': '',
+        }),
+        # Events about the account itself carry its old names and e-mail
+        ('audit_subject', AuditLog.objects.filter(model_name='User', object_id=str(user_id)), {
+            'object_repr': '', 'changes': {},
+        }),
+        ('login_attempts', LoginAttempt.objects.filter(username=erasure.username) if erasure.username
+         else LoginAttempt.objects.none(), {
+            'username': f"deleted_user_{user_id}", 'ip_address': SCRUBBED_IP,
+            'user_agent': '', 'user_agent_ref': None,
+        }),
+        ('gdpr_records', GDPRRecord.objects.filter(user_id=user_id), {
+            'ip_address': None, 'user_agent': '', 'user_agent_ref': None,
+        }),
+        ('profile', UserProfile.objects.filter(user_id=user_id), {
+            'phone': '', 'company': '', 'position': '', 'gdpr_consent_ip': None, 'last_login_ip': None,
+        }),
+    )
+
+
+def _archive_rules(erasure):
+    """
+    db_table -> ((match, values), ...) mirroring _erasure_steps for rows
+    already moved to gzip JSONL by retention.archive_month, where each row
+    is a dict of attnames plus the inlined user_agent_ref__user_agent.
+    """
+    user_id = erasure.user_id
+    user_agent = {'user_agent': '', 'user_agent_ref_id': None, 'user_agent_ref__user_agent': None}
+    return {
+        AuditLog._meta.db_table: (
+            (lambda row: user_id is not None and row.get('user_id') == user_id,
+             {'ip_address': None, 'session_key': '', **user_agent}),
+            (lambda row: row.get('model_name') == 'User' and row.get('object_id') == str(user_id),
+             {'object_repr': '', 'changes': {}}),
+        ),
+        LoginAttempt._meta.db_table: (
+            (lambda row: bool(erasure.username) and row.get('username') == erasure.username,
+             {'username': f"deleted_user_{user_id}", 'ip_address': SCRUBBED_IP, **user_agent}),
+        ),
+    }
+
+
+def _archive_table(path):
+    # archive_month names files <db_table>_<YYYYMM>.jsonl.gz
+    return path.name[:-len('_YYYYMM.jsonl.gz')]
+
+
+def archive_files(archive_dir, tables):
+    """Archives written by retention.archive_month for `tables`, oldest month first"""
+    archive_dir = Path(archive_dir)
+    if not archive_dir.is_dir():
+        return []
+    return sorted(
+        path for path in archive_dir.glob('*.jsonl.gz')
+        if _archive_table(path) in tables
+    )
+
+
+def scrub_archive(path, rules):
+    """
+    Rewrite one archive with `rules` applied, streaming line by line into a
+    temporary file that replaces the original only if a row changed.
+    Returns the number of rows scrubbed. Do not run it while archive_month
+    is appending to the same month, or the appended rows are lost.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    scrubbed = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as source, gzip.open(tmp_path, 'wt', encoding='utf-8') as target:
+        for line in source:
+            row = json.loads(line)
+            matched = False
+            for match, values in rules:
+                if match(row):
+                    row.update(values)
+                    matched = True
+            if matched:
+                scrubbed += 1
+                line = json.dumps(row) + '\n'
+            target.write(line)
+    if scrubbed:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+    return scrubbed
+
+
+def claim(erasure_id):
+    """Mark a request running if nobody else holds it; True when claimed"""
+    stale = timezone.now() - STALE_AFTER
+    return ErasureRequest.objects.filter(
+        Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=stale),
+        pk=erasure_id,
+    ).update(status='running', started_at=timezone.now(), updated_at=timezone.now(), error='') == 1
+
+
+def run_erasure(erasure, chunk_size=CHUNK_SIZE, on_step=None, archive_dir=None):
+    """
+    Scrub every step for a claimed request, resuming from its saved progress,
+    then the archived months under `archive_dir` (default AUDIT_RETENTION's
+    ARCHIVE_DIR). `on_step(index, total, name)` is called as each step
+    starts and once more with index == total at the end.
+    """
+    progress = erasure.progress or {}
+    steps = _erasure_steps(erasure)
+    total = len(steps) + 1
+    for index, (name, queryset, values) in enumerate(steps):
+        step = progress.setdefault(name, {'last_pk': None, 'scrubbed': 0, 'done': False})
+        if step['done']:
+            continue
+        if on_step is not None:
+            on_step(index, total, name)
+
+        def on_chunk(last_pk, count, step=step):
+            step['last_pk'] = str(last_pk)
+            step['scrubbed'] += count
+            ErasureRequest.objects.filter(pk=erasure.pk).update(progress=progress, updated_at=timezone.now())
+
+        scrub_in_chunks(queryset, values, chunk_size, step['last_pk'], on_chunk)
+        step['done'] = True
+        ErasureRequest.objects.filter(pk=erasure.pk).update(progress=progress, updated_at=timezone.now())
+
+    # Each archive is replaced whole, so progress only needs the names already done
+    step = progress.setdefault('archives', {'files': [], 'scrubbed': 0, 'done': False})
+    if not step['done']:
+        if on_step is not None:
+            on_step(len(steps), total, 'archives')
+        rules = _archive_rules(erasure)
+        for path in archive_files(archive_dir or default_archive_dir(), rules):
+            if path.name in step['files']:
+                continue
+            step['scrubbed'] += scrub_archive(path, rules[_archive_table(path)])
+            step['files'].append(path.name)
+            ErasureRequest.objects.filter(pk=erasure.pk).update(progress=progress, updated_at=timezone.now())
+        step['done'] = True
+
+    if on_step is not None:
+        on_step(total, total, '')
+    ErasureRequest.objects.filter(pk=erasure.pk).update(
+        status='completed', username='', progress=progress,
+        completed_at=timezone.now(), updated_at=timezone.now(),
+    )
+
+
+def process_erasure(erasure_id, chunk_size=CHUNK_SIZE, on_step=None, archive_dir=None):
+    """Claim and run one request; False if it was not available"""
+    if not claim(erasure_id):
+        return False
+    erasure = ErasureRequest.objects.get(pk=erasure_id)
+    try:
+        run_erasure(erasure, chunk_size, on_step, archive_dir)
+    except Exception as exc:
+        logger.exception(f"Erasure {erasure_id} failed")
+        ErasureRequest.objects.filter(pk=erasure_id).update(status='failed', error=str(exc)[:1000])
+        raise
+    return True
+
+
+def queue_erasure(user, username=None, run_now=True):
+    """
+    Record an erasure request for `user`. Pass the original `username` when
+    the account has already been anonymized; login attempts are stored under
+    it. With `run_now` a gdpr_erasure job is queued for it; the
+    process_erasures command picks up anything left pending or stale.
+    """
+    erasure = ErasureRequest.objects.create(user=user, username=username or user.username)
+    if run_now:
+        enqueue('gdpr_erasure', {'erasure_id': erasure.pk}, user=user)
+    return erasure
+
+
+def pending_erasures():
+    stale = timezone.now() - STALE_AFTER
+    return ErasureRequest.objects.filter(
+        Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=stale)
+    ).order_by('requested_at').values_list('pk', flat=True)
+
+
+def scrub_expired_ips(retention_days=IP_RETENTION_DAYS, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    Retention sweep: drop IP addresses and user agents older than the policy
+    window from AuditLog, LoginAttempt and GDPRRecord. Returns {table: rows}.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    targets = (
+        ('audit_log', AuditLog.objects.filter(timestamp__lt=cutoff).filter(
+            Q(ip_address__isnull=False) | Q(user_agent_ref__isnull=False) | ~Q(user_agent='')
+        ), {'ip_address': None, 'user_agent': '', 'user_agent_ref': None}),
+        ('login_attempt', LoginAttempt.objects.filter(timestamp__lt=cutoff).filter(
+            ~Q(ip_address=SCRUBBED_IP) | Q(user_agent_ref__isnull=False) | ~Q(user_agent='')
+        ), {'ip_address': SCRUBBED_IP, 'user_agent': '', 'user_agent_ref': None}),
+        ('gdpr_record', GDPRRecord.objects.filter(consent_date__lt=cutoff).filter(
+            Q(ip_address__isnull=False) | Q(user_agent_ref__isnull=False) | ~Q(user_agent='')
+        ), {'ip_address': None, 'user_agent': '', 'user_agent_ref': None}),
+    )
+    results = {}
+    for name, queryset, values in targets:
+        callback = (lambda last_pk, count, name=name: on_chunk(name, count)) if on_chunk else None
+        results[name] = scrub_in_chunks(queryset, values, chunk_size, on_chunk=callback)
+    return results
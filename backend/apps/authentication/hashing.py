@@ -0,0 +1,171 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool already has MAX_PENDING calls"""
+
+
+class HashingExecutor:
+    """
+    Bounded thread pool for password hashing under ASGI.
+
+    MAX_WORKERS caps how many hashes run at once. MAX_PENDING caps how many
+    calls may be running or queued; past that, callers are refused straight
+    away instead of piling up behind a long queue. Only the hash itself runs
+    here: the pool threads never touch the database.
+    """
+
+    def __init__(self, max_workers=4, max_pending=64):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='password-hashing'
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def try_acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    def run(self, func, *args, **kwargs):
+        """Run func in the pool and wait for it, or raise HashingBusy when the pool is full"""
+        if not self.try_acquire():
+            raise HashingBusy()
+        try:
+            return self.executor.submit(func, *args, **kwargs).result()
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'pending': self._pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+_config = getattr(settings, 'PASSWORD_HASHING', {})
+
+hashing_executor = HashingExecutor(
+    max_workers=_config.get('MAX_WORKERS', 4),
+    max_pending=_config.get('MAX_PENDING', 64),
+)
+
+
+# Set by offload_view for the request it is serving
+_offloading = contextvars.ContextVar('password_hashing_offloaded', default=False)
+
+
+def _hash(func, *args):
+    if _offloading.get():
+        return hashing_executor.run(func, *args)
+    return func(*args)
+
+
+def make_password(raw_password):
+    return _hash(hashers.make_password, raw_password)
+
+
+def set_password(user, raw_password):
+    """user.set_password() with the hash run on the pool inside offloaded views"""
+    user.password = make_password(raw_password)
+    # Passed to password validators' password_changed() on the next save
+    user._password = raw_password
+
+
+def check_password(user, raw_password):
+    """
+    user.check_password() with the hash run on the pool inside offloaded
+    views. A hash from an outdated hasher is upgraded and saved from the
+    calling thread, as Django does.
+    """
+    outdated = []
+    valid = _hash(hashers.check_password, raw_password, user.password, outdated.append)
+    if outdated:
+        set_password(user, raw_password)
+        user._password = None
+        user.save(update_fields=['password'])
+    return valid
+
+
+class HashingModelBackend(ModelBackend):
+    """ModelBackend whose password checks go through check_password() above"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so a missing user takes as long as a wrong password
+            make_password(password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+
+def offload_view(view):
+    """
+    Wrap a sync view (e.g. LoginView.as_view()) so the password hashes it
+    makes run on the hashing executor. The view itself, with its database
+    work, stays on the request's own thread; once the pool is full the
+    request gets a 503 instead of waiting behind it.
+    """
+
+    def offloaded_view(request, *args, **kwargs):
+        token = _offloading.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        except HashingBusy:
+            logger.warning(f"Password hashing queue full, rejecting {request.path}")
+            response = JsonResponse({
+                'error': 'Server is busy. Please try again.',
+                'code': 'HASHING_BUSY'
+            }, status=503)
+            response['Retry-After'] = '1'
+            return response
+        finally:
+            _offloading.reset(token)
+
+    # Carries over csrf_exempt and view_class from the DRF view
+    return functools.wraps(view)(offloaded_view)
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from apps.jobs.registry import job
+from .data_export import SECTIONS, build_export, prune_exports
+from .erasure import process_erasure
+from .models import ErasureRequest
+
+
+@job('gdpr_export', concurrency=2)
+def gdpr_export(job, user_id):
+    user = User.objects.get(pk=user_id)
+    prune_exports()
+    download_token = build_export(
+        str(job.pk), user,
+        on_section=lambda index, name: job.report_progress(index, len(SECTIONS), name),
+    )
+    job.report_progress(len(SECTIONS), len(SECTIONS))
+    return {'download_token': download_token}
+
+
+@job('gdpr_erasure', concurrency=1, max_attempts=5)
+def gdpr_erasure(job, erasure_id):
+    processed = process_erasure(
+        erasure_id,
+        on_step=lambda index, total, name: job.report_progress(index, total, name),
+    )
+    erasure = ErasureRequest.objects.get(pk=erasure_id)
+    return {'erasure_id': erasure_id, 'processed': processed, 'status': erasure.status}
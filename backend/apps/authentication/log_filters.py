@@ -1,82 +1,93 @@
 import logging
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
 
 class AuthenticationLogFilter(logging.Filter):
     """
     Custom logging filter to suppress repeated authentication failures
+
+    Each message pattern gets a token bucket of `max_repeats` tokens that
+    refills over `time_window` seconds; buckets live in a bounded LRU.
     """
-    
-    def __init__(self):
+
+    def __init__(self, max_repeats=3, time_window=60, max_keys=256):
         super().__init__()
-        self._error_cache = defaultdict(list)
-        self._suppressed_counts = defaultdict(int)
-        self._max_repeats = 3
-        self._time_window = 60  # 60 seconds
-        self._last_suppression_log = {}
-    
+        self._max_repeats = max_repeats
+        self._time_window = time_window
+        self._refill_rate = max_repeats / time_window
+        self._max_keys = max_keys
+        # key -> [tokens, last_refill, suppressed_count, last_suppression_log]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
     def filter(self, record):
         """
         Filter log records to suppress repeated authentication failures
         """
         # Only filter authentication-related warnings
-        if (record.levelno == logging.WARNING and 
-            hasattr(record, 'msg') and 
+        if (record.levelno == logging.WARNING and
+            hasattr(record, 'msg') and
             isinstance(record.msg, str)):
-            
+
             message = record.msg
-            
+
             # Check for authentication-related messages
             auth_patterns = [
                 'Unauthorized: /api/auth',
                 'POST /api/auth/token/refresh HTTP/1.1" 401',
                 'Authentication required'
             ]
-            
+
             is_auth_error = any(pattern in message for pattern in auth_patterns)
-            
+
             if is_auth_error:
                 return self._should_log_auth_error(message)
-        
+
         # Allow all other log messages
         return True
-    
+
     def _should_log_auth_error(self, message):
         """Check if this authentication error should be logged"""
         current_time = time.time()
-        
+
         # Create a key based on the message pattern
         key = self._normalize_message(message)
-        
-        # Clean old entries
-        self._error_cache[key] = [
-            timestamp for timestamp in self._error_cache[key] 
-            if current_time - timestamp < self._time_window
-        ]
-        
-        # Add current error
-        self._error_cache[key].append(current_time)
-        
-        # Check if we should suppress
-        if len(self._error_cache[key]) > self._max_repeats:
-            self._suppressed_counts[key] += 1
-            
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self._max_repeats), current_time, 0, 0.0]
+                self._buckets[key] = bucket
+                while len(self._buckets) > self._max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self._max_repeats, bucket[0] + (current_time - bucket[1]) * self._refill_rate)
+                bucket[1] = current_time
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True
+
+            bucket[2] += 1
+            suppressed = bucket[2]
             # Log suppression message once per minute
-            last_suppression = self._last_suppression_log.get(key, 0)
-            if current_time - last_suppression > 60:
-                self._last_suppression_log[key] = current_time
-                # Create a custom log record for suppression message
-                logger = logging.getLogger('apps.authentication.log_filters')
-                logger.warning(
-                    f"🔁 Repeated authentication failure detected. "
-                    f"Suppressing similar logs temporarily. "
-                    f"Total occurrences in last {self._time_window}s: {len(self._error_cache[key])}"
-                )
-            
-            return False
-        
-        return True
-    
+            report = current_time - bucket[3] > 60
+            if report:
+                bucket[3] = current_time
+
+        if report:
+            # Create a custom log record for suppression message
+            logger = logging.getLogger('apps.authentication.log_filters')
+            logger.warning(
+                f"🔁 Repeated authentication failure detected. "
+                f"Suppressing similar logs temporarily. "
+                f"Total suppressed so far: {suppressed}"
+            )
+
+        return False
+
     def _normalize_message(self, message):
         """Normalize message to create a consistent key for similar errors"""
         # Extract the core error pattern
@@ -88,4 +99,4 @@ class AuthenticationLogFilter(logging.Filter):
             return 'authentication_required'
         else:
             # Fallback - use first 50 chars
-            return message[:50]
\ No newline at end of file
+            return message[:50]
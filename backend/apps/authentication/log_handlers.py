@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# How long stop() waits for room on a full queue before giving up on the listener
+STOP_TIMEOUT = 5.0
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with only the fields log shippers need"""
+
+    def format(self, record):
+        payload = {
+            'time': f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))}.{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc_info'] = record.exc_text
+        if record.stack_info:
+            payload['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _DrainingListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than failing on a full queue, so stop() still drains it
+        self.queue.put(self._sentinel, timeout=STOP_TIMEOUT)
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Stream handler that writes from a background thread.
+
+    Records go on a bounded queue and a QueueListener writes them to the
+    stream. Filters and the message interpolation run on the calling thread;
+    formatting and I/O do not. When the queue is full records are dropped,
+    counted, and reported once the queue has room again (or at stop()).
+    """
+
+    def __init__(self, queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._unreported = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Interpolate now, while args still hold the values they had at the call site
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        if self._unreported:
+            try:
+                self.queue.put_nowait(self._dropped_record())
+                self._unreported = 0
+            except queue.Full:
+                pass
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+
+    def _dropped_record(self):
+        return logging.LogRecord(
+            'apps.authentication.log_handlers', logging.WARNING, __file__, 0,
+            f"Logging queue full, dropped {self._unreported} records", None, None,
+        )
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked worker: the parent's listener thread did not come along
+                self.queue = queue.Queue(maxsize=self.queue_size)
+            self._listener = _DrainingListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            try:
+                if self._unreported:
+                    self.queue.put(self._dropped_record(), timeout=STOP_TIMEOUT)
+                    self._unreported = 0
+                self._listener.stop()
+            except queue.Full:
+                # Still no room after STOP_TIMEOUT; the listener thread is a daemon anyway
+                pass
+            self._listener = None
+        self.target.flush()
+
+    def stats(self):
+        return {'queue_depth': self.queue.qsize(), 'queue_size': self.queue_size, 'dropped': self.dropped}
+
+
+_traceback_formatter = logging.Formatter()
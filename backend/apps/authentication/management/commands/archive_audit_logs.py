@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.authentication.retention import (
+    ARCHIVE_MODELS, archivable_months, archive_month, default_archive_dir, ensure_partitions
+)
+
+
+class Command(BaseCommand):
+    help = 'Export audit and login-attempt rows past their retention window to gzipped JSONL and remove them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(ARCHIVE_MODELS), action='append',
+                            help='Limit archival to this table (repeatable)')
+        parser.add_argument('--retention-days', type=int, help='Override the configured retention window')
+        parser.add_argument('--archive-dir', help='Directory for the .jsonl.gz files')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--max-months', type=int, default=0, help='Stop after archiving this many months (0 = all)')
+        parser.add_argument('--create-partitions', type=int, default=2, metavar='MONTHS',
+                            help='Months of partitions to pre-create on partitioned tables')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        archive_dir = options['archive_dir'] or default_archive_dir()
+        archived_months = 0
+
+        for name in options['model'] or sorted(ARCHIVE_MODELS):
+            model, retention_days = ARCHIVE_MODELS[name]
+            retention_days = options['retention_days'] or retention_days
+
+            if not options['dry_run']:
+                for partition in ensure_partitions(model, options['create_partitions']):
+                    self.stdout.write(f"{name}: created partition {partition}")
+
+            for month in archivable_months(model, retention_days):
+                if options['max_months'] and archived_months >= options['max_months']:
+                    return
+                if options['dry_run']:
+                    self.stdout.write(f"{name}: would archive {month:%Y-%m}")
+                    continue
+
+                path, count = archive_month(model, month, archive_dir, options['chunk_size'])
+                archived_months += 1
+                self.stdout.write(self.style.SUCCESS(f"{name}: archived {count} rows from {month:%Y-%m} to {path}"))
@@ -0,0 +1,65 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from apps.authentication.models import AuditLog, LoginAttempt, GDPRRecord
+from apps.authentication.utils import intern_user_agent
+
+
+def table_size(model):
+    """On-disk size of model's table in bytes, or None if the backend can't tell"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+            else:
+                return None
+        except Exception:
+            return None
+        return cursor.fetchone()[0]
+
+
+def format_size(size):
+    return 'n/a' if size is None else f"{size / 1024 / 1024:.1f} MiB"
+
+
+class Command(BaseCommand):
+    help = 'Move legacy user_agent strings into the interned UserAgent table in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for model in (AuditLog, LoginAttempt, GDPRRecord):
+            label = model._meta.label
+            size_before = table_size(model)
+            moved = 0
+
+            while True:
+                rows = list(
+                    model.objects.exclude(user_agent='')
+                    .order_by('pk')
+                    .values_list('pk', 'user_agent')[:options['chunk_size']]
+                )
+                if not rows:
+                    break
+
+                pks_by_agent = defaultdict(list)
+                for pk, user_agent in rows:
+                    pks_by_agent[intern_user_agent(user_agent)].append(pk)
+
+                with transaction.atomic():
+                    for user_agent_id, pks in pks_by_agent.items():
+                        model.objects.filter(pk__in=pks).update(user_agent_ref_id=user_agent_id, user_agent='')
+                moved += len(rows)
+
+            if connection.vendor == 'postgresql' and moved:
+                # Let the freed space be reported; VACUUM FULL is left to the DBA
+                with connection.cursor() as cursor:
+                    cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {moved} rows moved, table size {format_size(size_before)} -> {format_size(table_size(model))}"
+            ))
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import statistics
+import time
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from apps.authentication import views
+from apps.authentication.hashing import hashing_executor, offload_view
+from apps.authentication.models import LoginAttempt
+
+BENCHMARK_USERNAME = 'hashing-benchmark'
+BENCHMARK_PASSWORD = 'hashing-benchmark-password'
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95)]
+    return f"p50 {statistics.median(samples) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms"
+
+
+def call_view(view, request):
+    try:
+        return view(request)
+    finally:
+        # What request_finished does at the end of a real request
+        connections.close_all()
+
+
+async def serve(view, request):
+    """Run a sync view the way Django's ASGIHandler does: one thread-sensitive context per request"""
+    async with ThreadSensitiveContext():
+        started = time.perf_counter()
+        response = await sync_to_async(call_view, thread_sensitive=True)(view, request)
+        return response.status_code, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Time concurrent logins, and a cheap request served alongside them, with hashing inline and offloaded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=32)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save()
+        try:
+            for label, view in (('inline', views.LoginView.as_view()),
+                                ('offloaded', offload_view(views.LoginView.as_view()))):
+                elapsed, statuses, logins, probes = asyncio.run(
+                    self.run(view, options['logins'], options['concurrency'])
+                )
+                self.stdout.write(
+                    f"Hashing {label}: {len(logins) / elapsed:.1f} logins/s, login {percentiles(logins)}, "
+                    f"other requests {percentiles(probes)}, statuses {statuses}"
+                )
+            self.stdout.write(f"Executor stats: {hashing_executor.stats()}")
+        finally:
+            LoginAttempt.objects.filter(username=BENCHMARK_USERNAME).delete()
+            user.delete()
+
+    async def run(self, view, count, concurrency):
+        factory = RequestFactory()
+        body = json.dumps({'username': BENCHMARK_USERNAME, 'password': BENCHMARK_PASSWORD})
+        probe_view = views.test_cors
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                return await serve(view, factory.post('/api/auth/login', body, content_type='application/json'))
+
+        async def probe():
+            # A request that does no hashing, sent every 10 ms while the logins run
+            samples = []
+            while not done.is_set():
+                samples.append((await serve(probe_view, factory.get('/api/auth/test-cors')))[1])
+                await asyncio.sleep(0.01)
+            return samples
+
+        started = time.perf_counter()
+        probes = asyncio.create_task(probe())
+        results = await asyncio.gather(*(login() for _ in range(count)))
+        elapsed = time.perf_counter() - started
+        done.set()
+
+        statuses = {}
+        for status, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        return elapsed, statuses, [latency for _, latency in results], await probes
@@ -0,0 +1,170 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from apps.authentication.serializers import TokenRefreshSerializer
+from apps.authentication.tokens import RefreshToken, TokenBlacklistFilter, token_blacklist
+
+# Seeded rows carry this in place of an encoded token, so --clear can find them
+SEED_MARKER = 'benchmark'
+BENCHMARK_USERNAME = 'token-benchmark'
+
+# Seeded tokens are created evenly over this many days and live 7 days, so at
+# 100 days about 7% of them are unexpired and end up in the filter
+SEED_SPAN_DAYS = 100
+SEED_LIFETIME = timedelta(days=7)
+
+SEED_SQL = """
+INSERT INTO token_blacklist_outstandingtoken (token, created_at, expires_at, user_id, jti)
+SELECT %(marker)s, %(now)s - (%(rows)s - i) * %(step)s,
+       %(now)s - (%(rows)s - i) * %(step)s + %(lifetime)s, NULL, 'benchmark-' || i
+FROM generate_series(1, %(rows)s) AS i;
+INSERT INTO token_blacklist_blacklistedtoken (blacklisted_at, token_id)
+SELECT created_at, id FROM token_blacklist_outstandingtoken WHERE token = %(marker)s;
+ANALYZE token_blacklist_outstandingtoken;
+ANALYZE token_blacklist_blacklistedtoken;
+"""
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95)]
+    return f"p50 {statistics.median(samples) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms"
+
+
+def timed(check, values):
+    samples = []
+    for value in values:
+        started = time.perf_counter()
+        check(value)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class Command(BaseCommand):
+    help = 'Time refresh token blacklist checks with and without the Bloom-filter fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='First insert this many blacklisted tokens (generate_series on PostgreSQL)')
+        parser.add_argument('--clear', action='store_true', help='Delete the seeded tokens and exit')
+        parser.add_argument('--samples', type=int, default=2000)
+        parser.add_argument('--refreshes', type=int, default=300)
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+        if options['seed']:
+            self.seed(options['seed'])
+
+        self.stdout.write(
+            f"{OutstandingToken.objects.count():,} outstanding, {BlacklistedToken.objects.count():,} blacklisted tokens"
+        )
+        blacklisted = list(
+            OutstandingToken.objects.filter(blacklistedtoken__isnull=False, expires_at__gt=timezone.now())
+            .order_by('?').values_list('jti', flat=True)[:options['samples']]
+        )
+        unseen = [uuid.uuid4().hex for _ in range(options['samples'])]
+
+        direct = TokenBlacklistFilter(enabled=False)
+        self.stdout.write(f"Database check, unseen jti:       {percentiles(timed(direct.contains, unseen))}")
+        if blacklisted:
+            self.stdout.write(f"Database check, blacklisted jti:  {percentiles(timed(direct.contains, blacklisted))}")
+
+        bloom = TokenBlacklistFilter()
+        bloom.rebuild()
+        self.stdout.write(
+            f"Filter rebuild: {bloom.last_rebuild_seconds:.2f} s for {bloom.stats()['entries']:,} entries"
+        )
+        if bloom.shared_cache:
+            self.stdout.write(f"Filter check, unseen jti:         {percentiles(timed(bloom.contains, unseen))}")
+            if blacklisted:
+                self.stdout.write(f"Filter check, blacklisted jti:    {percentiles(timed(bloom.contains, blacklisted))}")
+        else:
+            self.stdout.write('Filter checks skipped: the cache is per-process, so the filter is never used')
+
+        user = self.benchmark_user()
+        enabled = token_blacklist.enabled
+        try:
+            for fast_path in (False, True):
+                token_blacklist.enabled = fast_path
+                if fast_path and token_blacklist.shared_cache:
+                    # Time the steady state, not the checks made while the first filter loads
+                    token_blacklist.rebuild()
+                label = 'on' if fast_path else 'off'
+                self.stdout.write(
+                    f"Refresh with rotation, fast path {label}: {percentiles(self.refresh_chain(user, options['refreshes']))}"
+                )
+            self.stdout.write(f"Fast path stats: {token_blacklist.stats()}")
+        finally:
+            token_blacklist.enabled = enabled
+
+    def refresh_chain(self, user, count):
+        """Refresh a token `count` times in a row, the way one client keeps its session alive"""
+        token = RefreshToken.for_user(user)
+        jtis = [token['jti']]
+        token = str(token)
+        samples = []
+        for _ in range(count):
+            started = time.perf_counter()
+            serializer = TokenRefreshSerializer(data={'refresh': token})
+            serializer.is_valid(raise_exception=True)
+            samples.append(time.perf_counter() - started)
+            token = serializer.validated_data['refresh']
+            jtis.append(RefreshToken(token, verify=False)['jti'])
+        # Rotated tokens are blacklisted without a user, so remove them here rather than in --clear
+        OutstandingToken.objects.filter(jti__in=jtis).delete()
+        return samples
+
+    def benchmark_user(self):
+        user, created = User.objects.get_or_create(username=BENCHMARK_USERNAME)
+        if created:
+            user.set_unusable_password()
+            user.save()
+        return user
+
+    def seed(self, rows):
+        started = time.monotonic()
+        now = timezone.now()
+        step = timedelta(days=SEED_SPAN_DAYS) / rows
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(SEED_SQL, {
+                    'marker': SEED_MARKER, 'now': now, 'rows': rows, 'step': step, 'lifetime': SEED_LIFETIME,
+                })
+        else:
+            for start in range(0, rows, 10000):
+                with transaction.atomic():
+                    tokens = OutstandingToken.objects.bulk_create([
+                        OutstandingToken(
+                            token=SEED_MARKER, jti=f'benchmark-{i}',
+                            created_at=now - (rows - i) * step, expires_at=now - (rows - i) * step + SEED_LIFETIME,
+                        )
+                        for i in range(start + 1, min(start + 10000, rows) + 1)
+                    ])
+                    # bulk_create only returns ids on backends that support it
+                    if tokens[0].pk is None:
+                        tokens = OutstandingToken.objects.filter(jti__in=[token.jti for token in tokens])
+                    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens])
+        self.stdout.write(f"Seeded {rows:,} blacklisted tokens in {time.monotonic() - started:.1f} s")
+
+    def clear(self):
+        seeded = OutstandingToken.objects.filter(token=SEED_MARKER)
+        last_id = 0
+        deleted = 0
+        while True:
+            ids = list(seeded.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:10000])
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                deleted += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        User.objects.filter(username=BENCHMARK_USERNAME).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted:,} seeded tokens"))
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches to spread the load')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"Would delete {expired.count()} outstanding tokens "
+                f"({BlacklistedToken.objects.filter(token__expires_at__lte=now).count()} blacklisted)"
+            )
+            return
+
+        last_id = 0
+        outstanding_deleted = 0
+        blacklisted_deleted = 0
+
+        while True:
+            # Walk the primary key so each batch is an index range scan, not a rescan
+            ids = list(
+                expired.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            with transaction.atomic():
+                blacklisted_deleted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding_deleted += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {outstanding_deleted} outstanding and {blacklisted_deleted} blacklisted tokens"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.authentication.erasure import CHUNK_SIZE, pending_erasures, process_erasure
+
+
+class Command(BaseCommand):
+    help = 'Run queued GDPR erasure requests, resuming interrupted ones from their saved progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        for erasure_id in list(pending_erasures()):
+            try:
+                if process_erasure(erasure_id, options['chunk_size']):
+                    self.stdout.write(self.style.SUCCESS(f"Erasure {erasure_id}: completed"))
+                else:
+                    self.stdout.write(f"Erasure {erasure_id}: taken by another worker")
+            except Exception as exc:
+                self.stderr.write(f"Erasure {erasure_id}: failed ({exc})")
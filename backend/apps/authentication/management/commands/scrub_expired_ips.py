@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.authentication.erasure import CHUNK_SIZE, IP_RETENTION_DAYS, scrub_expired_ips
+
+
+class Command(BaseCommand):
+    help = 'Remove IP addresses and user agents older than the retention window from audit, login and GDPR tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=IP_RETENTION_DAYS)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        results = scrub_expired_ips(options['retention_days'], options['chunk_size'])
+        for name, count in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: scrubbed {count} rows"))
@@ -1,38 +1,50 @@
 from django.http import JsonResponse
+from django.contrib.auth.middleware import AuthenticationMiddleware
 from django.contrib.auth.models import AnonymousUser
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
 from django.conf import settings
+from .authentication import CachedJWTAuthentication
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class JWTCookieMiddleware:
+    """
+    Authenticate the access token cookie once per request.
+
+    The (user, token) pair is stored on the request so CachedJWTAuthentication
+    hands it to DRF instead of validating the token a second time.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
+        self.jwt_auth = CachedJWTAuthentication()
 
     def __call__(self, request):
-        jwt_auth = JWTAuthentication()
+        # Keep the session user set by AuthenticationMiddleware (admin); under
+        # the lean profile API requests have none, so default to anonymous.
+        # Only a valid cookie token replaces it.
+        if not hasattr(request, 'user'):
+            request.user = AnonymousUser()
+        if not hasattr(request, 'auth'):
+            request.auth = None
+        request._jwt_cookie_auth = None
         
         access_token = request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE'])
         
         if access_token:
             try:
-                validated_token = jwt_auth.get_validated_token(access_token)
-                user = jwt_auth.get_user(validated_token)
-                logger.info(f"Authenticated user from JWT: {user.username}")
+                user, validated_token = self.jwt_auth.authenticate_token(access_token)
                 request.user = user
                 request.auth = validated_token
-            except (InvalidToken, TokenError) as e:
-                logger.warning(f"JWT error: {e}")
-                request.user = AnonymousUser()
-                request.auth = None
-        else:
-            logger.info("No access token found in cookies")
-            request.user = AnonymousUser()
-            request.auth = None
-
+                request._jwt_cookie_auth = (user, validated_token)
+            except (InvalidToken, TokenError, AuthenticationFailed) as e:
+                logger.debug(f"JWT cookie rejected: {e}")
+        
+        return self.get_response(request)
 
 
 class SecurityHeadersMiddleware:
@@ -54,6 +66,7 @@ class SecurityHeadersMiddleware:
 
 
 class AuditLogMiddleware:
+    """Hand audit events recorded during the request to the batched writer"""
     def __init__(self, get_response):
         self.get_response = get_response
 
@@ -61,20 +74,9 @@ class AuditLogMiddleware:
         response = self.get_response(request)
         
         if hasattr(request, '_audit_log_data'):
-            from .models import AuditLog
-            from .utils import get_client_ip
+            from .audit import audit_writer, build_audit_entry
             
-            AuditLog.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                action=request._audit_log_data.get('action'),
-                model_name=request._audit_log_data.get('model_name'),
-                object_id=request._audit_log_data.get('object_id'),
-                object_repr=request._audit_log_data.get('object_repr'),
-                changes=request._audit_log_data.get('changes', {}),
-                ip_address=get_client_ip(request),
-                user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                session_key=request.session.session_key,
-            )
+            audit_writer.write(build_audit_entry(request, request._audit_log_data))
         
         return response
 
@@ -102,4 +104,78 @@ class CORSAuthMiddleware:
                     response['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
                     response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-CSRFToken'
         
-        return response
\ No newline at end of file
+        return response
+
+
+def is_lean_api_request(request):
+    """True for API requests that skip the browser-only middleware"""
+    return settings.API_MIDDLEWARE_PROFILE == 'lean' and request.path_info.startswith(settings.API_PATH_PREFIX)
+
+
+class BrowserOnlyMiddlewareMixin:
+    """
+    Skip the wrapped middleware for API requests under the lean profile.
+
+    API requests authenticate with the JWT cookie through JWTCookieMiddleware,
+    so sessions, CSRF cookies, session auth and messages are dead weight there.
+    """
+
+    def __call__(self, request):
+        if is_lean_api_request(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class BrowserSessionMiddleware(BrowserOnlyMiddlewareMixin, SessionMiddleware):
+    pass
+
+
+class BrowserCsrfViewMiddleware(BrowserOnlyMiddlewareMixin, CsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_lean_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class BrowserAuthenticationMiddleware(BrowserOnlyMiddlewareMixin, AuthenticationMiddleware):
+    pass
+
+
+class BrowserMessageMiddleware(BrowserOnlyMiddlewareMixin, MessageMiddleware):
+    pass
+
+
+class ResponseHeadersMiddleware:
+    """
+    Single pass over the response for the headers set by CORSAuthMiddleware
+    and XFrameOptionsMiddleware, with the header values worked out once at
+    startup instead of per response.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.api_prefix = settings.API_PATH_PREFIX
+        self.frame_options = getattr(settings, 'X_FRAME_OPTIONS', 'DENY').upper()
+        self.allowed_origins = frozenset(getattr(settings, 'CORS_ALLOWED_ORIGINS', []))
+        self.allow_all_origins = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False)
+        self.auth_failure_cors_headers = (
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-CSRFToken'),
+        )
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        headers = response.headers
+        
+        if 'X-Frame-Options' not in headers and not getattr(response, 'xframe_options_exempt', False):
+            headers['X-Frame-Options'] = self.frame_options
+        
+        # Keep CORS headers on auth failures, as CORSAuthMiddleware did
+        if response.status_code in (401, 403) and request.path.startswith(self.api_prefix):
+            origin = request.META.get('HTTP_ORIGIN')
+            if origin and (self.allow_all_origins or origin in self.allowed_origins):
+                headers['Access-Control-Allow-Origin'] = origin
+                for name, value in self.auth_failure_cors_headers:
+                    headers[name] = value
+        
+        return response
@@ -34,12 +34,37 @@ class UserProfile(models.Model):
             self.account_locked_until = timezone.now() + timezone.timedelta(minutes=30)
         self.save()
 
+    def record_login(self, ip_address):
+        """Clear lockout state and store the login IP, writing only if something changed"""
+        changes = {}
+        if self.failed_login_attempts or self.account_locked_until:
+            changes.update(failed_login_attempts=0, account_locked_until=None)
+        if self.last_login_ip != ip_address:
+            changes['last_login_ip'] = ip_address
+        if not changes:
+            return
+
+        for key, value in changes.items():
+            setattr(self, key, value)
+        self.updated_at = timezone.now()
+        UserProfile.objects.filter(pk=self.pk).update(updated_at=self.updated_at, **changes)
+
     def is_account_locked(self):
         if self.account_locked_until:
             return timezone.now() < self.account_locked_until
         return False
 
 
+class UserAgent(models.Model):
+    """Interned User-Agent strings shared by the audit, login and GDPR tables"""
+    user_agent_hash = models.CharField(max_length=64, unique=True)  # sha256 of user_agent
+    user_agent = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.user_agent[:100]
+
+
 class GDPRRecord(models.Model):
     CONSENT_TYPES = [
         ('data_processing', 'Data Processing'),
@@ -53,7 +78,8 @@ class GDPRRecord(models.Model):
     consent_given = models.BooleanField()
     consent_date = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    user_agent = models.TextField(blank=True)  # legacy, new rows use user_agent_ref
+    user_agent_ref = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     withdrawal_date = models.DateTimeField(null=True, blank=True)
     
     class Meta:
@@ -79,12 +105,15 @@ class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     model_name = models.CharField(max_length=50, blank=True)
-    object_id = models.PositiveIntegerField(null=True, blank=True)
+    # Text so integer and UUID primary keys can both be recorded
+    object_id = models.CharField(max_length=64, null=True, blank=True)
     object_repr = models.CharField(max_length=200, blank=True)
     changes = models.JSONField(default=dict, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    user_agent = models.TextField(blank=True)  # legacy, new rows use user_agent_ref
+    user_agent_ref = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    # Set when the event happens, not when the batched writer flushes it
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     session_key = models.CharField(max_length=40, blank=True)
     
     class Meta:
@@ -93,6 +122,7 @@ class AuditLog(models.Model):
             models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['model_name', 'timestamp']),
             models.Index(fields=['action', 'timestamp']),
+            models.Index(fields=['model_name', 'object_id', 'timestamp']),
         ]
     
     def __str__(self):
@@ -103,7 +133,8 @@ class AuditLog(models.Model):
 class LoginAttempt(models.Model):
     username = models.CharField(max_length=150)
     ip_address = models.GenericIPAddressField()
-    user_agent = models.TextField(blank=True)
+    user_agent = models.TextField(blank=True)  # legacy, new rows use user_agent_ref
+    user_agent_ref = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     successful = models.BooleanField()
     timestamp = models.DateTimeField(auto_now_add=True)
     failure_reason = models.CharField(max_length=100, blank=True)
@@ -117,4 +148,37 @@ class LoginAttempt(models.Model):
     
     def __str__(self):
         status = "Success" if self.successful else "Failed"
-        return f"{self.username} - {status} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.username} - {status} - {self.timestamp}"
+
+class ErasureRequest(models.Model):
+    """
+    A queued GDPR erasure. `progress` records, per step, the last primary key
+    scrubbed, so an interrupted run resumes where it stopped.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='erasure_requests')
+    # Needed to find LoginAttempt rows; cleared once the erasure completes
+    username = models.CharField(max_length=150, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Heartbeat: bumped after every chunk, so stale 'running' rows can be reclaimed
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['requested_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Erasure {self.pk} ({self.status})"
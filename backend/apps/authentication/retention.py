@@ -0,0 +1,153 @@
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import AuditLog, LoginAttempt
+
+
+_config = getattr(settings, 'AUDIT_RETENTION', {})
+
+# name -> (model, retention in days)
+ARCHIVE_MODELS = {
+    'audit_log': (AuditLog, _config.get('AUDIT_LOG_DAYS', 365)),
+    'login_attempt': (LoginAttempt, _config.get('LOGIN_ATTEMPT_DAYS', 90)),
+}
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value):
+    return month_start(month_start(value) + timedelta(days=32))
+
+
+def partition_name(model, month):
+    return f"{model._meta.db_table}_p{month:%Y%m}"
+
+
+def is_partitioned(model):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = %s',
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = %s',
+            [model._meta.db_table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def ensure_partitions(model, months_ahead=2):
+    """Create monthly partitions up to months_ahead on a partitioned table"""
+    if not is_partitioned(model):
+        return []
+
+    existing = list_partitions(model)
+    created = []
+    month = month_start(timezone.now())
+    for _ in range(months_ahead + 1):
+        name = partition_name(model, month)
+        if name not in existing:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} '
+                    f'PARTITION OF {connection.ops.quote_name(model._meta.db_table)} '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [month, next_month(month)],
+                )
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def archivable_months(model, retention_days):
+    """Whole months that ended before the retention cutoff, oldest first"""
+    cutoff = month_start(timezone.now() - timedelta(days=retention_days))
+    oldest = model.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    if oldest is None:
+        return []
+
+    months = []
+    month = month_start(oldest)
+    while month < cutoff:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def _export_values(queryset):
+    """values() for archival, with the interned User-Agent text inlined"""
+    fields = [field.attname for field in queryset.model._meta.concrete_fields]
+    return queryset.values(*fields, 'user_agent_ref__user_agent')
+
+
+def _write_rows(archive, rows):
+    count = 0
+    for row in rows:
+        archive.write(json.dumps(row, cls=DjangoJSONEncoder))
+        archive.write('\n')
+        count += 1
+    return count
+
+
+def archive_month(model, month, archive_dir, chunk_size=5000):
+    """
+    Export one month of model rows to gzipped JSONL and remove them.
+
+    A monthly partition is exported and then detached and dropped. Plain
+    tables are exported and deleted in short chunked transactions, so no
+    lock is held for the whole month. Rows are written before they are
+    deleted, and the file is appended to, so an interrupted run can resume.
+    """
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{model._meta.db_table}_{month:%Y%m}.jsonl.gz"
+
+    month_rows = model.objects.filter(timestamp__gte=month, timestamp__lt=next_month(month))
+    partition = partition_name(model, month)
+    archived = 0
+
+    with gzip.open(path, 'at', encoding='utf-8') as archive:
+        if is_partitioned(model) and partition in list_partitions(model):
+            archived = _write_rows(archive, _export_values(month_rows).iterator(chunk_size=chunk_size))
+            archive.flush()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'ALTER TABLE {connection.ops.quote_name(model._meta.db_table)} '
+                    f'DETACH PARTITION {connection.ops.quote_name(partition)}'
+                )
+                cursor.execute(f'DROP TABLE {connection.ops.quote_name(partition)}')
+            return path, archived
+
+        while True:
+            ids = list(month_rows.order_by('timestamp', 'pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            rows = list(_export_values(model.objects.filter(pk__in=ids).order_by('timestamp', 'pk')))
+            archived += _write_rows(archive, rows)
+            archive.flush()
+            with transaction.atomic():
+                model.objects.filter(pk__in=ids).delete()
+
+    return path, archived
+
+
+def default_archive_dir():
+    return _config.get('ARCHIVE_DIR') or Path(settings.BASE_DIR) / 'archive'
@@ -3,8 +3,11 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from .models import UserProfile, GDPRRecord
-from .utils import get_client_ip
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from .hashing import check_password, set_password
+from .models import UserProfile, GDPRRecord, AuditLog
+from .tokens import RefreshToken
+from .utils import get_client_ip, intern_user_agent
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -35,8 +38,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         company = validated_data.pop('company', '')
         position = validated_data.pop('position', '')
         gdpr_consent = validated_data.pop('gdpr_consent')
+        password = validated_data.pop('password')
         
-        user = User.objects.create_user(**validated_data)
+        # create_user() without the password, which is hashed through apps.authentication.hashing
+        user = User(**validated_data)
+        user.username = User.normalize_username(user.username)
+        user.email = User.objects.normalize_email(user.email)
+        set_password(user, password)
+        user.save()
         
         request = self.context.get('request')
         ip_address = get_client_ip(request) if request else None
@@ -57,7 +66,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
                 consent_type='data_processing',
                 consent_given=True,
                 ip_address=ip_address,
-                user_agent=request.META.get('HTTP_USER_AGENT', '') if request else ''
+                user_agent_ref_id=intern_user_agent(request.META.get('HTTP_USER_AGENT', '')) if request else None
             )
         
         return user
@@ -127,7 +136,7 @@ class PasswordChangeSerializer(serializers.Serializer):
 
     def validate_current_password(self, value):
         user = self.context['request'].user
-        if not user.check_password(value):
+        if not check_password(user, value):
             raise serializers.ValidationError("Current password is incorrect.")
         return value
 
@@ -138,7 +147,7 @@ class PasswordChangeSerializer(serializers.Serializer):
 
     def save(self):
         user = self.context['request'].user
-        user.set_password(self.validated_data['new_password'])
+        set_password(user, self.validated_data['new_password'])
         user.save()
         return user
 
@@ -153,5 +162,19 @@ class GDPRConsentSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         validated_data['user'] = request.user
         validated_data['ip_address'] = get_client_ip(request)
-        validated_data['user_agent'] = request.META.get('HTTP_USER_AGENT', '')
-        return super().create(validated_data)
\ No newline at end of file
+        validated_data['user_agent_ref_id'] = intern_user_agent(request.META.get('HTTP_USER_AGENT', ''))
+        return super().create(validated_data)
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = AuditLog
+        fields = ('id', 'action', 'model_name', 'object_id', 'object_repr', 'changes',
+                 'username', 'timestamp')
+        read_only_fields = fields
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    token_class = RefreshToken
@@ -0,0 +1,15 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import UserProfile
+from .user_cache import user_cache
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_cached_profile_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.user_id)
@@ -0,0 +1,114 @@
+import threading
+import time
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from apps.authentication.audit import AuditLogWriter
+from apps.authentication.models import AuditLog
+
+
+def entry(n=0):
+    return AuditLog(action='VIEW', model_name='Contract', object_id=str(n))
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the audit writer')
+        time.sleep(0.01)
+
+
+class AsyncWriterTests(TransactionTestCase):
+    """The writer thread uses its own connection, so rows must be committed for it to share the database"""
+
+    def test_full_batches_written_without_waiting(self):
+        writer = AuditLogWriter(batch_size=5, flush_interval=30)
+        self.addCleanup(writer.shutdown)
+        for n in range(12):
+            writer.write(entry(n))
+
+        wait_until(lambda: writer.written == 10)
+        self.assertEqual(writer.flushes, 2)
+        # The last two wait for the next flush interval
+        time.sleep(0.1)
+        self.assertEqual(AuditLog.objects.count(), 10)
+        self.assertEqual(writer.stats()['queue_depth'], 0)
+
+    def test_partial_batch_written_after_interval(self):
+        writer = AuditLogWriter(batch_size=100, flush_interval=0.1)
+        self.addCleanup(writer.shutdown)
+        writer.write(entry())
+        wait_until(lambda: writer.written == 1)
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_shutdown_flushes_pending_entries(self):
+        writer = AuditLogWriter(batch_size=100, flush_interval=30)
+        for n in range(3):
+            writer.write(entry(n))
+
+        started = time.monotonic()
+        writer.shutdown()
+        # Woken rather than left to time out on the join
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(writer.written, 3)
+
+    def test_stats_logged_periodically(self):
+        writer = AuditLogWriter(batch_size=1, flush_interval=0.05, stats_interval=0.05)
+        self.addCleanup(writer.shutdown)
+        with self.assertLogs('apps.authentication.audit', 'INFO') as logs:
+            writer.write(entry())
+            wait_until(lambda: any("'written': 1" in line for line in logs.output))
+
+
+class QueueFullTests(TestCase):
+    def writer(self, on_full):
+        writer = AuditLogWriter(queue_size=2, on_full=on_full)
+        # No writer thread, so the queue stays full until flushed here
+        patcher = mock.patch.object(writer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return writer
+
+    def test_drop(self):
+        writer = self.writer('drop')
+        for n in range(3):
+            writer.write(entry(n))
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertEqual(writer.stats()['queue_depth'], 2)
+
+        writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 2)
+
+    def test_inline(self):
+        writer = self.writer('inline')
+        for n in range(3):
+            writer.write(entry(n))
+        self.assertEqual(writer.written, 1)
+        self.assertEqual(writer.dropped, 0)
+        self.assertEqual(list(AuditLog.objects.values_list('object_id', flat=True)), ['2'])
+
+    def test_block(self):
+        writer = self.writer('block')
+        writer.write(entry(0))
+        writer.write(entry(1))
+
+        blocked = threading.Thread(target=writer.write, args=(entry(2),))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        writer.flush()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(writer.dropped, 0)
+
+    def test_stats_logged_at_shutdown(self):
+        writer = self.writer('drop')
+        writer.write(entry())
+        with self.assertLogs('apps.authentication.audit', 'INFO') as logs:
+            writer.shutdown()
+        self.assertIn("'written': 1", logs.output[0])
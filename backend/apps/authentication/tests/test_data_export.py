@@ -0,0 +1,184 @@
+import io
+import json
+import tempfile
+import time
+import zipfile
+from unittest import mock
+from django.test import TestCase
+from apps.authentication import data_export
+from apps.authentication.models import AuditLog, GDPRRecord, LoginAttempt, UserAgent, UserProfile
+from apps.jobs import queue
+from apps.jobs.models import Job
+from apps.nextcrm.models import ContractAmendment
+from apps.nextcrm.tests.helpers import authenticate, make_contract, make_user
+
+EXPORT_URL = '/api/auth/gdpr/export'
+
+
+def read_zip(content):
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        return {
+            name: [json.loads(line) for line in archive.read(name).decode('utf-8').splitlines()]
+            for name in archive.namelist() if name.endswith('.jsonl')
+        }
+
+
+class DataExportTestCase(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch('apps.authentication.data_export.STORAGE_DIR', tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = make_user()
+        self.other = make_user('other')
+        authenticate(self.client, self.user)
+
+
+class ExportContentsTests(DataExportTestCase):
+    def setUp(self):
+        super().setUp()
+        UserProfile.objects.filter(user=self.user).update(company='Acme Grain', last_login_ip='10.0.0.1')
+        agent = UserAgent.objects.create(user_agent_hash='a' * 64, user_agent='Mozilla/5.0')
+        GDPRRecord.objects.create(user=self.user, consent_type='marketing', consent_given=True, user_agent_ref=agent)
+        AuditLog.objects.create(user=self.user, action='VIEW', model_name='Contract', user_agent='legacy-agent/1.0')
+        AuditLog.objects.create(user=self.other, action='VIEW', model_name='Contract')
+        LoginAttempt.objects.create(username='trader', ip_address='10.0.0.1', successful=False,
+                                    failure_reason='bad password', user_agent_ref=agent)
+        LoginAttempt.objects.create(username='other', ip_address='10.0.0.2', successful=True)
+
+        self.authored = make_contract(created_by=self.user)
+        self.approved = make_contract(approved_by=self.user)
+        make_contract(created_by=self.other)
+        ContractAmendment.objects.create(
+            contract=self.authored, amendment_number='A1', amendment_type='price', description='Reprice',
+            requested_by=self.user,
+        )
+
+    def test_sections(self):
+        sections = read_zip(b''.join(data_export.stream_export(self.user)))
+        self.assertEqual(set(sections), {name for name, *_ in data_export.SECTIONS})
+
+        self.assertEqual([row['username'] for row in sections['account.jsonl']], ['trader'])
+        self.assertEqual(sections['profile.jsonl'][0]['company'], 'Acme Grain')
+        self.assertEqual(sections['gdpr_records.jsonl'][0]['user_agent'], 'Mozilla/5.0')
+        self.assertEqual([row['user_agent'] for row in sections['audit_logs.jsonl']], ['legacy-agent/1.0'])
+
+        [attempt] = sections['login_attempts.jsonl']
+        self.assertEqual(
+            (attempt['ip_address'], attempt['failure_reason'], attempt['user_agent']),
+            ('10.0.0.1', 'bad password', 'Mozilla/5.0'),
+        )
+        self.assertNotIn('user_agent_ref__user_agent', attempt)
+
+        self.assertEqual(
+            {row['contract_number'] for row in sections['contracts.jsonl']},
+            {self.authored.contract_number, self.approved.contract_number},
+        )
+        authored = next(row for row in sections['contracts.jsonl'] if row['id'] == str(self.authored.pk))
+        self.assertEqual(authored['created_by_id'], self.user.pk)
+        self.assertEqual(
+            [row['contract__contract_number'] for row in sections['contract_amendments.jsonl']],
+            [self.authored.contract_number],
+        )
+
+    def test_inline_download(self):
+        response = self.client.get(EXPORT_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        sections = read_zip(b''.join(response.streaming_content))
+        self.assertEqual(len(sections['login_attempts.jsonl']), 1)
+        self.assertTrue(AuditLog.objects.filter(user=self.user, action='EXPORT').exists())
+
+
+class BackgroundExportTests(DataExportTestCase):
+    def run_export_job(self, export_id):
+        job = queue.claim('test-worker', ['gdpr_export'])
+        self.assertEqual(str(job.pk), export_id)
+        self.assertTrue(queue.run_job(job))
+
+    def status(self, export_id, client=None):
+        return (client or self.client).get(f'{EXPORT_URL}/{export_id}').json()
+
+    def test_background_requested(self):
+        response = self.client.get(EXPORT_URL, {'background': '1'})
+        self.assertEqual(response.status_code, 202)
+        export_id = response.json()['export_id']
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(self.status(export_id)['status'], 'pending')
+
+        self.run_export_job(export_id)
+        status = self.status(export_id)
+        self.assertEqual(status['status'], 'ready')
+
+        download = self.client.get(f"{EXPORT_URL}/download/{status['download_token']}")
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download['Cache-Control'], 'no-store')
+        sections = read_zip(b''.join(download.streaming_content))
+        self.assertEqual(sections['account.jsonl'][0]['username'], 'trader')
+
+    def test_large_history_goes_to_background(self):
+        AuditLog.objects.create(user=self.user, action='VIEW')
+        with mock.patch('apps.authentication.views.INLINE_MAX_ROWS', 0):
+            response = self.client.get(EXPORT_URL)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(Job.objects.filter(pk=response.json()['export_id'], created_by=self.user).exists())
+
+    def test_status_hidden_from_other_users(self):
+        export_id = self.client.get(EXPORT_URL, {'background': '1'}).json()['export_id']
+        other_client = authenticate(self.client_class(), self.other)
+        self.assertEqual(other_client.get(f'{EXPORT_URL}/{export_id}').status_code, 404)
+
+    def test_download_refused_for_other_user(self):
+        export_id = self.client.get(EXPORT_URL, {'background': '1'}).json()['export_id']
+        self.run_export_job(export_id)
+        token = self.status(export_id)['download_token']
+
+        other_client = authenticate(self.client_class(), self.other)
+        response = other_client.get(f'{EXPORT_URL}/download/{token}')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['code'], 'INVALID_DOWNLOAD_TOKEN')
+
+    def test_download_refused_after_expiry(self):
+        export_id = self.client.get(EXPORT_URL, {'background': '1'}).json()['export_id']
+        self.run_export_job(export_id)
+        token = self.status(export_id)['download_token']
+
+        later = time.time() + data_export.TOKEN_MAX_AGE + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            response = self.client.get(f'{EXPORT_URL}/download/{token}')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['code'], 'INVALID_DOWNLOAD_TOKEN')
+
+    def test_forged_token(self):
+        response = self.client.get(f'{EXPORT_URL}/download/not-a-token')
+        self.assertEqual(response.status_code, 404)
+
+
+class AsgiDataExportTests(DataExportTestCase):
+    def setUp(self):
+        super().setUp()
+        authenticate(self.async_client, self.user)
+
+    async def test_inline_export_streams(self):
+        response = await self.async_client.get(EXPORT_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(read_zip(content)['account.jsonl'][0]['username'], 'trader')
+
+    async def test_download_streams(self):
+        path = f'{data_export.STORAGE_DIR}/export-1.zip'
+        with open(path, 'wb') as handle:
+            handle.write(b'x' * 200000)
+        token = data_export.make_download_token('export-1', self.user.pk)
+
+        response = await self.async_client.get(f'{EXPORT_URL}/download/{token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], '200000')
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), b'x' * 200000)
@@ -0,0 +1,258 @@
+import gzip
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from apps.authentication import erasure, retention
+from apps.authentication.models import AuditLog, ErasureRequest, GDPRRecord, LoginAttempt, UserAgent, UserProfile
+from apps.nextcrm.tests.helpers import make_user
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        return [json.loads(line) for line in archive]
+
+
+class ScrubInChunksTests(TestCase):
+    def setUp(self):
+        self.attempts = [
+            LoginAttempt.objects.create(username='trader', ip_address=f'10.0.0.{i}', successful=False)
+            for i in range(1, 8)
+        ]
+        LoginAttempt.objects.create(username='other', ip_address='10.0.1.1', successful=True)
+
+    def test_updates_every_row_in_chunks(self):
+        chunks = []
+        count = erasure.scrub_in_chunks(
+            LoginAttempt.objects.filter(username='trader'), {'ip_address': erasure.SCRUBBED_IP},
+            chunk_size=3, on_chunk=lambda last_pk, count: chunks.append((last_pk, count)),
+        )
+        self.assertEqual(count, 7)
+        self.assertEqual(chunks, [
+            (self.attempts[2].pk, 3), (self.attempts[5].pk, 3), (self.attempts[6].pk, 1),
+        ])
+        self.assertEqual(set(LoginAttempt.objects.filter(username='trader').values_list('ip_address', flat=True)),
+                         {erasure.SCRUBBED_IP})
+        self.assertEqual(LoginAttempt.objects.get(username='other').ip_address, '10.0.1.1')
+
+    def test_resumes_after_last_pk(self):
+        count = erasure.scrub_in_chunks(
+            LoginAttempt.objects.filter(username='trader'), {'ip_address': erasure.SCRUBBED_IP},
+            chunk_size=2, last_pk=self.attempts[3].pk,
+        )
+        self.assertEqual(count, 3)
+        scrubbed = LoginAttempt.objects.filter(ip_address=erasure.SCRUBBED_IP).values_list('pk', flat=True)
+        self.assertEqual(sorted(scrubbed), [attempt.pk for attempt in self.attempts[4:]])
+
+    def test_range_update_skips_rows_outside_queryset(self):
+        # 'other' sits between the trader rows by pk but is not part of the queryset
+        LoginAttempt.objects.filter(pk=self.attempts[3].pk).update(username='other')
+        erasure.scrub_in_chunks(
+            LoginAttempt.objects.filter(username='trader'), {'ip_address': erasure.SCRUBBED_IP}, chunk_size=10,
+        )
+        self.assertEqual(LoginAttempt.objects.get(pk=self.attempts[3].pk).ip_address, '10.0.0.4')
+
+
+class ErasureTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = Path(tmp.name)
+
+        self.user = make_user('leaving')
+        self.other = make_user('staying')
+        UserProfile.objects.filter(user=self.user).update(phone='555-0100', last_login_ip='10.0.0.9')
+        self.agent = UserAgent.objects.create(user_agent_hash='a' * 64, user_agent='Mozilla/5.0')
+        self.logs = [
+            AuditLog.objects.create(user=self.user, action='VIEW', ip_address='10.0.0.9',
+                                    user_agent_ref=self.agent, session_key='abc')
+            for _ in range(5)
+        ]
+        AuditLog.objects.create(user=self.other, action='VIEW', ip_address='10.0.0.8')
+        AuditLog.objects.create(action='UPDATE', model_name='User', object_id=str(self.user.pk),
+                                object_repr='leaving <leaving@example.com>', changes={'email': 'leaving@example.com'})
+        LoginAttempt.objects.create(username='leaving', ip_address='10.0.0.9', successful=True)
+        GDPRRecord.objects.create(user=self.user, consent_type='marketing', consent_given=True, ip_address='10.0.0.9')
+
+    def request(self, **kwargs):
+        return ErasureRequest.objects.create(user=self.user, username='leaving', **kwargs)
+
+    def assertErased(self):
+        self.assertFalse(AuditLog.objects.filter(user=self.user, ip_address__isnull=False).exists())
+        self.assertFalse(AuditLog.objects.filter(user=self.user, user_agent_ref__isnull=False).exists())
+        subject = AuditLog.objects.get(model_name='User')
+        self.assertEqual((subject.object_repr, subject.changes), ('', {}))
+        self.assertEqual(LoginAttempt.objects.get().username, f'deleted_user_{self.user.pk}')
+        self.assertIsNone(GDPRRecord.objects.get().ip_address)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.phone, profile.last_login_ip), ('', None))
+        self.assertEqual(AuditLog.objects.get(user=self.other).ip_address, '10.0.0.8')
+
+    def test_process(self):
+        request = self.request()
+        steps = []
+        self.assertTrue(erasure.process_erasure(
+            request.pk, chunk_size=2, on_step=lambda index, total, name: steps.append((index, total, name)),
+            archive_dir=self.archive_dir,
+        ))
+        self.assertErased()
+
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.username), ('completed', ''))
+        self.assertEqual(request.progress['audit_logs']['scrubbed'], 5)
+        self.assertEqual([name for _, _, name in steps], [
+            'audit_logs', 'audit_subject', 'login_attempts', 'gdpr_records', 'profile', 'archives', '',
+        ])
+        self.assertEqual(steps[-1][:2], (6, 6))
+
+    def test_resumes_from_progress(self):
+        ordered = sorted(self.logs, key=lambda log: log.pk)
+        # Interrupted after the first two audit rows; those are left as they are to prove they are skipped
+        request = self.request(status='failed', progress={
+            'audit_logs': {'last_pk': str(ordered[1].pk), 'scrubbed': 2, 'done': False},
+            'audit_subject': {'last_pk': None, 'scrubbed': 0, 'done': True},
+        })
+        self.assertTrue(erasure.process_erasure(request.pk, chunk_size=2, archive_dir=self.archive_dir))
+
+        request.refresh_from_db()
+        self.assertEqual(request.progress['audit_logs']['scrubbed'], 5)
+        self.assertEqual(
+            set(AuditLog.objects.filter(user=self.user, ip_address__isnull=False).values_list('pk', flat=True)),
+            {ordered[0].pk, ordered[1].pk},
+        )
+        self.assertEqual(AuditLog.objects.get(model_name='User').object_repr, 'leaving <leaving@example.com>')
+
+    def test_failure_keeps_progress(self):
+        request = self.request()
+        scrub_in_chunks = erasure.scrub_in_chunks
+
+        def interrupted(queryset, values, chunk_size, last_pk, on_chunk):
+            def stop_after_first_chunk(last_pk, count):
+                on_chunk(last_pk, count)
+                raise RuntimeError('connection lost')
+            return scrub_in_chunks(queryset, values, chunk_size, last_pk, stop_after_first_chunk)
+
+        with mock.patch('apps.authentication.erasure.scrub_in_chunks', side_effect=interrupted):
+            with self.assertRaises(RuntimeError), self.assertLogs('apps.authentication.erasure', 'ERROR'):
+                erasure.process_erasure(request.pk, chunk_size=2, archive_dir=self.archive_dir)
+
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.error), ('failed', 'connection lost'))
+        self.assertEqual(request.progress['audit_logs']['scrubbed'], 2)
+
+        self.assertTrue(erasure.process_erasure(request.pk, chunk_size=2, archive_dir=self.archive_dir))
+        request.refresh_from_db()
+        self.assertEqual(request.progress['audit_logs']['scrubbed'], 5)
+        self.assertErased()
+
+    def test_archives(self):
+        march = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        AuditLog.objects.filter(pk=self.logs[0].pk).update(timestamp=march + timedelta(days=3))
+        AuditLog.objects.filter(user=self.other).update(timestamp=march + timedelta(days=4))
+        AuditLog.objects.filter(model_name='User').update(timestamp=march + timedelta(days=5))
+        LoginAttempt.objects.update(timestamp=march + timedelta(days=6))
+        retention.archive_month(AuditLog, march, self.archive_dir)
+        retention.archive_month(LoginAttempt, march, self.archive_dir)
+        untouched = self.archive_dir / 'unrelated_202403.jsonl.gz'
+        untouched.write_bytes(b'not an archive')
+
+        request = self.request()
+        erasure.process_erasure(request.pk, archive_dir=self.archive_dir)
+
+        audit = {row['user_id']: row for row in read_archive(self.archive_dir / 'authentication_auditlog_202403.jsonl.gz')}
+        self.assertEqual(
+            {key: audit[self.user.pk][key] for key in ('ip_address', 'session_key', 'user_agent_ref_id', 'user_agent_ref__user_agent')},
+            {'ip_address': None, 'session_key': '', 'user_agent_ref_id': None, 'user_agent_ref__user_agent': None},
+        )
+        self.assertEqual(audit[self.other.pk]['ip_address'], '10.0.0.8')
+        self.assertEqual((audit[None]['object_repr'], audit[None]['changes']), ('', {}))
+
+        [attempt] = read_archive(self.archive_dir / 'authentication_loginattempt_202403.jsonl.gz')
+        self.assertEqual((attempt['username'], attempt['ip_address']), (f'deleted_user_{self.user.pk}', erasure.SCRUBBED_IP))
+
+        request.refresh_from_db()
+        self.assertEqual(request.progress['archives']['scrubbed'], 3)
+        self.assertEqual(sorted(request.progress['archives']['files']), [
+            'authentication_auditlog_202403.jsonl.gz', 'authentication_loginattempt_202403.jsonl.gz',
+        ])
+        self.assertEqual(untouched.read_bytes(), b'not an archive')
+        self.assertEqual(sorted(path.name for path in self.archive_dir.iterdir()), [
+            'authentication_auditlog_202403.jsonl.gz', 'authentication_loginattempt_202403.jsonl.gz',
+            'unrelated_202403.jsonl.gz',
+        ])
+
+    def test_archive_without_matches_is_left_alone(self):
+        path = self.archive_dir / 'authentication_auditlog_202401.jsonl.gz'
+        with gzip.open(path, 'wt', encoding='utf-8') as archive:
+            archive.write(json.dumps({'user_id': self.other.pk, 'ip_address': '10.0.0.8'}) + '\n')
+        before = path.stat().st_mtime_ns
+
+        self.assertEqual(erasure.scrub_archive(path, erasure._archive_rules(self.request())[AuditLog._meta.db_table]), 0)
+        self.assertEqual(path.stat().st_mtime_ns, before)
+        self.assertEqual([p.name for p in self.archive_dir.iterdir()], [path.name])
+
+
+class ClaimTests(TestCase):
+    def setUp(self):
+        self.request = ErasureRequest.objects.create(user=make_user(), username='trader')
+
+    def test_only_one_claim_wins(self):
+        self.assertTrue(erasure.claim(self.request.pk))
+        # Another worker sees it running with a fresh heartbeat
+        self.assertFalse(erasure.claim(self.request.pk))
+        self.assertFalse(erasure.process_erasure(self.request.pk))
+        self.assertNotIn(self.request.pk, erasure.pending_erasures())
+
+    def test_stale_claim_taken_over(self):
+        erasure.claim(self.request.pk)
+        ErasureRequest.objects.filter(pk=self.request.pk).update(
+            updated_at=timezone.now() - erasure.STALE_AFTER - timedelta(seconds=1))
+        self.assertIn(self.request.pk, erasure.pending_erasures())
+        self.assertTrue(erasure.claim(self.request.pk))
+
+    def test_failed_retried_completed_not(self):
+        ErasureRequest.objects.filter(pk=self.request.pk).update(status='failed')
+        self.assertTrue(erasure.claim(self.request.pk))
+        ErasureRequest.objects.filter(pk=self.request.pk).update(status='completed')
+        self.assertFalse(erasure.claim(self.request.pk))
+
+
+class ScrubExpiredIpsTests(TestCase):
+    def test_scrubs_only_expired_rows(self):
+        user = make_user()
+        old = timezone.now() - timedelta(days=91)
+        agent = UserAgent.objects.create(user_agent_hash='b' * 64, user_agent='curl/8.0')
+
+        old_log = AuditLog.objects.create(user=user, action='VIEW', ip_address='10.0.0.1', user_agent_ref=agent, timestamp=old)
+        new_log = AuditLog.objects.create(user=user, action='VIEW', ip_address='10.0.0.2')
+        old_attempt = LoginAttempt.objects.create(username='trader', ip_address='10.0.0.3', successful=False)
+        new_attempt = LoginAttempt.objects.create(username='trader', ip_address='10.0.0.4', successful=False)
+        LoginAttempt.objects.filter(pk=old_attempt.pk).update(timestamp=old)
+        old_record = GDPRRecord.objects.create(user=user, consent_type='marketing', consent_given=True, ip_address='10.0.0.5')
+        GDPRRecord.objects.filter(pk=old_record.pk).update(consent_date=old)
+
+        chunks = []
+        results = erasure.scrub_expired_ips(90, chunk_size=1, on_chunk=lambda name, count: chunks.append(name))
+        self.assertEqual(results, {'audit_log': 1, 'login_attempt': 1, 'gdpr_record': 1})
+        self.assertEqual(chunks, ['audit_log', 'login_attempt', 'gdpr_record'])
+
+        old_log.refresh_from_db()
+        self.assertEqual((old_log.ip_address, old_log.user_agent_ref), (None, None))
+        self.assertEqual(AuditLog.objects.get(pk=new_log.pk).ip_address, '10.0.0.2')
+        self.assertEqual(LoginAttempt.objects.get(pk=old_attempt.pk).ip_address, erasure.SCRUBBED_IP)
+        self.assertEqual(LoginAttempt.objects.get(pk=new_attempt.pk).ip_address, '10.0.0.4')
+        self.assertIsNone(GDPRRecord.objects.get(pk=old_record.pk).ip_address)
+
+        # Already-scrubbed rows are not matched again
+        self.assertEqual(erasure.scrub_expired_ips(90), {'audit_log': 0, 'login_attempt': 0, 'gdpr_record': 0})
+
+    def test_command(self):
+        AuditLog.objects.create(action='VIEW', ip_address='10.0.0.1', timestamp=timezone.now() - timedelta(days=200))
+        out = StringIO()
+        call_command('scrub_expired_ips', '--retention-days', '90', stdout=out)
+        self.assertIn('audit_log: scrubbed 1 rows', out.getvalue())
@@ -0,0 +1,129 @@
+import json
+import threading
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.authentication import views
+from apps.authentication.hashing import HashingModelBackend, hashing_executor, offload_view
+from apps.nextcrm.tests.helpers import make_user
+
+PASSWORD = 'traderpass123'
+
+
+class OffloadedHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.factory = APIRequestFactory()
+
+        # Record which thread each hash runs on
+        self.hash_threads = []
+        for method in ('encode', 'verify'):
+            original = getattr(MD5PasswordHasher, method)
+            patcher = mock.patch.object(
+                MD5PasswordHasher, method, autospec=True,
+                side_effect=lambda *args, original=original: self.record_hash(original, *args),
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record_hash(self, original, *args):
+        self.hash_threads.append(threading.current_thread().name)
+        return original(*args)
+
+    def login(self, password=PASSWORD):
+        request = self.factory.post('/api/auth/login', {'username': 'trader', 'password': password}, format='json')
+        return offload_view(views.LoginView.as_view())(request)
+
+    def assertHashedOnPool(self):
+        self.assertTrue(self.hash_threads)
+        self.assertTrue(all(name.startswith('password-hashing') for name in self.hash_threads), self.hash_threads)
+
+    def test_login_hashes_on_pool(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertHashedOnPool()
+        # The view's queries ran on this thread's connection, not on the pool
+        self.assertTrue(any('"auth_user"' in query['sql'] for query in queries))
+
+    def test_wrong_password(self):
+        response = self.login('wrong-password')
+        self.assertEqual(response.status_code, 401)
+        self.assertHashedOnPool()
+
+    def test_unknown_user_still_hashes(self):
+        self.assertIsNone(HashingModelBackend().authenticate(None, username='nobody', password=PASSWORD))
+        self.assertTrue(self.hash_threads)
+
+    def test_inline_outside_offloaded_views(self):
+        self.assertEqual(authenticate(username='trader', password=PASSWORD), self.user)
+        self.assertEqual(set(self.hash_threads), {threading.current_thread().name})
+
+    def test_register(self):
+        request = self.factory.post('/api/auth/register', {
+            'username': 'newtrader', 'email': 'New@Example.COM', 'password': 'Str0ng-passphrase!',
+            'password_confirm': 'Str0ng-passphrase!', 'gdpr_consent': True,
+        }, format='json')
+        response = offload_view(views.RegisterView.as_view())(request)
+        self.assertEqual(response.status_code, 201)
+        self.assertHashedOnPool()
+
+        user = User.objects.get(username='newtrader')
+        self.assertEqual(user.email, 'New@example.com')
+        self.assertTrue(user.check_password('Str0ng-passphrase!'))
+
+    def test_password_change(self):
+        request = self.factory.post('/api/auth/password/change', {
+            'current_password': PASSWORD, 'new_password': 'Str0ng-passphrase!',
+            'new_password_confirm': 'Str0ng-passphrase!',
+        }, format='json')
+        force_authenticate(request, self.user)
+        response = offload_view(views.PasswordChangeView.as_view())(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertHashedOnPool()
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('Str0ng-passphrase!'))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.UnsaltedMD5PasswordHasher',
+    ])
+    def test_outdated_hash_upgraded(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password(PASSWORD, hasher='unsalted_md5'))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+        self.assertTrue(self.user.check_password(PASSWORD))
+
+    def test_busy_pool_refuses(self):
+        rejected = hashing_executor.rejected
+        with mock.patch.object(hashing_executor, 'max_pending', 0), \
+                mock.patch.object(views.login_throttle, 'register_failure') as register_failure, \
+                self.assertLogs('apps.authentication.hashing', 'WARNING'):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(json.loads(response.content)['code'], 'HASHING_BUSY')
+        self.assertEqual(hashing_executor.rejected, rejected + 1)
+        # A busy server is not a failed login
+        register_failure.assert_not_called()
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """Logins are served from other threads, which only see committed rows"""
+
+    def test_runs(self):
+        out = StringIO()
+        call_command('benchmark_password_hashing', logins=4, concurrency=2, stdout=out)
+        self.assertIn('Hashing offloaded:', out.getvalue())
+        self.assertNotIn('401', out.getvalue())
+        self.assertFalse(User.objects.filter(username='hashing-benchmark').exists())
@@ -0,0 +1,173 @@
+import json
+import logging
+import sys
+import threading
+from io import StringIO
+from unittest import TestCase, mock
+from apps.authentication.log_filters import AuthenticationLogFilter
+from apps.authentication.log_handlers import JSONFormatter, QueuedStreamHandler
+
+
+def make_record(msg, *args, level=logging.WARNING, exc_info=None, name='apps.test'):
+    return logging.LogRecord(name, level, '/app/apps/test/views.py', 42, msg, args or None, exc_info)
+
+
+class JSONFormatterTests(TestCase):
+    def test_shape(self):
+        record = make_record('Login for %s failed', 'müller', name='apps.authentication.views')
+        payload = json.loads(JSONFormatter().format(record))
+        self.assertEqual(set(payload), {'time', 'level', 'logger', 'message', 'module', 'process', 'thread'})
+        self.assertRegex(payload['time'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$')
+        self.assertEqual(payload['level'], 'WARNING')
+        self.assertEqual(payload['logger'], 'apps.authentication.views')
+        self.assertEqual(payload['message'], 'Login for müller failed')
+        self.assertEqual(payload['module'], 'views')
+
+    def test_one_line_with_exception(self):
+        try:
+            raise ValueError('bad\nvalue')
+        except ValueError:
+            record = make_record('Boom', level=logging.ERROR, exc_info=sys.exc_info())
+        line = JSONFormatter().format(record)
+        self.assertNotIn('\n', line)
+        payload = json.loads(line)
+        self.assertIn('ValueError: bad', payload['exc_info'])
+        self.assertNotIn('stack_info', payload)
+
+    def test_unserializable_values_stringified(self):
+        record = make_record('%s', object())
+        record.msg, record.args = {'key': object()}, None
+        self.assertIn("'key'", json.loads(JSONFormatter().format(record))['message'])
+
+
+class QueuedStreamHandlerTests(TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.handler = QueuedStreamHandler(queue_size=100, stream=self.stream)
+        self.handler.setFormatter(JSONFormatter())
+        self.addCleanup(self.handler.stop)
+        self.logger = logging.getLogger('apps.test.queued')
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def lines(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_stop_drains_queue(self):
+        for n in range(50):
+            self.logger.warning('record %d', n)
+        self.handler.stop()
+        self.assertEqual([line['message'] for line in self.lines()], [f'record {n}' for n in range(50)])
+        self.assertEqual(self.handler.stats()['queue_depth'], 0)
+
+    def test_written_from_listener_thread(self):
+        threads = []
+        emit = self.handler.target.emit
+        with mock.patch.object(self.handler.target, 'emit',
+                               side_effect=lambda record: (threads.append(threading.get_ident()), emit(record))):
+            self.logger.warning('hello')
+            self.handler.stop()
+        [line] = self.lines()
+        # The record keeps the caller's thread, the write happens on the listener's
+        self.assertEqual(line['thread'], threading.get_ident())
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_interpolated_at_call_site(self):
+        values = ['before']
+        self.logger.warning('values %s', values)
+        values[0] = 'after'
+        try:
+            raise KeyError('missing')
+        except KeyError:
+            self.logger.exception('failed')
+        self.handler.stop()
+        first, second = self.lines()
+        self.assertEqual(first['message'], "values ['before']")
+        self.assertIn("KeyError: 'missing'", second['exc_info'])
+
+    def test_full_queue_drops_and_reports(self):
+        handler = QueuedStreamHandler(queue_size=2, stream=self.stream)
+        handler.setFormatter(JSONFormatter())
+        self.addCleanup(handler.stop)
+
+        # Hold the listener on the first record so the queue fills up behind it
+        release = threading.Event()
+        emitting = threading.Event()
+        emit = handler.target.emit
+
+        def slow_emit(record):
+            emitting.set()
+            release.wait(5)
+            emit(record)
+
+        with mock.patch.object(handler.target, 'emit', side_effect=slow_emit):
+            handler.handle(make_record('first'))
+            self.assertTrue(emitting.wait(5))
+            for n in range(5):
+                handler.handle(make_record('queued %d', n))
+            self.assertEqual(handler.stats()['dropped'], 3)
+            release.set()
+            # Called while the queue is still full: it waits for room and drains
+            handler.stop()
+
+        messages = [line['message'] for line in self.lines()]
+        self.assertEqual(messages, ['first', 'queued 0', 'queued 1', 'Logging queue full, dropped 3 records'])
+
+    def test_drops_reported_with_next_record(self):
+        handler = QueuedStreamHandler(queue_size=5, stream=self.stream)
+        self.addCleanup(handler.stop)
+        handler.dropped = handler._unreported = 2
+        handler.handle(make_record('next'))
+        handler.stop()
+        self.assertEqual(self.stream.getvalue().splitlines(), ['Logging queue full, dropped 2 records', 'next'])
+
+
+@mock.patch('apps.authentication.log_filters.time.time')
+class AuthenticationLogFilterTests(TestCase):
+    def setUp(self):
+        self.filter = AuthenticationLogFilter(max_repeats=3, time_window=60)
+
+    def allowed(self, count, msg='Unauthorized: /api/auth/profile'):
+        return [self.filter.filter(make_record(msg)) for _ in range(count)]
+
+    def test_repeats_suppressed_and_counted(self, now):
+        now.return_value = 1000.0
+        with self.assertLogs('apps.authentication.log_filters', 'WARNING') as logs:
+            self.assertEqual(self.allowed(6), [True, True, True, False, False, False])
+        # Reported once, on the first suppression
+        [report] = logs.output
+        self.assertIn('Total suppressed so far: 1', report)
+
+        # A minute later the bucket is full again and the next report carries the running total
+        now.return_value = 1061.0
+        self.assertEqual(self.allowed(3), [True, True, True])
+        with self.assertLogs('apps.authentication.log_filters', 'WARNING') as logs:
+            self.assertEqual(self.allowed(1), [False])
+        self.assertIn('Total suppressed so far: 4', logs.output[0])
+
+    def test_tokens_refill_over_window(self, now):
+        now.return_value = 1000.0
+        with self.assertLogs('apps.authentication.log_filters', 'WARNING'):
+            self.allowed(4)
+        # max_repeats over 60 s is one token every 20 s
+        now.return_value = 1020.0
+        self.assertEqual(self.allowed(1), [True])
+        with mock.patch('apps.authentication.log_filters.logging.getLogger') as get_logger:
+            self.assertEqual(self.allowed(1), [False])
+        # The minute since the last report has not passed yet
+        get_logger.assert_not_called()
+
+    def test_patterns_have_separate_buckets(self, now):
+        now.return_value = 1000.0
+        with self.assertLogs('apps.authentication.log_filters', 'WARNING'):
+            self.allowed(4)
+        self.assertEqual(self.allowed(1, 'POST /api/auth/token/refresh HTTP/1.1" 401 58'), [True])
+
+    def test_other_records_pass(self, now):
+        now.return_value = 1000.0
+        with self.assertLogs('apps.authentication.log_filters', 'WARNING'):
+            self.allowed(4)
+        self.assertEqual(self.allowed(5, 'Contract export finished'), [True] * 5)
+        info = make_record('Unauthorized: /api/auth/profile', level=logging.INFO)
+        self.assertTrue(self.filter.filter(info))
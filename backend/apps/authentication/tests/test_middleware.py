@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication.models import UserProfile
+
+
+class SessionAuthTests(TestCase):
+    """JWTCookieMiddleware must not discard the session user set for the admin"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'adminpass123')
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+    def login(self):
+        self.client.get('/admin/login/')
+        response = self.client.post('/admin/login/', {
+            'username': 'admin', 'password': 'adminpass123', 'next': '/admin/',
+            'csrfmiddlewaretoken': self.client.cookies['csrftoken'].value,
+        })
+        self.assertRedirects(response, '/admin/', fetch_redirect_response=False)
+
+    def test_admin_login_keeps_session(self):
+        self.login()
+        response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.admin)
+
+    @override_settings(API_MIDDLEWARE_PROFILE='full')
+    def test_admin_login_keeps_session_full_profile(self):
+        self.login()
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+    def test_invalid_cookie_keeps_session(self):
+        self.login()
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = 'not-a-token'
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+    def test_admin_login_refused_without_csrf(self):
+        response = self.client.post('/admin/login/', {'username': 'admin', 'password': 'adminpass123'})
+        self.assertEqual(response.status_code, 403)
+
+
+class JWTCookieTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('trader', 'trader@example.com', 'traderpass123')
+        UserProfile.objects.create(user=self.user)
+
+    def test_api_request_with_cookie(self):
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(AccessToken.for_user(self.user))
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_request_without_cookie(self):
+        response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.status_code, 401)
+
+
+class MiddlewareProfileTests(TestCase):
+    """The lean profile skips the browser middleware for API requests only"""
+
+    def test_lean_api_request_skips_session(self):
+        response = self.client.get('/api/auth/profile/')
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+
+    def test_lean_profile_keeps_session_outside_api(self):
+        response = self.client.get('/admin/login/')
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+    @override_settings(API_MIDDLEWARE_PROFILE='full')
+    def test_full_profile_runs_session_middleware(self):
+        response = self.client.get('/api/auth/profile/')
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+
+    def test_auth_failure_keeps_cors_headers(self):
+        response = self.client.get('/api/auth/profile/', HTTP_ORIGIN='http://localhost:3000')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'http://localhost:3000')
+        self.assertEqual(response['Access-Control-Allow-Credentials'], 'true')
+
+    def test_frame_options(self):
+        self.assertEqual(self.client.get('/admin/login/')['X-Frame-Options'], 'DENY')
@@ -0,0 +1,108 @@
+import gzip
+import json
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.core.management import call_command
+from django.test import TestCase
+from apps.authentication import retention
+from apps.authentication.models import AuditLog, LoginAttempt, UserAgent
+
+NOW = datetime(2024, 6, 15, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def at(year, month, day=1, hour=0):
+    return datetime(year, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        return [json.loads(line) for line in archive]
+
+
+@mock.patch('apps.authentication.retention.timezone.now', return_value=NOW)
+class RetentionTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = Path(tmp.name)
+
+    def log(self, timestamp, **kwargs):
+        return AuditLog.objects.create(action='UPDATE', model_name='Contract', timestamp=timestamp, **kwargs)
+
+    def test_month_helpers(self, _):
+        self.assertEqual(retention.month_start(at(2024, 3, 17, 9)), at(2024, 3))
+        self.assertEqual(retention.next_month(at(2024, 1, 31)), at(2024, 2))
+        self.assertEqual(retention.next_month(at(2023, 12, 5)), at(2024, 1))
+        self.assertEqual(retention.partition_name(AuditLog, at(2024, 3)), 'authentication_auditlog_p202403')
+
+    def test_archivable_months_empty(self, _):
+        self.assertEqual(retention.archivable_months(AuditLog, 30), [])
+
+    def test_archivable_months_stop_before_cutoff(self, _):
+        self.log(at(2023, 11, 20))
+        self.log(at(2024, 5, 2))
+        # 60 days before NOW is 2024-04-16, so April itself is still kept
+        self.assertEqual(
+            retention.archivable_months(AuditLog, 60),
+            [at(2023, 11), at(2023, 12), at(2024, 1), at(2024, 2), at(2024, 3)],
+        )
+        self.assertEqual(retention.archivable_months(AuditLog, 365), [])
+
+    def test_archive_month_in_chunks(self, _):
+        agent = UserAgent.objects.create(user_agent_hash='a' * 64, user_agent='Mozilla/5.0')
+        march = [self.log(at(2024, 3, day), user_agent_ref=agent) for day in (1, 9, 20, 31)]
+        february = self.log(at(2024, 2, 29, 23))
+        april = self.log(at(2024, 4, 1))
+
+        path, count = retention.archive_month(AuditLog, at(2024, 3), self.archive_dir, chunk_size=3)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(path.name, 'authentication_auditlog_202403.jsonl.gz')
+        rows = read_archive(path)
+        self.assertEqual([row['id'] for row in rows], [str(log.pk) for log in march])
+        self.assertEqual({row['user_agent_ref__user_agent'] for row in rows}, {'Mozilla/5.0'})
+        self.assertEqual(set(AuditLog.objects.values_list('pk', flat=True)), {february.pk, april.pk})
+
+    def test_rerun_appends(self, _):
+        self.log(at(2024, 3, 5))
+        path, _ = retention.archive_month(AuditLog, at(2024, 3), self.archive_dir)
+        # A row that arrived late, e.g. an interrupted run picked up again
+        self.log(at(2024, 3, 6))
+        path_again, count = retention.archive_month(AuditLog, at(2024, 3), self.archive_dir)
+        self.assertEqual((path_again, count), (path, 1))
+        self.assertEqual(len(read_archive(path)), 2)
+
+    def test_login_attempts(self, _):
+        attempt = LoginAttempt.objects.create(username='trader', ip_address='10.0.0.1', successful=False)
+        LoginAttempt.objects.filter(pk=attempt.pk).update(timestamp=at(2024, 1, 10))
+        self.assertEqual(retention.archivable_months(LoginAttempt, 90), [at(2024, 1), at(2024, 2)])
+        _, count = retention.archive_month(LoginAttempt, at(2024, 1), self.archive_dir)
+        self.assertEqual(count, 1)
+        self.assertFalse(LoginAttempt.objects.exists())
+
+    def test_not_partitioned_on_sqlite(self, _):
+        self.assertFalse(retention.is_partitioned(AuditLog))
+        self.assertEqual(retention.ensure_partitions(AuditLog), [])
+
+    def test_command(self, _):
+        self.log(at(2024, 1, 5))
+        self.log(at(2024, 2, 5))
+        self.log(at(2024, 6, 1))
+        out = StringIO()
+        call_command(
+            'archive_audit_logs', '--model', 'audit_log', '--retention-days', '60',
+            '--archive-dir', str(self.archive_dir), '--dry-run', stdout=out,
+        )
+        self.assertIn('would archive 2024-01', out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+        call_command(
+            'archive_audit_logs', '--model', 'audit_log', '--retention-days', '60',
+            '--archive-dir', str(self.archive_dir), '--max-months', '1', stdout=StringIO(),
+        )
+        archived = sorted(path.name for path in self.archive_dir.iterdir())
+        self.assertEqual(archived, ['authentication_auditlog_202401.jsonl.gz'])
+        self.assertEqual(AuditLog.objects.count(), 2)
@@ -0,0 +1,81 @@
+import threading
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from apps.authentication.throttling import CircuitBreaker, LoginThrottle, RateLimit, registration_limit
+
+# A moment in the middle of a window, so no hit lands in the next bucket
+NOW = 1_700_000_030.0
+
+
+def run_threads(count, target):
+    """Start `count` threads on target(index) together and collect the results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@mock.patch('apps.authentication.throttling.time.time', return_value=NOW)
+class ConcurrentCounterTests(TestCase):
+    threads = 20
+
+    def setUp(self):
+        cache.clear()
+
+    def test_no_hit_lost(self, _):
+        limit = RateLimit('test_hits', limit=1000, window=60)
+        counts = run_threads(self.threads, lambda index: [limit.hit('1.2.3.4') for _ in range(10)])
+        self.assertEqual(limit.count('1.2.3.4'), self.threads * 10)
+        # Every hit saw a different count
+        self.assertEqual(sorted(sum(counts, [])), list(range(1, self.threads * 10 + 1)))
+
+    def test_acquire_admits_exactly_the_limit(self, _):
+        limit = RateLimit('test_acquire', limit=5, window=60)
+        allowed = run_threads(self.threads, lambda index: limit.acquire('1.2.3.4'))
+        self.assertEqual(allowed.count(True), 5)
+        self.assertEqual(limit.count('1.2.3.4'), self.threads)
+        self.assertFalse(limit.acquire('1.2.3.4'))
+        self.assertTrue(limit.acquire('5.6.7.8'))
+
+    def test_lockout_happens_once(self, _):
+        throttle = LoginThrottle(max_failures=5, ip_max_failures=100)
+        with mock.patch('apps.authentication.throttling.UserProfile.objects') as profiles:
+            results = run_threads(self.threads, lambda index: throttle.register_failure('trader', '1.2.3.4'))
+        self.assertEqual(sorted(result['failures'] for result in results), list(range(1, self.threads + 1)))
+        self.assertEqual([result['locked_now'] for result in results].count(True), 1)
+        self.assertEqual(sum(result['should_log'] for result in results), 5)
+        self.assertEqual(profiles.filter.call_count, 1)
+        self.assertEqual(throttle.check('trader', '1.2.3.4'), (True, False))
+
+    def test_breaker_opens_at_limit(self, _):
+        breaker = CircuitBreaker('test_breaker', limit=5, window=60)
+        run_threads(4, lambda index: breaker.record_failure('family'))
+        self.assertFalse(breaker.is_open('family'))
+        breaker.record_failure('family')
+        self.assertTrue(breaker.is_open('family'))
+        breaker.record_success('family')
+        self.assertFalse(breaker.is_open('family'))
+
+
+class RegisterThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch.object(registration_limit, 'limit', 3)
+    def test_concurrent_attempts(self):
+        # An empty payload fails validation, so every admitted request is a 400
+        statuses = run_threads(10, lambda index: self.client_class().post(
+            '/api/auth/register', {}, content_type='application/json', REMOTE_ADDR='10.0.0.1',
+        ).status_code)
+        self.assertEqual(sorted(statuses), [400] * 3 + [429] * 7)
+        self.assertEqual(registration_limit.count('10.0.0.1'), 10)
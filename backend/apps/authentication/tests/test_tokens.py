@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from apps.authentication import tokens
+from apps.authentication.tokens import RefreshToken, TokenBlacklistFilter
+from apps.nextcrm.tests.helpers import make_user
+
+
+def shared_cache(value):
+    return mock.patch.object(TokenBlacklistFilter, 'shared_cache', new_callable=mock.PropertyMock, return_value=value)
+
+
+class TokenBlacklistFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.blacklisted = RefreshToken.for_user(self.user)
+        self.blacklisted.blacklist()
+        self.valid = RefreshToken.for_user(self.user)
+
+    def test_per_process_cache_checks_database(self):
+        blacklist = TokenBlacklistFilter()
+        with shared_cache(False):
+            with self.assertNumQueries(1):
+                self.assertFalse(blacklist.contains(self.valid['jti']))
+            with self.assertNumQueries(1):
+                self.assertTrue(blacklist.contains(self.blacklisted['jti']))
+        self.assertEqual(blacklist.stats()['entries'], 0)
+
+    def test_unseen_jti_skips_database(self):
+        blacklist = TokenBlacklistFilter()
+        blacklist.rebuild()
+        with shared_cache(True):
+            self.assertTrue(blacklist.contains(self.blacklisted['jti']))
+            with self.assertNumQueries(0):
+                self.assertFalse(blacklist.contains(self.valid['jti']))
+        self.assertEqual(blacklist.skipped, 1)
+
+    def test_catches_up_on_other_workers(self):
+        blacklist, other_worker = TokenBlacklistFilter(), TokenBlacklistFilter()
+        blacklist.rebuild()
+        with shared_cache(True):
+            self.assertFalse(blacklist.contains(self.valid['jti']))
+            token = OutstandingToken.objects.get(jti=self.valid['jti'])
+            BlacklistedToken.objects.create(token=token)
+            other_worker.added(self.valid['jti'])
+            self.assertTrue(blacklist.contains(self.valid['jti']))
+
+    def test_sized_for_live_tokens(self):
+        blacklist = TokenBlacklistFilter(capacity=1)
+        blacklist.rebuild()
+        # One live entry against a capacity of one would otherwise trigger a rebuild on every check
+        self.assertEqual(blacklist.stats()['capacity'], 2)
+        self.assertFalse(blacklist._needs_rebuild())
+
+    def test_catch_up_skips_expired_rows_loaded_before(self):
+        # Blacklisted after the live token but already expired, so it sits above the newest live id
+        expired = OutstandingToken.objects.create(
+            jti='expired', token='expired', expires_at=timezone.now() - timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(token=expired)
+
+        # No overlap, which would reload the newest rows regardless
+        blacklist = TokenBlacklistFilter(sync_overlap=0)
+        blacklist.rebuild()
+        TokenBlacklistFilter().added('other-worker')
+        with shared_cache(True):
+            self.assertFalse(blacklist.contains(self.valid['jti']))
+        self.assertEqual(blacklist.stats()['entries'], 1)
+
+    def test_disabled(self):
+        blacklist = TokenBlacklistFilter(enabled=False)
+        with shared_cache(True), self.assertNumQueries(1):
+            self.assertTrue(blacklist.contains(self.blacklisted['jti']))
+
+
+class BackgroundRebuildTests(TransactionTestCase):
+    """The rebuild thread reads through its own connection, so the rows must be committed"""
+
+    def setUp(self):
+        cache.clear()
+        user = make_user()
+        self.blacklisted = RefreshToken.for_user(user)
+        self.blacklisted.blacklist()
+        self.valid = RefreshToken.for_user(user)
+
+    def test_database_answers_until_first_build(self):
+        blacklist = TokenBlacklistFilter()
+        with shared_cache(True):
+            self.assertTrue(blacklist.contains(self.blacklisted['jti']))
+            self.assertFalse(blacklist.contains(self.valid['jti']))
+            self.assertEqual(blacklist.skipped, 0)
+
+            blacklist._rebuild_thread.join(5)
+            self.assertEqual(blacklist.stats()['entries'], 1)
+            self.assertFalse(blacklist.contains(self.valid['jti']))
+            self.assertEqual(blacklist.skipped, 1)
+        self.assertEqual(blacklist.rebuilds, 1)
+
+    def test_checks_do_not_wait_for_rebuild(self):
+        blacklist = TokenBlacklistFilter(rebuild_interval=0)
+        blacklist.rebuild()
+        release = threading.Event()
+        bloom_filter = tokens.BloomFilter
+
+        def slow_bloom_filter(*args):
+            release.wait(5)
+            return bloom_filter(*args)
+
+        with shared_cache(True), mock.patch('apps.authentication.tokens.BloomFilter', side_effect=slow_bloom_filter):
+            started = time.monotonic()
+            self.assertTrue(blacklist.contains(self.blacklisted['jti']))
+            self.assertFalse(blacklist.contains(self.valid['jti']))
+            # Answered from the old filter while the new one is still loading
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertTrue(blacklist.stats()['rebuilding'])
+
+            release.set()
+            blacklist._rebuild_thread.join(5)
+        self.assertEqual(blacklist.rebuilds, 2)
+        self.assertEqual(blacklist.skipped, 1)
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+
+    def refresh(self, token):
+        self.client.cookies[settings.SIMPLE_JWT['REFRESH_COOKIE']] = str(token)
+        return self.client.post('/api/auth/token/refresh', {}, content_type='application/json')
+
+    def test_rotated_token_cannot_be_replayed(self):
+        token = RefreshToken.for_user(self.user)
+        first = self.refresh(token)
+        self.assertEqual(first.status_code, 200)
+        rotated = first.cookies[settings.SIMPLE_JWT['REFRESH_COOKIE']].value
+        self.assertNotEqual(rotated, str(token))
+
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(rotated).status_code, 200)
+
+
+class CompactTokensTests(TestCase):
+    def test_deletes_expired_only(self):
+        user = make_user()
+        expired = RefreshToken.for_user(user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        current = RefreshToken.for_user(user)
+
+        out = StringIO()
+        call_command('compact_tokens', '--dry-run', stdout=out)
+        self.assertIn('Would delete 1 outstanding tokens (1 blacklisted)', out.getvalue())
+
+        call_command('compact_tokens', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [current['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_run_and_clear(self):
+        out = StringIO()
+        call_command('benchmark_token_blacklist', '--seed', '50', '--samples', '10', '--refreshes', '3', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Seeded 50 blacklisted tokens', output)
+        self.assertIn('Refresh with rotation, fast path on', output)
+        self.assertEqual(BlacklistedToken.objects.filter(token__token='benchmark').count(), 50)
+
+        call_command('benchmark_token_blacklist', '--clear', stdout=out)
+        self.assertIn('Deleted 50 seeded tokens', out.getvalue())
+        self.assertFalse(OutstandingToken.objects.exists())
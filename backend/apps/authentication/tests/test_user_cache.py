@@ -0,0 +1,63 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication import user_cache as user_cache_module
+from apps.authentication.authentication import CachedJWTAuthentication
+from apps.authentication.user_cache import VERSION_KEY, bump_version, user_cache
+from apps.nextcrm.tests.helpers import authenticate, make_user
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = make_user()
+        self.token = AccessToken.for_user(self.user)
+
+    def load(self):
+        return CachedJWTAuthentication().get_user(self.token)
+
+    def test_cached_between_requests(self):
+        self.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.load().pk, self.user.pk)
+
+    def test_deactivation_drops_cached_user(self):
+        authenticate(self.client, self.user)
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_password_change_drops_cached_user(self):
+        self.load()
+        self.user.set_password('changed-pass-456')
+        self.user.save()
+        self.assertTrue(self.load().check_password('changed-pass-456'))
+
+    def test_evicted_version_does_not_repeat(self):
+        key = VERSION_KEY.format(user_id=self.user.pk)
+        cache.set(key, 1, None)
+        self.load()
+        # Evicted, then a save: counting up from a fixed start would land on
+        # 1 again and the cached user would look current
+        cache.delete(key)
+        bump_version(self.user.pk)
+        self.assertNotEqual(user_cache_module.get_version(self.user.pk), 1)
+        self.assertIsNone(user_cache.get(self.user.pk))
+
+    def test_change_during_load_is_not_cached_as_current(self):
+        load = JWTAuthentication.get_user
+
+        def load_then_change(auth, validated_token):
+            user = load(auth, validated_token)
+            # Another worker saves the user while this one is still loading it
+            bump_version(user.pk)
+            return user
+
+        with mock.patch.object(JWTAuthentication, 'get_user', load_then_change):
+            self.load()
+        self.assertIsNone(user_cache.get(self.user.pk))
@@ -0,0 +1,26 @@
+from unittest import mock
+from django.test import TestCase
+from apps.authentication import utils
+from apps.authentication.models import UserAgent
+
+
+class InternUserAgentTests(TestCase):
+    def setUp(self):
+        utils._user_agent_ids.clear()
+        self.addCleanup(utils._user_agent_ids.clear)
+
+    def test_reuses_row(self):
+        first = utils.intern_user_agent('Mozilla/5.0')
+        with self.assertNumQueries(0):
+            self.assertEqual(utils.intern_user_agent('Mozilla/5.0'), first)
+        self.assertEqual(UserAgent.objects.count(), 1)
+        self.assertIsNone(utils.intern_user_agent(''))
+
+    @mock.patch('apps.authentication.utils.USER_AGENT_CACHE_SIZE', 2)
+    def test_cache_is_bounded(self):
+        for agent in ('a', 'b', 'c'):
+            utils.intern_user_agent(agent)
+        self.assertEqual(list(utils._user_agent_ids), ['b', 'c'])
+        # Evicted from this worker's map, but the row is found again
+        self.assertEqual(utils.intern_user_agent('a'), UserAgent.objects.get(user_agent='a').pk)
+        self.assertEqual(UserAgent.objects.count(), 3)
@@ -0,0 +1,204 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import UserProfile
+
+
+def _cache_id(value):
+    # Usernames and IPs can hold characters some cache backends reject in keys
+    return hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+
+
+def _incr(key, timeout):
+    """Atomically increment key, creating it with timeout on first use"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        pass
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        # Another process created it between incr() and add()
+        return cache.incr(key)
+    except ValueError:
+        # ...and it expired again straight away
+        cache.set(key, 1, timeout)
+        return 1
+
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding-window counter kept in the Django cache.
+
+    Hits land in fixed buckets of `window` seconds. The count weights the
+    previous bucket by how much of it still overlaps the window, which avoids
+    the burst-at-the-boundary problem of a plain fixed window.
+    """
+
+    def __init__(self, prefix, window):
+        self.prefix = prefix
+        self.window = window
+
+    def _keys(self, identifier, now):
+        bucket = int(now // self.window)
+        base = f"{self.prefix}:{_cache_id(identifier)}"
+        overlap = 1 - (now % self.window) / self.window
+        return f"{base}:{bucket}", f"{base}:{bucket - 1}", overlap
+
+    def _weighted(self, current, previous, overlap):
+        return current + int(previous * overlap)
+
+    def hit(self, identifier):
+        now = time.time()
+        current_key, previous_key, overlap = self._keys(identifier, now)
+        current = _incr(current_key, self.window * 2)
+        previous = cache.get(previous_key, 0)
+        return self._weighted(current, previous, overlap)
+
+    def count(self, identifier):
+        return self.count_many([identifier])[identifier]
+
+    def count_many(self, identifiers, extra_keys=()):
+        """Counts for several identifiers (plus raw extra_keys) in one cache round trip"""
+        now = time.time()
+        layout = {identifier: self._keys(identifier, now) for identifier in identifiers}
+        keys = [key for current_key, previous_key, _ in layout.values() for key in (current_key, previous_key)]
+        values = cache.get_many(keys + list(extra_keys))
+
+        counts = {
+            identifier: self._weighted(values.get(current_key, 0), values.get(previous_key, 0), overlap)
+            for identifier, (current_key, previous_key, overlap) in layout.items()
+        }
+        for key in extra_keys:
+            counts[key] = values.get(key)
+        return counts
+
+    def reset(self, identifier):
+        current_key, previous_key, _ = self._keys(identifier, time.time())
+        cache.delete_many([current_key, previous_key])
+
+
+class RateLimit:
+    """
+    Sliding-window rate limit: at most `limit` hits per `window` seconds for
+    each identifier (an IP, a username, ...).
+
+    Counting uses cache incr(), so concurrent hits from several threads or
+    workers are never lost; is_limited() is a single cache round trip.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.counter = SlidingWindowCounter(f"ratelimit:{name}", window)
+
+    def hit(self, identifier):
+        return self.counter.hit(identifier)
+
+    def acquire(self, identifier):
+        """
+        Count a hit and say whether it is within the limit. The decision uses
+        the count the increment returned, so concurrent callers can never all
+        slip in under it the way is_limited() followed by hit() could.
+        """
+        return self.counter.hit(identifier) <= self.limit
+
+    def count(self, identifier):
+        return self.counter.count(identifier)
+
+    def is_limited(self, identifier):
+        return self.counter.count(identifier) >= self.limit
+
+    def reset(self, identifier):
+        self.counter.reset(identifier)
+
+
+class CircuitBreaker(RateLimit):
+    """RateLimit over failures: open once `limit` failures land inside the window"""
+
+    def is_open(self, identifier):
+        return self.is_limited(identifier)
+
+    def record_failure(self, identifier):
+        return self.hit(identifier)
+
+    def record_success(self, identifier):
+        self.reset(identifier)
+
+
+class LoginThrottle:
+    """
+    Failed-login bookkeeping kept in cache counters.
+
+    Usernames are locked for `lockout_seconds` after `max_failures` failures;
+    IPs are throttled once their sliding-window failure count passes
+    `ip_max_failures`. The database only sees the lockout transition.
+    """
+
+    def __init__(self, max_failures=5, lockout_seconds=1800, ip_max_failures=20, ip_window_seconds=300):
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.ip_max_failures = ip_max_failures
+        self.ip_failures = RateLimit('login_failures:ip', ip_max_failures, ip_window_seconds)
+
+    def _failures_key(self, username):
+        return f"login_failures:user:{_cache_id(username)}"
+
+    def _lock_key(self, username):
+        return f"login_locked:{_cache_id(username)}"
+
+    def check(self, username, ip):
+        """Return (username_locked, ip_throttled) with a single cache read"""
+        lock_key = self._lock_key(username)
+        counts = self.ip_failures.counter.count_many([ip], extra_keys=[lock_key])
+        return counts[lock_key] is not None, counts[ip] >= self.ip_max_failures
+
+    def register_failure(self, username, ip):
+        failures = _incr(self._failures_key(username), self.lockout_seconds)
+        ip_failures = self.ip_failures.hit(ip)
+
+        locked_now = failures == self.max_failures
+        if locked_now:
+            locked_until = timezone.now() + timezone.timedelta(seconds=self.lockout_seconds)
+            cache.set(self._lock_key(username), locked_until.isoformat(), self.lockout_seconds)
+            # Persist only the state change, not every attempt
+            UserProfile.objects.filter(user__username=username).update(
+                failed_login_attempts=failures, account_locked_until=locked_until, updated_at=timezone.now()
+            )
+
+        return {
+            'failures': failures,
+            'ip_failures': ip_failures,
+            'locked_now': locked_now,
+            # Past the thresholds further attempts are only counted, not written
+            'should_log': failures <= self.max_failures and ip_failures <= self.ip_max_failures,
+        }
+
+    def register_success(self, username):
+        cache.delete_many([self._failures_key(username), self._lock_key(username)])
+
+
+_config = getattr(settings, 'LOGIN_THROTTLE', {})
+
+login_throttle = LoginThrottle(
+    max_failures=_config.get('MAX_FAILURES', 5),
+    lockout_seconds=_config.get('LOCKOUT_SECONDS', 1800),
+    ip_max_failures=_config.get('IP_MAX_FAILURES', 20),
+    ip_window_seconds=_config.get('IP_WINDOW_SECONDS', 300),
+)
+
+_limits = getattr(settings, 'RATE_LIMITS', {})
+
+refresh_breaker = CircuitBreaker(
+    'refresh_failures',
+    limit=_limits.get('REFRESH_MAX_FAILURES', 5),
+    window=_limits.get('REFRESH_WINDOW_SECONDS', 300),
+)
+
+registration_limit = RateLimit(
+    'register',
+    limit=_limits.get('REGISTER_MAX_ATTEMPTS', 10),
+    window=_limits.get('REGISTER_WINDOW_SECONDS', 3600),
+)
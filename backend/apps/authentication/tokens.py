@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_KEY = 'token_blacklist_seq'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenBlacklistFilter:
+    """
+    Per-worker Bloom filter of blacklisted refresh token jtis.
+
+    A jti the filter has never seen is not blacklisted, so the common refresh
+    skips the database; a filter hit is confirmed against BlacklistedToken.
+    The filter catches up on new BlacklistedToken rows by id, only when the
+    sequence in SEQUENCE_KEY has moved. The catch-up re-reads the last
+    `sync_overlap` ids, covering rows whose ids were allocated before a
+    concurrent insert but committed after it.
+
+    Full rebuilds (first use, after a fork, at capacity, every
+    rebuild_interval) load every unexpired blacklisted jti, which takes
+    seconds at a few hundred thousand rows, so they run on a background
+    thread and swap the new filter in when done. Until the first one lands
+    checks go to the database.
+
+    Needs a cache shared by all workers (Redis), since that sequence is how
+    one worker learns of another's blacklisting. With a per-process cache
+    (locmem) every check goes straight to the database: catching up on each
+    check would cost more than the single indexed lookup it saves.
+    """
+
+    def __init__(self, enabled=True, capacity=1000000, error_rate=0.001, rebuild_interval=3600, sync_overlap=256):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.sync_overlap = sync_overlap
+
+        self._bloom = None
+        self._last_id = 0
+        # Ids inside the overlap window already loaded, so catch-ups skip hashing them again
+        self._recent_ids = set()
+        self._sequence = None
+        self._built_at = 0.0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._rebuild_thread = None
+
+        self.skipped = 0
+        self.db_checks = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+        self.last_rebuild_seconds = 0.0
+
+    @property
+    def shared_cache(self):
+        backend = settings.CACHES['default']['BACKEND']
+        return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+    def _db_contains(self, jti):
+        self.db_checks += 1
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def _read_sequence(self):
+        sequence = cache.get(SEQUENCE_KEY)
+        if sequence is None:
+            # Random start so a flushed cache never lands back on a value a worker already saw
+            cache.add(SEQUENCE_KEY, random.randint(0, 2 ** 30), None)
+        return sequence
+
+    @staticmethod
+    def _load(bloom, rows, last_id):
+        for token_id, jti in rows:
+            if jti not in bloom:
+                bloom.add(jti)
+            last_id = max(last_id, token_id)
+        return last_id
+
+    def rebuild(self):
+        """Load every unexpired blacklisted jti into a new filter and swap it in"""
+        started = time.monotonic()
+        # Read first: anything blacklisted while loading moves it, and the next check catches up
+        sequence = self._read_sequence()
+        # Catch-ups start from the newest row of any age: ids are not ordered by expiry, so the
+        # newest live id could sit below millions of expired rows that _sync would then load
+        last_id = BlacklistedToken.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now(), id__lte=last_id)
+        # Headroom over the live rows, or a filter already at capacity would be rebuilt on every check
+        bloom = BloomFilter(max(self.capacity, 2 * live.count()), self.error_rate)
+        self._load(bloom, live.values_list('id', 'token__jti').iterator(chunk_size=5000), last_id)
+        with self._lock:
+            self._bloom = bloom
+            self._last_id = last_id
+            self._recent_ids = set()
+            self._sequence = sequence
+            self._built_at = time.monotonic()
+            self._pid = os.getpid()
+            self.rebuilds += 1
+            self.last_rebuild_seconds = self._built_at - started
+
+    def _needs_rebuild(self):
+        return (
+            self._bloom is None
+            or self._pid != os.getpid()
+            or self._bloom.count >= self._bloom.capacity
+            or time.monotonic() - self._built_at > self.rebuild_interval
+        )
+
+    def _start_rebuild(self):
+        with self._lock:
+            # A thread started before a fork does not survive into the child, so is_alive() is False there
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(target=self._run_rebuild, name='token-blacklist-rebuild', daemon=True)
+            self._rebuild_thread.start()
+
+    def _run_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Token blacklist filter rebuild failed')
+        finally:
+            connection.close()
+
+    def _sync(self):
+        sequence = self._read_sequence()
+        if sequence is not None and sequence == self._sequence:
+            return
+
+        rows = [
+            row for row in BlacklistedToken.objects.filter(id__gt=self._last_id - self.sync_overlap)
+            .values_list('id', 'token__jti')
+            if row[0] not in self._recent_ids
+        ]
+        self._last_id = self._load(self._bloom, rows, self._last_id)
+        window_start = self._last_id - self.sync_overlap
+        self._recent_ids = {token_id for token_id in self._recent_ids if token_id > window_start}
+        self._recent_ids.update(token_id for token_id, _ in rows if token_id > window_start)
+        self._sequence = sequence
+
+    def contains(self, jti):
+        if not self.enabled or not self.shared_cache:
+            return self._db_contains(jti)
+
+        if self._needs_rebuild():
+            # The current filter, if any, stays correct while it is stale: it only answers more hits
+            self._start_rebuild()
+
+        with self._lock:
+            bloom = self._bloom
+            if bloom is not None:
+                self._sync()
+                if jti not in bloom:
+                    self.skipped += 1
+                    return False
+
+        if self._db_contains(jti):
+            return True
+        if bloom is not None:
+            self.false_positives += 1
+        return False
+
+    def added(self, jti):
+        """Record a jti just written to BlacklistedToken"""
+        with self._lock:
+            if self._bloom is not None and jti not in self._bloom:
+                self._bloom.add(jti)
+        cache.add(SEQUENCE_KEY, random.randint(0, 2 ** 30), None)
+        try:
+            cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            pass
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'shared_cache': self.shared_cache,
+            'entries': self._bloom.count if self._bloom is not None else 0,
+            'capacity': self._bloom.capacity if self._bloom is not None else self.capacity,
+            'skipped': self.skipped,
+            'db_checks': self.db_checks,
+            'false_positives': self.false_positives,
+            'rebuilds': self.rebuilds,
+            'last_rebuild_seconds': round(self.last_rebuild_seconds, 2),
+            'rebuilding': self._rebuild_thread is not None and self._rebuild_thread.is_alive(),
+        }
+
+
+_config = getattr(settings, 'TOKEN_BLACKLIST', {})
+
+token_blacklist = TokenBlacklistFilter(
+    enabled=_config.get('FAST_PATH', False),
+    capacity=_config.get('CAPACITY', 1000000),
+    error_rate=_config.get('ERROR_RATE', 0.001),
+    rebuild_interval=_config.get('REBUILD_INTERVAL', 3600),
+)
+
+
+class RefreshToken(BaseRefreshToken):
+    """RefreshToken whose blacklist check goes through token_blacklist first"""
+
+    def check_blacklist(self):
+        if token_blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        token_blacklist.added(self.payload[api_settings.JTI_CLAIM])
+        return result
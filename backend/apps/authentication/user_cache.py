@@ -0,0 +1,108 @@
+import copy
+import random
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+
+VERSION_KEY = 'auth_user_version:{user_id}'
+
+
+class UserCache:
+    """
+    Bounded per-worker LRU of User objects with a TTL per entry.
+
+    Each entry remembers the shared version key of its user at load time, so a
+    change saved in another worker (profile edit, is_active flip, password
+    change) evicts it here on the next lookup.
+    """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, version, expires_at = entry
+        if time.monotonic() >= expires_at or get_version(user_id) != version:
+            self.invalidate(user_id, bump=False)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # Hand out a copy so per-request mutations never leak between requests
+        return copy.copy(user)
+
+    def set(self, user_id, user, version=None):
+        """
+        Cache user. Pass the version read before loading it, so a change
+        saved while the user was being loaded still evicts this entry.
+        """
+        user_id = str(user_id)
+        if version is None:
+            version = get_version(user_id)
+        entry = (copy.copy(user), version, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id, bump=True):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if bump:
+            bump_version(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _initial_version():
+    # Random start so an evicted key never comes back as a version some
+    # worker still holds a cached user under
+    return random.randint(0, 2 ** 30)
+
+
+def get_version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    key = VERSION_KEY.format(user_id=user_id)
+    # add() is a no-op when the key exists, so incr() below is always safe
+    cache.add(key, _initial_version(), None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+_config = getattr(settings, 'AUTH_USER_CACHE', {})
+
+user_cache = UserCache(
+    max_size=_config.get('MAX_SIZE', 1024),
+    ttl=_config.get('TTL', 60),
+)
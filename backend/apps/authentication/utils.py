@@ -1,7 +1,10 @@
 from django.conf import settings
 from django.contrib.auth.models import User
-from .models import LoginAttempt, AuditLog
+from .models import LoginAttempt, AuditLog, UserAgent
+from collections import OrderedDict
+import hashlib
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -15,18 +18,53 @@ def get_client_ip(request):
     return ip
 
 
+_config = getattr(settings, 'USER_AGENTS', {})
+
+# Per-worker map of User-Agent string to UserAgent id, so writes skip the lookup
+_user_agent_ids = OrderedDict()
+_user_agent_lock = threading.Lock()
+USER_AGENT_CACHE_SIZE = _config.get('CACHE_SIZE', 2048)
+
+
+def intern_user_agent(user_agent):
+    """Return the UserAgent id for user_agent, creating the row on first sight"""
+    if not user_agent:
+        return None
+
+    with _user_agent_lock:
+        user_agent_id = _user_agent_ids.get(user_agent)
+        if user_agent_id is not None:
+            _user_agent_ids.move_to_end(user_agent)
+            return user_agent_id
+
+    user_agent_hash = hashlib.sha256(user_agent.encode('utf-8')).hexdigest()
+    interned, _ = UserAgent.objects.only('id').get_or_create(
+        user_agent_hash=user_agent_hash, defaults={'user_agent': user_agent}
+    )
+
+    with _user_agent_lock:
+        _user_agent_ids[user_agent] = interned.id
+        while len(_user_agent_ids) > USER_AGENT_CACHE_SIZE:
+            _user_agent_ids.popitem(last=False)
+    return interned.id
+
+
 def log_login_attempt(request, username, successful, failure_reason=''):
     LoginAttempt.objects.create(
         username=username,
         ip_address=get_client_ip(request),
-        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        user_agent_ref_id=intern_user_agent(request.META.get('HTTP_USER_AGENT', '')),
         successful=successful,
         failure_reason=failure_reason
     )
 
 
 def log_audit_event(request, action, model_name='', object_id=None, object_repr='', changes=None):
+    # Record on the Django HttpRequest so AuditLogMiddleware sees it behind a DRF Request
+    user = getattr(request, 'user', None)
+    request = getattr(request, '_request', request)
     request._audit_log_data = {
+        'user': user,
         'action': action,
         'model_name': model_name,
         'object_id': object_id,
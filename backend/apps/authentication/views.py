@@ -2,23 +2,31 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.http import JsonResponse
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.http import FileResponse, JsonResponse
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.utils import timezone
-from django.core.cache import cache
-from .models import UserProfile, GDPRRecord, AuditLog
+from apps.jobs.models import Job
+from apps.jobs.queue import enqueue
+from apps.nextcrm.exports import stream_for_request, streaming_response
+from .models import UserProfile, GDPRRecord
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer,
-    PasswordChangeSerializer, GDPRConsentSerializer
+    PasswordChangeSerializer, GDPRConsentSerializer, TokenRefreshSerializer
 )
 from .utils import (
     get_client_ip, log_login_attempt, log_audit_event,
     set_jwt_cookies, clear_jwt_cookies
 )
+from .hashing import HashingBusy
+from .throttling import login_throttle, refresh_breaker, registration_limit
+from .tokens import RefreshToken
+from .erasure import queue_erasure
+from .data_export import (
+    INLINE_MAX_ROWS, export_file, export_filename, history_size, read_download_token, stream_export
+)
 import time
 
 
@@ -28,6 +36,13 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
     def create(self, request, *args, **kwargs):
+        client_ip = get_client_ip(request)
+        if not registration_limit.acquire(client_ip):
+            return Response({
+                'error': 'Too many registration attempts. Please try again later.',
+                'code': 'REGISTRATION_THROTTLED'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
@@ -48,6 +63,21 @@ class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        username = request.data.get('username', '')
+        client_ip = get_client_ip(request)
+
+        # Locked usernames and throttled IPs are turned away before any password hashing
+        username_locked, ip_throttled = login_throttle.check(username, client_ip)
+        if ip_throttled:
+            return Response({
+                'error': 'Too many failed login attempts. Please try again later.',
+                'code': 'LOGIN_THROTTLED'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if username_locked:
+            return Response({
+                'error': 'Invalid credentials'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
         serializer = UserLoginSerializer(data=request.data)
         
         try:
@@ -55,10 +85,9 @@ class LoginView(APIView):
             user = serializer.validated_data['user']
             
             # Reset failed attempts on successful login
+            login_throttle.register_success(username)
             if hasattr(user, 'profile'):
-                user.profile.reset_failed_attempts()
-                user.profile.last_login_ip = get_client_ip(request)
-                user.profile.save()
+                user.profile.record_login(client_ip)
             
             # Generate tokens
             refresh = RefreshToken.for_user(user)
@@ -83,18 +112,14 @@ class LoginView(APIView):
             
             return response
             
+        except HashingBusy:
+            # Not a failed attempt: offload_view answers with a 503
+            raise
         except Exception as e:
-            username = request.data.get('username', '')
-            
-            # Increment failed attempts for existing user
-            try:
-                user = User.objects.get(username=username)
-                if hasattr(user, 'profile'):
-                    user.profile.increment_failed_attempts()
-            except User.DoesNotExist:
-                pass
-            
-            log_login_attempt(request, username, False, str(e))
+            # Counted in cache; the profile is only written when the lockout starts
+            failure = login_throttle.register_failure(username, client_ip)
+            if failure['should_log']:
+                log_login_attempt(request, username, False, str(e))
             
             return Response({
                 'error': 'Invalid credentials'
@@ -130,14 +155,13 @@ class LogoutView(APIView):
 
 
 class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+
     def post(self, request, *args, **kwargs):
         client_ip = get_client_ip(request)
-        cache_key = f"refresh_circuit_breaker:{client_ip}"
         
         # Check circuit breaker
-        failure_count = cache.get(cache_key, 0)
-        if failure_count >= 5:  # After 5 failures, block for 5 minutes
-            cache.set(cache_key, failure_count, 300)  # 5 minutes
+        if refresh_breaker.is_open(client_ip):
             return Response({
                 'error': 'Too many failed refresh attempts. Please login again.',
                 'code': 'CIRCUIT_BREAKER_OPEN'
@@ -146,8 +170,7 @@ class CustomTokenRefreshView(TokenRefreshView):
         refresh_token = request.COOKIES.get(settings.SIMPLE_JWT['REFRESH_COOKIE'])
         
         if not refresh_token:
-            # Increment failure count
-            cache.set(cache_key, failure_count + 1, 300)
+            refresh_breaker.record_failure(client_ip)
             response = Response({
                 'error': 'Refresh token not found',
                 'code': 'NO_REFRESH_TOKEN'
@@ -162,7 +185,7 @@ class CustomTokenRefreshView(TokenRefreshView):
             
             if response.status_code == 200:
                 # Reset circuit breaker on success
-                cache.delete(cache_key)
+                refresh_breaker.record_success(client_ip)
                 
                 access_token = response.data['access']
                 
@@ -180,13 +203,25 @@ class CustomTokenRefreshView(TokenRefreshView):
                     samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'],
                 )
                 
+                # With ROTATE_REFRESH_TOKENS the old refresh token is now blacklisted
+                if 'refresh' in response.data:
+                    new_response.set_cookie(
+                        settings.SIMPLE_JWT['REFRESH_COOKIE'],
+                        response.data['refresh'],
+                        max_age=settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds(),
+                        httponly=settings.SIMPLE_JWT['REFRESH_COOKIE_HTTP_ONLY'],
+                        secure=settings.SIMPLE_JWT['REFRESH_COOKIE_SECURE'],
+                        samesite=settings.SIMPLE_JWT['REFRESH_COOKIE_SAMESITE'],
+                        domain=settings.SIMPLE_JWT['REFRESH_COOKIE_DOMAIN'],
+                        path=settings.SIMPLE_JWT['REFRESH_COOKIE_PATH'],
+                    )
+                
                 return new_response
             
             return response
             
         except (TokenError, InvalidToken):
-            # Increment failure count
-            cache.set(cache_key, failure_count + 1, 300)
+            refresh_breaker.record_failure(client_ip)
             
             response = Response({
                 'error': 'Invalid refresh token',
@@ -248,44 +283,68 @@ class GDPRConsentView(generics.ListCreateAPIView):
 
 
 class UserDataExportView(APIView):
+    """
+    Everything held about the user as a zip of JSONL files. Small histories
+    stream straight back; large ones (or ?background=1) are built by a
+    gdpr_export job and fetched later with a download token.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        profile = getattr(user, 'profile', None)
-        
-        user_data = {
-            'personal_info': {
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'date_joined': user.date_joined,
-                'last_login': user.last_login,
-            },
-            'profile': {
-                'phone': profile.phone if profile else '',
-                'company': profile.company if profile else '',
-                'position': profile.position if profile else '',
-                'timezone': profile.timezone if profile else '',
-                'gdpr_consent': profile.gdpr_consent if profile else False,
-                'gdpr_consent_date': profile.gdpr_consent_date if profile else None,
-            },
-            'gdpr_records': list(
-                GDPRRecord.objects.filter(user=user).values(
-                    'consent_type', 'consent_given', 'consent_date'
-                )
-            ),
-            'audit_logs': list(
-                AuditLog.objects.filter(user=user).values(
-                    'action', 'model_name', 'timestamp'
-                )[:100]  # Last 100 entries
-            )
-        }
-        
+        background = request.query_params.get('background') in ('1', 'true')
+
+        if background or history_size(user) > INLINE_MAX_ROWS:
+            export_job = enqueue('gdpr_export', {'user_id': user.id}, user=user)
+            log_audit_event(request, 'EXPORT', 'User', user.id, 'Data export requested (background)')
+            return Response({
+                'export_id': export_job.pk,
+                'status': 'pending',
+            }, status=status.HTTP_202_ACCEPTED)
+
+        response = streaming_response(request, stream_export(user), 'application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(user)}"'
+        response['Cache-Control'] = 'no-store'
         log_audit_event(request, 'EXPORT', 'User', user.id, 'Data export requested')
-        
-        return Response(user_data, status=status.HTTP_200_OK)
+        return response
+
+
+class UserDataExportStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    # Job status -> export status
+    EXPORT_STATUS = {'queued': 'pending', 'running': 'running', 'succeeded': 'ready', 'failed': 'failed'}
+
+    def get(self, request, export_id):
+        export_job = Job.objects.filter(pk=export_id, job_type='gdpr_export', created_by=request.user).first()
+        if export_job is None:
+            return Response({'error': 'Export not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'export_id': export_job.pk,
+            'status': self.EXPORT_STATUS[export_job.status],
+            'progress': export_job.progress,
+            'download_token': (export_job.result or {}).get('download_token'),
+        })
+
+
+class UserDataExportDownloadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, token):
+        payload = read_download_token(token)
+        if payload is None or payload[1] != request.user.id:
+            return Response({
+                'error': 'Download link is invalid or has expired',
+                'code': 'INVALID_DOWNLOAD_TOKEN'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        path = export_file(payload[0])
+        if path is None:
+            return Response({'error': 'Export not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=export_filename(request.user))
+        response['Cache-Control'] = 'no-store'
+        return stream_for_request(request, response)
 
 
 @api_view(['DELETE'])
@@ -293,6 +352,9 @@ class UserDataExportView(APIView):
 def delete_account(request):
     user = request.user
     
+    # Login attempts are recorded under the name the account had until now
+    original_username = user.username
+    
     # Anonymize user data instead of hard delete for audit trail
     user.username = f"deleted_user_{user.id}"
     user.email = f"deleted_{user.id}@example.com"
@@ -309,10 +371,14 @@ def delete_account(request):
         profile.gdpr_consent = False
         profile.save()
     
+    # Scrubs IPs and user agents across the audit tables in the background
+    erasure = queue_erasure(user, username=original_username)
+    
     log_audit_event(request, 'DELETE', 'User', user.id, 'Account deletion requested')
     
     response = Response({
-        'message': 'Account deleted successfully'
+        'message': 'Account deleted successfully',
+        'erasure_id': erasure.id
     }, status=status.HTTP_200_OK)
     
     clear_jwt_cookies(response)
@@ -0,0 +1,26 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'status', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'job_type', 'created_at')
+    search_fields = ('id', 'job_type', 'created_by__username')
+    readonly_fields = (
+        'job_type', 'payload', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'locked_at',
+        'heartbeat_at', 'progress', 'result', 'error', 'created_by', 'created_at', 'started_at', 'finished_at',
+    )
+    ordering = ('-created_at',)
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected failed jobs')
+    def retry_jobs(self, request, queryset):
+        count = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_after=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f"{count} jobs queued again")
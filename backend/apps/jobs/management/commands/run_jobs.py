@@ -0,0 +1,74 @@
+import signal
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from apps.jobs.queue import POLL_INTERVAL, claim, prune_finished, requeue_stale, run_job, worker_name
+from apps.jobs.registry import JOB_TYPES
+
+# Seconds between housekeeping passes (stale requeue, pruning)
+MAINTENANCE_INTERVAL = 60
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs, one at a time per process; start several '
+        'processes for more throughput. SIGTERM finishes the current job first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', dest='types', action='append',
+                            help='Only run this job type; repeat for several (default: all)')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Exit after this many jobs')
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        types = options['types']
+        unknown = sorted(set(types or ()) - set(JOB_TYPES))
+        if unknown:
+            raise CommandError(f"Unknown job types: {', '.join(unknown)} (known: {', '.join(sorted(JOB_TYPES))})")
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = worker_name()
+        self.stdout.write(f"Worker {worker} running {', '.join(types or sorted(JOB_TYPES))}")
+        processed = 0
+        last_maintenance = last_prune = 0
+
+        while not self.stopping:
+            now = time.monotonic()
+            if now - last_maintenance >= MAINTENANCE_INTERVAL:
+                requeued = requeue_stale()
+                if requeued:
+                    self.stdout.write(f"Requeued {requeued} stale jobs")
+                last_maintenance = now
+            if now - last_prune >= PRUNE_INTERVAL:
+                prune_finished()
+                last_prune = now
+
+            job = claim(worker, types)
+            if job is None:
+                close_old_connections()
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            succeeded = run_job(job)
+            elapsed = time.monotonic() - started
+            if succeeded:
+                self.stdout.write(self.style.SUCCESS(f"{job.job_type} {job.pk}: done in {elapsed:.1f}s"))
+            else:
+                self.stderr.write(f"{job.job_type} {job.pk}: failed after {elapsed:.1f}s (attempt {job.attempts})")
+            close_old_connections()
+
+            processed += 1
+            if options['max_jobs'] is not None and processed >= options['max_jobs']:
+                break
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,82 @@
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+# Minimum seconds between two progress writes for the same job
+PROGRESS_INTERVAL = 1.0
+
+
+class Job(models.Model):
+    """
+    A unit of background work, run by `manage.py run_jobs`. Workers claim
+    queued rows, bump `heartbeat_at` while running and, on failure, put the
+    job back with a later `run_after` until `max_attempts` is used up.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    priority = models.IntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    # {'done': n, 'total': n or None, 'message': str}
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['job_type', 'status']),
+            models.Index(fields=['status', 'heartbeat_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} {self.pk} ({self.status})"
+
+    def report_progress(self, done, total=None, message=''):
+        """
+        Record how far a running job has got; also counts as a heartbeat.
+        Calls closer together than PROGRESS_INTERVAL are dropped unless the
+        job has reached its total.
+        """
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        if not finished and now - getattr(self, '_progress_at', 0) < PROGRESS_INTERVAL:
+            return
+        self._progress_at = now
+        self.progress = {'done': done, 'total': total, 'message': message}
+        Job.objects.filter(pk=self.pk, status='running', locked_by=self.locked_by).update(
+            progress=self.progress, heartbeat_at=timezone.now(),
+        )
+
+
+class JobTypeLock(models.Model):
+    """
+    One row per job type with a concurrency limit. Claims of that type
+    update it first, which serializes them, so each claim counts the running
+    jobs only after every earlier claim has committed.
+    """
+    job_type = models.CharField(max_length=100, primary_key=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.job_type
@@ -0,0 +1,210 @@
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Job, JobTypeLock
+from .registry import JOB_TYPES, get_job_type
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'JOBS', {})
+POLL_INTERVAL = _config.get('POLL_INTERVAL', 2)
+# Running jobs whose worker has not sent a heartbeat for this long are requeued
+STALE_AFTER = timedelta(seconds=_config.get('STALE_AFTER_SECONDS', 300))
+HEARTBEAT_INTERVAL = STALE_AFTER.total_seconds() / 4
+RETRY_BASE_DELAY = _config.get('RETRY_BASE_DELAY', 30)
+RETRY_MAX_DELAY = _config.get('RETRY_MAX_DELAY', 3600)
+RETENTION_DAYS = _config.get('RETENTION_DAYS', 14)
+
+# Candidates tried per claim on databases without SKIP LOCKED
+CLAIM_CANDIDATES = 10
+
+
+class UnknownJobType(ValueError):
+    pass
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(job_type, payload=None, user=None, priority=0, run_after=None):
+    """
+    Queue a job. Call it inside the request's transaction: workers only see
+    the row once that commits, so a rolled-back request leaves no job behind.
+    """
+    spec = get_job_type(job_type)
+    if spec is None:
+        raise UnknownJobType(f"No handler registered for job type {job_type!r}")
+    return Job.objects.create(
+        job_type=job_type, payload=payload or {}, created_by=user, priority=priority,
+        max_attempts=spec.max_attempts, run_after=run_after or timezone.now(),
+    )
+
+
+def _open_types(types):
+    """
+    Job types among `types` below their concurrency limit. Only a pre-filter
+    to skip full types cheaply; _claim_limited makes the binding check.
+    """
+    running = dict(
+        Job.objects.filter(status='running', job_type__in=types)
+        .values_list('job_type').annotate(count=Count('pk'))
+    )
+    return [
+        name for name in types
+        if JOB_TYPES[name].concurrency is None or running.get(name, 0) < JOB_TYPES[name].concurrency
+    ]
+
+
+def _lock_fields(worker):
+    now = timezone.now()
+    return {'status': 'running', 'locked_by': worker, 'locked_at': now, 'heartbeat_at': now}
+
+
+def _claim_next(candidates, worker):
+    if connection.features.has_select_for_update_skip_locked:
+        # Concurrent workers skip each other's locked rows instead of queueing on them
+        with transaction.atomic():
+            job_id = candidates.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if job_id is None:
+                return None
+            Job.objects.filter(pk=job_id).update(**_lock_fields(worker))
+            return job_id
+
+    # SQLite: no row locks, but writes are serialized, so a conditional
+    # UPDATE that only matches a still-queued row is an atomic claim
+    for job_id in candidates.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        if Job.objects.filter(pk=job_id, status='queued').update(**_lock_fields(worker)) == 1:
+            return job_id
+    return None
+
+
+def _claim_limited(job_type, candidates, worker):
+    """
+    Count and claim in one transaction, serialized per type by updating its
+    JobTypeLock row: a row lock on PostgreSQL, the database write lock on
+    SQLite. The next claimer of the type waits for our commit, and under
+    READ COMMITTED its count then includes the job claimed here.
+    """
+    JobTypeLock.objects.get_or_create(job_type=job_type)
+    with transaction.atomic():
+        JobTypeLock.objects.filter(job_type=job_type).update(claimed_at=timezone.now())
+        running = Job.objects.filter(job_type=job_type, status='running').count()
+        if running >= JOB_TYPES[job_type].concurrency:
+            return None
+        return _claim_next(candidates, worker)
+
+
+def claim(worker, types=None):
+    """Claim the next due job of `types` (default: all registered) for `worker`, or None"""
+    types = _open_types(list(types or JOB_TYPES))
+    due = Job.objects.filter(status='queued', run_after__lte=timezone.now()).order_by(
+        '-priority', 'run_after', 'created_at'
+    )
+    while types:
+        # The type at the head of the queue goes first, so priority holds across types
+        head = due.filter(job_type__in=types).values_list('job_type', flat=True).first()
+        if head is None:
+            return None
+        if JOB_TYPES[head].concurrency is None:
+            unlimited = [name for name in types if JOB_TYPES[name].concurrency is None]
+            job_id = _claim_next(due.filter(job_type__in=unlimited), worker)
+            types = [name for name in types if name not in unlimited]
+        else:
+            job_id = _claim_limited(head, due.filter(job_type=head), worker)
+            types.remove(head)
+        if job_id is not None:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: base, 2x base, 4x base ... capped"""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a running job's heartbeat fresh while its handler works"""
+
+    def __init__(self, job):
+        super().__init__(name=f'job-heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(HEARTBEAT_INTERVAL):
+                Job.objects.filter(pk=self.job.pk, locked_by=self.job.locked_by).update(
+                    heartbeat_at=timezone.now()
+                )
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """
+    Run a claimed job's handler and record the outcome. A failure is
+    retried after retry_delay() until max_attempts runs are used up.
+    Returns True when the job succeeded.
+    """
+    # Every write is conditional on still holding the lock, so a worker that
+    # was presumed dead and lost the job cannot overwrite its new run
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    spec = get_job_type(job.job_type)
+    if spec is None:
+        mine.update(status='failed', error=f"No handler registered for {job.job_type!r}", finished_at=timezone.now())
+        return False
+
+    job.attempts += 1
+    mine.update(attempts=F('attempts') + 1, started_at=timezone.now())
+    heartbeat = _Heartbeat(job)
+    heartbeat.start()
+    try:
+        result = spec.handler(job, **job.payload)
+    except Exception as exc:
+        logger.exception(f"Job {job.job_type} {job.pk} failed (attempt {job.attempts}/{job.max_attempts})")
+        error = f"{type(exc).__name__}: {exc}"[:2000]
+        if job.attempts < job.max_attempts:
+            mine.update(
+                status='queued', error=error, locked_by='', locked_at=None, heartbeat_at=None,
+                run_after=timezone.now() + retry_delay(job.attempts),
+            )
+        else:
+            mine.update(status='failed', error=error, finished_at=timezone.now())
+        return False
+    finally:
+        heartbeat.stop()
+
+    mine.update(status='succeeded', result=result, error='', finished_at=timezone.now())
+    return True
+
+
+def requeue_stale():
+    """
+    Put back running jobs whose worker stopped sending heartbeats (killed,
+    OOM, host lost); those out of attempts are failed. Returns the count.
+    """
+    stale = Job.objects.filter(status='running', heartbeat_at__lt=timezone.now() - STALE_AFTER)
+    unlock = {'locked_by': '', 'locked_at': None, 'heartbeat_at': None}
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='Worker stopped responding', finished_at=timezone.now(), **unlock,
+    )
+    return failed + stale.update(status='queued', run_after=timezone.now(), **unlock)
+
+
+def prune_finished(retention_days=RETENTION_DAYS):
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = Job.objects.filter(status__in=['succeeded', 'failed'], finished_at__lt=cutoff).delete()
+    return deleted
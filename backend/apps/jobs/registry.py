@@ -0,0 +1,43 @@
+from django.conf import settings
+
+_config = getattr(settings, 'JOBS', {})
+DEFAULT_MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 3)
+# job type -> running jobs allowed at once across all workers
+CONCURRENCY = _config.get('CONCURRENCY', {})
+
+
+class JobType:
+    __slots__ = ('name', 'handler', 'concurrency', 'max_attempts')
+
+    def __init__(self, name, handler, concurrency, max_attempts):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+
+JOB_TYPES = {}
+
+
+def job(name, concurrency=None, max_attempts=None):
+    """
+    Register the decorated function as the handler for `name`. It is called
+    as handler(job, **payload) and its return value, which must be JSON
+    serializable, becomes the job's result. `concurrency` caps how many jobs
+    of this type run at once (None: no cap); the JOBS['CONCURRENCY'] setting
+    overrides it.
+    """
+    def decorator(handler):
+        if name in JOB_TYPES:
+            raise ValueError(f"Job type {name!r} is already registered")
+        JOB_TYPES[name] = JobType(
+            name, handler,
+            CONCURRENCY.get(name, concurrency),
+            max_attempts or DEFAULT_MAX_ATTEMPTS,
+        )
+        return handler
+    return decorator
+
+
+def get_job_type(name):
+    return JOB_TYPES.get(name)
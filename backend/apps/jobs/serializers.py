@@ -0,0 +1,19 @@
+from rest_framework import serializers
+from .models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'job_type', 'status', 'progress', 'result', 'error', 'attempts', 'max_attempts',
+            'run_after', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Tracebacks and exception text are for staff only
+        if not self.context['request'].user.is_staff:
+            data.pop('error')
+        return data
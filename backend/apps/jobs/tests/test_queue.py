@@ -0,0 +1,260 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from apps.jobs import queue
+from apps.jobs.models import Job
+from apps.jobs.registry import job
+from apps.nextcrm.tests.helpers import authenticate, make_user
+
+calls = []
+
+
+@job('test_echo')
+def echo(job, value=None):
+    calls.append(value)
+    job.report_progress(1, 1, 'done')
+    return {'value': value}
+
+
+@job('test_flaky', max_attempts=2)
+def flaky(job):
+    raise RuntimeError('boom')
+
+
+@job('test_single', concurrency=1)
+def single(job):
+    return None
+
+
+@job('test_pair', concurrency=2)
+def pair(job):
+    time.sleep(0.05)
+    return None
+
+
+class QueueTests(TestCase):
+    worker = 'test-worker'
+
+    def setUp(self):
+        calls.clear()
+
+    def test_unknown_type(self):
+        with self.assertRaises(queue.UnknownJobType):
+            queue.enqueue('no_such_type')
+
+    def test_claim_and_run(self):
+        queued = queue.enqueue('test_echo', {'value': 7})
+        claimed = queue.claim(self.worker, ['test_echo'])
+        self.assertEqual(claimed.pk, queued.pk)
+        self.assertEqual(claimed.status, 'running')
+        self.assertEqual(claimed.locked_by, self.worker)
+        self.assertIsNone(queue.claim(self.worker, ['test_echo']))
+
+        self.assertTrue(queue.run_job(claimed))
+        queued.refresh_from_db()
+        self.assertEqual(calls, [7])
+        self.assertEqual(queued.status, 'succeeded')
+        self.assertEqual(queued.result, {'value': 7})
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.progress, {'done': 1, 'total': 1, 'message': 'done'})
+
+    def test_priority_and_run_after(self):
+        later = queue.enqueue('test_echo', run_after=timezone.now() + timedelta(minutes=5))
+        low = queue.enqueue('test_echo')
+        high = queue.enqueue('test_echo', priority=10)
+        self.assertEqual(queue.claim(self.worker, ['test_echo']).pk, high.pk)
+        self.assertEqual(queue.claim(self.worker, ['test_echo']).pk, low.pk)
+        self.assertIsNone(queue.claim(self.worker, ['test_echo']))
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'queued')
+
+    @mock.patch('apps.jobs.queue.random.uniform', return_value=1.0)
+    @mock.patch('apps.jobs.queue.RETRY_BASE_DELAY', 30)
+    def test_retry_with_backoff_then_fail(self, _):
+        queued = queue.enqueue('test_flaky')
+        before = timezone.now()
+        self.assertFalse(queue.run_job(queue.claim(self.worker, ['test_flaky'])))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'queued')
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('boom', queued.error)
+        self.assertGreaterEqual(queued.run_after, before + timedelta(seconds=30))
+        # Not due until the backoff has passed
+        self.assertIsNone(queue.claim(self.worker, ['test_flaky']))
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        self.assertFalse(queue.run_job(queue.claim(self.worker, ['test_flaky'])))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'failed')
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNotNone(queued.finished_at)
+
+    @mock.patch('apps.jobs.queue.RETRY_MAX_DELAY', 100)
+    @mock.patch('apps.jobs.queue.RETRY_BASE_DELAY', 10)
+    def test_retry_delay_doubles_and_caps(self):
+        with mock.patch('apps.jobs.queue.random.uniform', return_value=1.0):
+            delays = [queue.retry_delay(attempt).total_seconds() for attempt in range(1, 6)]
+        self.assertEqual(delays, [10, 20, 40, 80, 100])
+
+    def test_concurrency_limit(self):
+        first, second = queue.enqueue('test_single'), queue.enqueue('test_single')
+        claimed = queue.claim(self.worker, ['test_single'])
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertIsNone(queue.claim('other-worker', ['test_single']))
+        # Other types are not held up by a full one
+        echo_job = queue.enqueue('test_echo')
+        self.assertEqual(queue.claim('other-worker', ['test_single', 'test_echo']).pk, echo_job.pk)
+
+        queue.run_job(claimed)
+        self.assertEqual(queue.claim('other-worker', ['test_single']).pk, second.pk)
+
+    def test_requeue_stale(self):
+        alive = queue.enqueue('test_echo')
+        stale = queue.enqueue('test_echo')
+        exhausted = queue.enqueue('test_echo')
+        for queued in (alive, stale, exhausted):
+            queue.claim(self.worker, ['test_echo'])
+        long_ago = timezone.now() - queue.STALE_AFTER * 2
+        Job.objects.filter(pk__in=[stale.pk, exhausted.pk]).update(heartbeat_at=long_ago, attempts=1)
+        Job.objects.filter(pk=exhausted.pk).update(attempts=3, max_attempts=3)
+
+        self.assertEqual(queue.requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {alive.pk: 'running', stale.pk: 'queued', exhausted.pk: 'failed'})
+        self.assertEqual(Job.objects.get(pk=stale.pk).locked_by, '')
+
+    def test_lost_lock_does_not_overwrite(self):
+        queue.enqueue('test_echo')
+        claimed = queue.claim(self.worker, ['test_echo'])
+        # Presumed dead and taken over by another worker
+        Job.objects.filter(pk=claimed.pk).update(locked_by='other-worker')
+        queue.run_job(claimed)
+        self.assertEqual(Job.objects.get(pk=claimed.pk).status, 'running')
+
+    def test_prune_finished(self):
+        old = queue.enqueue('test_echo')
+        Job.objects.filter(pk=old.pk).update(status='succeeded', finished_at=timezone.now() - timedelta(days=30))
+        recent = queue.enqueue('test_echo')
+        self.assertEqual(queue.prune_finished(retention_days=14), 1)
+        self.assertEqual(list(Job.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    """The worker closes its connection between jobs, which a TestCase transaction would not survive"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_drains_queue(self):
+        queue.enqueue('test_echo', {'value': 1})
+        queue.enqueue('test_echo', {'value': 2})
+        out = StringIO()
+        call_command('run_jobs', '--once', '--type', 'test_echo', stdout=out)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertEqual(Job.objects.filter(status='succeeded').count(), 2)
+
+
+class JobStatusViewTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.job = queue.enqueue('test_flaky', user=self.owner)
+        Job.objects.filter(pk=self.job.pk).update(status='failed', error='RuntimeError: boom')
+
+    def test_owner(self):
+        authenticate(self.client, self.owner)
+        data = self.client.get(f'/api/jobs/{self.job.pk}/').json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertEqual(data['job_type'], 'test_flaky')
+        self.assertNotIn('error', data)
+
+    def test_other_user(self):
+        authenticate(self.client, make_user('someone'))
+        self.assertEqual(self.client.get(f'/api/jobs/{self.job.pk}/').status_code, 404)
+
+    def test_staff_sees_error(self):
+        authenticate(self.client, make_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(f'/api/jobs/{self.job.pk}/').json()['error'], 'RuntimeError: boom')
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(f'/api/jobs/{self.job.pk}/').status_code, 401)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentClaimTests(TransactionTestCase):
+    """
+    Workers racing on one connection each. Needs a database with row locks
+    (PostgreSQL); the in-memory SQLite test database is shared by threads
+    without any.
+    """
+    workers = 8
+
+    def race(self, job_type, rounds):
+        barrier = threading.Barrier(self.workers)
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                for _ in range(rounds):
+                    barrier.wait()
+                    result = queue.claim(f'worker-{index}', [job_type])
+                    with lock:
+                        claimed.append(result)
+                    barrier.wait()
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [result for result in claimed if result is not None]
+
+    def test_limit_of_one_holds(self):
+        for _ in range(self.workers * 5):
+            queue.enqueue('test_single')
+        # Every round all workers claim at once and nobody finishes
+        claimed = self.race('test_single', rounds=5)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(Job.objects.filter(status='running').count(), 1)
+
+    def test_no_job_claimed_twice(self):
+        for _ in range(self.workers * 3):
+            queue.enqueue('test_echo')
+        claimed = self.race('test_echo', rounds=3)
+        self.assertEqual(len(claimed), self.workers * 3)
+        self.assertEqual(len({result.pk for result in claimed}), self.workers * 3)
+
+    def test_limit_holds_while_jobs_finish(self):
+        for _ in range(40):
+            queue.enqueue('test_pair')
+        peak = []
+
+        def worker(index):
+            try:
+                while True:
+                    claimed = queue.claim(f'worker-{index}', ['test_pair'])
+                    if claimed is None:
+                        if not Job.objects.filter(status__in=['queued', 'running']).exists():
+                            return
+                        time.sleep(0.01)
+                        continue
+                    peak.append(Job.objects.filter(status='running').count())
+                    queue.run_job(claimed)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Job.objects.filter(status='succeeded').count(), 40)
+        self.assertLessEqual(max(peak), 2)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('<uuid:pk>/', views.JobStatusView.as_view(), name='job_status'),
+]
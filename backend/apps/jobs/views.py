@@ -0,0 +1,14 @@
+from rest_framework import generics, permissions
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobStatusView(generics.RetrieveAPIView):
+    """Status, progress and result of a background job; owners and staff only"""
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Job.objects.all()
+        return Job.objects.filter(created_by=self.request.user)
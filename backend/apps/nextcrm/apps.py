@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class NextcrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.nextcrm'
\ No newline at end of file
+    name = 'apps.nextcrm'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,178 @@
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from django.core.cache import cache
+from .models import Counterparty, Commodity, Trader
+
+
+VERSION_KEY = 'autocomplete_version:{entity}'
+
+
+def _normalize(value):
+    return (value or '').strip().casefold()
+
+
+def _counterparty_payload(cp):
+    return {
+        'id': cp.id,
+        'counterparty_name': cp.counterparty_name,
+        'counterparty_code': cp.counterparty_code,
+        'counterparty_type': cp.counterparty_type,
+        'city': cp.city,
+        'country': cp.country,
+    }
+
+
+def _commodity_payload(commodity):
+    return {
+        'id': commodity.id,
+        'commodity_name_short': commodity.commodity_name_short,
+        'commodity_name_full': commodity.commodity_name_full,
+        'commodity_code': commodity.commodity_code,
+        'commodity_group': commodity.commodity_group.commodity_group_name,
+    }
+
+
+def _trader_payload(trader):
+    return {
+        'id': trader.id,
+        'trader_name': trader.trader_name,
+        'email': trader.email,
+        'department': trader.department,
+    }
+
+
+# entity -> (queryset factory, indexed fields, payload builder)
+ENTITIES = {
+    'counterparty': (
+        lambda: Counterparty.objects.filter(is_active=True),
+        ('counterparty_name', 'counterparty_code'),
+        _counterparty_payload,
+    ),
+    'commodity': (
+        lambda: Commodity.objects.filter(is_active=True).select_related('commodity_group'),
+        ('commodity_name_short', 'commodity_code'),
+        _commodity_payload,
+    ),
+    'trader': (
+        lambda: Trader.objects.filter(is_active=True),
+        ('trader_name', 'email'),
+        _trader_payload,
+    ),
+}
+
+
+class PrefixIndex:
+    """Sorted array of normalized keys searched with bisect"""
+
+    def __init__(self, entries, payloads, version, build_seconds):
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ids = [obj_id for _, obj_id in entries]
+        self.payloads = payloads
+        self.version = version
+        self.build_seconds = build_seconds
+
+    @classmethod
+    def build(cls, entity, version):
+        queryset_factory, fields, payload_builder = ENTITIES[entity]
+        started = time.perf_counter()
+
+        entries = []
+        payloads = {}
+        for obj in queryset_factory().iterator(chunk_size=2000):
+            payloads[obj.id] = payload_builder(obj)
+            for field in fields:
+                value = _normalize(getattr(obj, field))
+                if not value:
+                    continue
+                # Index the full value plus every word start so "corp" finds "Acme Corp"
+                entries.append((value, obj.id))
+                for position, char in enumerate(value):
+                    if char == ' ' and position + 1 < len(value) and value[position + 1] != ' ':
+                        entries.append((value[position + 1:], obj.id))
+
+        return cls(entries, payloads, version, time.perf_counter() - started)
+
+    def search(self, prefix, limit=10):
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and self.keys[position].startswith(prefix):
+            obj_id = self.ids[position]
+            if obj_id not in seen:
+                seen.add(obj_id)
+                results.append(self.payloads[obj_id])
+                if len(results) >= limit:
+                    break
+            position += 1
+        return results
+
+    def stats(self):
+        """Approximate memory footprint and build time of this index"""
+        size = sys.getsizeof(self.keys) + sys.getsizeof(self.ids) + sys.getsizeof(self.payloads)
+        size += sum(sys.getsizeof(key) for key in self.keys)
+        for payload in self.payloads.values():
+            size += sys.getsizeof(payload)
+            size += sum(sys.getsizeof(value) for value in payload.values())
+        return {
+            'entries': len(self.keys),
+            'objects': len(self.payloads),
+            'approx_bytes': size,
+            'build_ms': round(self.build_seconds * 1000, 2),
+            'version': self.version,
+        }
+
+
+_indexes = {}
+_build_lock = threading.Lock()
+
+
+def _initial_version():
+    # Random start so an evicted key never comes back as a version some
+    # worker already built its index at
+    return random.randint(0, 2 ** 30)
+
+
+def get_version(entity):
+    key = VERSION_KEY.format(entity=entity)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(entity):
+    key = VERSION_KEY.format(entity=entity)
+    # add() is a no-op when the key exists, so incr() below is always safe
+    cache.add(key, _initial_version(), None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def get_index(entity):
+    """Return the per-worker index for entity, rebuilding it if its version moved"""
+    version = get_version(entity)
+    index = _indexes.get(entity)
+    if index is not None and index.version == version:
+        return index
+
+    with _build_lock:
+        index = _indexes.get(entity)
+        if index is None or index.version != version:
+            index = PrefixIndex.build(entity, version)
+            _indexes[entity] = index
+    return index
+
+
+def autocomplete(entity, prefix, limit=10):
+    return get_index(entity).search(prefix, limit=limit)
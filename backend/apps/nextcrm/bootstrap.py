@@ -0,0 +1,107 @@
+import json
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import (
+    Cost_Center, Sociedad, Trader, Commodity_Group, Commodity_Type, Commodity, Currency
+)
+from .reference_cache import CACHE_TIMEOUT, get_versions
+
+TOKEN_PREFIX = 'v1'
+
+# name -> (model, columns, ordering)
+BOOTSTRAP_ENTITIES = {
+    'currencies': (
+        Currency,
+        ('id', 'currency_code', 'currency_name', 'currency_symbol', 'is_base_currency', 'decimal_places'),
+        ('currency_code',),
+    ),
+    'commodity_groups': (
+        Commodity_Group,
+        ('id', 'commodity_group_name', 'sort_order'),
+        ('sort_order', 'commodity_group_name'),
+    ),
+    'commodity_types': (
+        Commodity_Type,
+        ('id', 'commodity_type_name', 'sort_order'),
+        ('sort_order', 'commodity_type_name'),
+    ),
+    'commodities': (
+        Commodity,
+        ('id', 'commodity_name_short', 'commodity_name_full', 'commodity_code',
+         'commodity_group_id', 'commodity_type_id', 'default_unit'),
+        ('commodity_name_short',),
+    ),
+    'traders': (
+        Trader,
+        ('id', 'trader_name', 'email', 'employee_id', 'department', 'user_id'),
+        ('trader_name',),
+    ),
+    'cost_centers': (
+        Cost_Center,
+        ('id', 'cost_center_name'),
+        ('cost_center_name',),
+    ),
+    'sociedades': (
+        Sociedad,
+        ('id', 'sociedad_name', 'tax_id', 'city', 'country'),
+        ('sociedad_name',),
+    ),
+}
+
+
+def current_versions():
+    """name -> version for every bootstrap entity, in one cache round trip"""
+    names = list(BOOTSTRAP_ENTITIES)
+    versions = get_versions([BOOTSTRAP_ENTITIES[name][0] for name in names])
+    return dict(zip(names, versions))
+
+
+def version_token(versions):
+    return '.'.join([TOKEN_PREFIX] + [format(versions[name], 'x') for name in BOOTSTRAP_ENTITIES])
+
+
+def parse_version_token(token):
+    """Inverse of version_token; None if the token is malformed or from another layout"""
+    parts = (token or '').split('.')
+    if len(parts) != len(BOOTSTRAP_ENTITIES) + 1 or parts[0] != TOKEN_PREFIX:
+        return None
+    try:
+        return dict(zip(BOOTSTRAP_ENTITIES, (int(part, 16) for part in parts[1:])))
+    except ValueError:
+        return None
+
+
+def _render_entity(name):
+    model, columns, ordering = BOOTSTRAP_ENTITIES[name]
+    rows = list(model.objects.filter(is_active=True).order_by(*ordering).values_list(*columns))
+    return json.dumps(
+        {'columns': columns, 'rows': rows}, cls=DjangoJSONEncoder, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def build_payload(versions, names):
+    """
+    JSON body with the given entities, assembled from per-entity fragments
+    cached by entity version so unchanged entities are never re-serialized.
+    """
+    keys = {name: f"bootstrap:{name}:{versions[name]}" for name in names}
+    fragments = cache.get_many(list(keys.values()))
+
+    parts = []
+    for name in names:
+        fragment = fragments.get(keys[name])
+        if fragment is None:
+            fragment = _render_entity(name)
+            cache.set(keys[name], fragment, CACHE_TIMEOUT)
+        parts.append(b'"' + name.encode('utf-8') + b'":' + fragment)
+
+    return b''.join([
+        b'{"version":', json.dumps(version_token(versions)).encode('utf-8'),
+        b',"full":', b'true' if len(names) == len(BOOTSTRAP_ENTITIES) else b'false',
+        b',"entities":{', b','.join(parts), b'}}',
+    ])
+
+
+def changed_entities(versions, since):
+    """Entity names whose version differs from the parsed `since` token"""
+    return [name for name in BOOTSTRAP_ENTITIES if since.get(name) != versions[name]]
@@ -0,0 +1,171 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import (
+    Cost_Center, Sociedad, Trader, Commodity_Group, Commodity_Type,
+    Commodity, Counterparty, Currency, Contract, Tombstone
+)
+from .serializers import (
+    CostCenterSerializer, SociedadSerializer, TraderSerializer,
+    CommodityGroupSerializer, CommodityTypeSerializer, CommoditySerializer,
+    CounterpartySerializer, CurrencySerializer, ContractListSerializer
+)
+
+_config = getattr(settings, 'CHANGE_FEED', {})
+PAGE_SIZE = _config.get('PAGE_SIZE', 200)
+MAX_PAGE_SIZE = _config.get('MAX_PAGE_SIZE', 1000)
+# Rows newer than this are left for the next poll: a transaction that set
+# updated_at earlier may not have committed yet and would otherwise be skipped
+SETTLE_SECONDS = _config.get('SETTLE_SECONDS', 5)
+TOMBSTONE_RETENTION_DAYS = _config.get('TOMBSTONE_RETENTION_DAYS', 30)
+
+# resource (router name) -> (model, serializer, select_related)
+FEEDS = {
+    'cost-centers': (Cost_Center, CostCenterSerializer, ()),
+    'sociedades': (Sociedad, SociedadSerializer, ()),
+    'traders': (Trader, TraderSerializer, ()),
+    'commodity-groups': (Commodity_Group, CommodityGroupSerializer, ()),
+    'commodity-types': (Commodity_Type, CommodityTypeSerializer, ()),
+    'commodities': (Commodity, CommoditySerializer, ('commodity_group', 'commodity_type')),
+    'counterparties': (Counterparty, CounterpartySerializer, ()),
+    'currencies': (Currency, CurrencySerializer, ()),
+    'contracts': (
+        Contract, ContractListSerializer,
+        ('trader', 'counterparty', 'commodity', 'trade_currency'),
+    ),
+}
+
+FEED_MODELS = tuple(model for model, _, _ in FEEDS.values())
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ResyncRequired(Exception):
+    """The cursor is older than the tombstone retention window"""
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor(token)
+    if not isinstance(position, dict):
+        raise InvalidCursor(token)
+    return position
+
+
+def _parse_key(key, model):
+    """[iso timestamp, id] from a cursor -> (aware datetime, id as `model`'s pk type)"""
+    if not isinstance(key, list) or len(key) != 2 or not isinstance(key[0], str):
+        raise InvalidCursor(key)
+    try:
+        timestamp = parse_datetime(key[0])
+        pk = model._meta.pk.to_python(key[1])
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor(key)
+    if timestamp is None or timezone.is_naive(timestamp) or pk is None:
+        raise InvalidCursor(key)
+    return timestamp, pk
+
+
+def _after(field, key):
+    # Keyset predicate over the (field, id) index
+    timestamp, pk = key
+    return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+
+
+def record_tombstone(model, pk):
+    Tombstone.objects.create(model_name=model._meta.label_lower, object_id=str(pk))
+
+
+def read_changes(resource, position, limit, request=None):
+    """
+    One page of the change feed for `resource`.
+
+    `position` is the decoded per-resource cursor, or None for a full sync.
+    Records come in (updated_at, id) order; rows with is_active=False come
+    back as 'deactivated' tombstones and hard deletes as 'deleted' ones.
+    Returns (page, next_position).
+    """
+    model, serializer_class, related = FEEDS[resource]
+    now = timezone.now()
+    upper = now - timedelta(seconds=SETTLE_SECONDS)
+
+    if position is None:
+        # A fresh copy only needs deletes that happen from here on
+        records_key = None
+        tombstones_key = (upper, 0)
+    else:
+        if not isinstance(position, dict):
+            raise InvalidCursor(position)
+        records_key = _parse_key(position['r'], model) if position.get('r') else None
+        tombstones_key = _parse_key(position.get('t'), Tombstone)
+        if tombstones_key[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            raise ResyncRequired(resource)
+
+    queryset = model.objects.filter(updated_at__lt=upper)
+    if records_key is not None:
+        queryset = queryset.filter(_after('updated_at', records_key))
+    if related:
+        queryset = queryset.select_related(*related)
+    rows = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+    more_records = len(rows) > limit
+    rows = rows[:limit]
+
+    tombstone_rows = list(
+        Tombstone.objects.filter(model_name=model._meta.label_lower, deleted_at__lt=upper)
+        .filter(_after('deleted_at', tombstones_key))
+        .order_by('deleted_at', 'id')[:limit + 1]
+    )
+    more_tombstones = len(tombstone_rows) > limit
+    tombstone_rows = tombstone_rows[:limit]
+
+    active = [row for row in rows if getattr(row, 'is_active', True)]
+    tombstones = [
+        {'id': str(row.pk), 'reason': 'deactivated', 'at': row.updated_at}
+        for row in rows if not getattr(row, 'is_active', True)
+    ] + [
+        {'id': row.object_id, 'reason': 'deleted', 'at': row.deleted_at}
+        for row in tombstone_rows
+    ]
+
+    next_position = {'r': position.get('r') if position else None}
+    if rows:
+        next_position['r'] = [rows[-1].updated_at.isoformat(), str(rows[-1].pk)]
+    if more_tombstones:
+        next_position['t'] = [tombstone_rows[-1].deleted_at.isoformat(), tombstone_rows[-1].pk]
+    else:
+        # Drained: move up to the bound so an idle feed never ages out of retention
+        next_position['t'] = [upper.isoformat(), 0]
+
+    page = {
+        'results': serializer_class(active, many=True, context={'request': request}).data,
+        'tombstones': tombstones,
+        'has_more': more_records or more_tombstones,
+    }
+    return page, next_position
+
+
+def prune_tombstones(older_than_days=TOMBSTONE_RETENTION_DAYS, chunk_size=5000):
+    """Delete tombstones past retention in pk batches; returns the number removed"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    removed = 0
+    while True:
+        ids = list(Tombstone.objects.filter(deleted_at__lt=cutoff).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return removed
+        removed += Tombstone.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,179 @@
+import functools
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+_config = getattr(settings, 'REQUEST_COALESCING', {})
+LOCK_TIMEOUT = _config.get('LOCK_TIMEOUT', 30)
+POLL_INTERVAL = _config.get('POLL_INTERVAL', 0.05)
+DASHBOARD_CACHE_TIMEOUT = _config.get('DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per-worker single flight: concurrent calls with the same key share one
+    execution. The first caller runs the function; the others wait for it and
+    get the same result (or exception). Results are shared objects, so callers
+    must not mutate them.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        return {'in_flight': len(self._flights), 'executions': self.executions, 'coalesced': self.coalesced}
+
+
+single_flight = SingleFlight()
+
+
+def _cached_call(key, timeout, lock, fn, args, kwargs):
+    """
+    Cache-backed result shared across workers. With `lock`, only the worker
+    that wins cache.add() computes on a miss; the rest poll for its result
+    instead of stampeding the database, and compute themselves only if the
+    holder fails or runs past LOCK_TIMEOUT.
+    """
+    result_key = f"coalesce:{key}"
+    cached = cache.get(result_key)
+    if cached is not None:
+        return cached[0]
+
+    lock_key = f"coalesce_lock:{key}"
+    acquired = lock and cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if lock and not acquired:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            cached = cache.get(result_key)
+            if cached is not None:
+                return cached[0]
+            if cache.get(lock_key) is None:
+                break
+
+    try:
+        result = fn(*args, **kwargs)
+        # Wrapped so a None result is still a hit
+        cache.set(result_key, (result,), timeout)
+        return result
+    finally:
+        # A caller that gave up waiting must not release a lock someone else holds
+        if acquired:
+            cache.delete(lock_key)
+
+
+def make_key(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def coalesce(cache_timeout=None, lock=False, version=None):
+    """
+    Share one execution of the decorated function between concurrent
+    identical calls in this worker. The key is the function and its
+    arguments (keyword arguments sorted). With `cache_timeout` the result is
+    also cached for that long across workers; `lock` adds the stampede lock,
+    and `version`, a callable, is folded into the key so bumping it retires
+    cached results.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            parts = (name, args, sorted(kwargs.items()))
+            if version is not None:
+                parts += (version(),)
+            key = make_key(*parts)
+            if cache_timeout is None:
+                return single_flight.do(key, fn, *args, **kwargs)
+            return single_flight.do(key, _cached_call, key, cache_timeout, lock, fn, args, kwargs)
+
+        return wrapper
+    return decorator
+
+
+def request_key(request, scope='user', extra=()):
+    """Key for a GET request: path, normalized query params and, for scope='user', the user"""
+    params = sorted((name, sorted(request.GET.getlist(name))) for name in request.GET)
+    user = request.user.pk if scope == 'user' else None
+    return make_key(request.path, params, user, request.accepted_media_type, *extra)
+
+
+def coalesce_view(scope='user'):
+    """
+    Decorator for DRF view methods returning a Response: concurrent identical
+    requests share one execution and each gets its own Response built from
+    the shared data. Use scope='global' only when the data does not depend on
+    who is asking.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            def run():
+                response = method(self, request, *args, **kwargs)
+                return response.data, response.status_code, dict(response.items())
+
+            key = request_key(request, scope, (type(self).__qualname__, method.__name__, sorted(kwargs.items())))
+            data, status_code, headers = single_flight.do(key, run)
+            return Response(data, status=status_code, headers=headers)
+
+        return wrapper
+    return decorator
+
+
+class CoalescedListMixin:
+    """
+    Coalesce concurrent identical list() requests, see coalesce_view. Not for
+    views whose list() returns a plain HttpResponse (ReferenceDataCacheMixin).
+    """
+    coalesce_scope = 'user'
+
+    def list(self, request, *args, **kwargs):
+        parent = super().list
+
+        def list(view, request, *args, **kwargs):
+            return parent(request, *args, **kwargs)
+
+        return coalesce_view(self.coalesce_scope)(list)(self, request, *args, **kwargs)
@@ -0,0 +1,251 @@
+import json
+import os
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from .changes import SETTLE_SECONDS
+from .models import Contract, ContractAmendment, ExchangeRate
+
+_config = getattr(settings, 'COLUMNAR_EXPORT', {})
+BATCH_SIZE = _config.get('BATCH_SIZE', 50000)
+STATE_FILE = '_export_state.json'
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+class ColumnarUnavailable(ImportError):
+    pass
+
+
+def _pyarrow():
+    # pyarrow is optional: only analytics exports need it
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as exc:
+        raise ColumnarUnavailable('Columnar export needs pyarrow (pip install pyarrow)') from exc
+    return pyarrow
+
+
+# name -> (model, field paths, partition date path, changed-since filter)
+DATASETS = {
+    'contracts': (
+        Contract,
+        (
+            'id', 'contract_number', 'status', 'contract_date',
+            'trader_id', 'trader__trader_name', 'counterparty_id', 'counterparty__counterparty_name',
+            'commodity_id', 'commodity__commodity_name_short', 'cost_center_id', 'sociedad_id',
+            'quantity', 'unit_of_measure', 'price', 'trade_currency__currency_code', 'premium_discount',
+            'total_value', 'price_basis', 'delivery_terms', 'delivery_location', 'loading_port',
+            'discharge_port', 'delivery_period_start', 'delivery_period_end', 'shipment_period_start',
+            'shipment_period_end', 'approval_date', 'hedge_required', 'hedge_percentage',
+            'created_at', 'updated_at',
+        ),
+        'contract_date',
+        lambda since: Q(updated_at__gte=since),
+    ),
+    'contract_amendments': (
+        ContractAmendment,
+        (
+            'id', 'contract_id', 'contract__contract_number', 'amendment_number', 'amendment_type',
+            'description', 'old_values', 'new_values', 'requested_by_id', 'approved_by_id',
+            'approval_date', 'created_at',
+        ),
+        'contract__contract_date',
+        # No updated_at: an amendment only changes when it is approved
+        lambda since: Q(created_at__gte=since) | Q(approval_date__gte=since),
+    ),
+    'exchange_rates': (
+        ExchangeRate,
+        (
+            'id', 'from_currency__currency_code', 'to_currency__currency_code', 'rate', 'rate_date',
+            'source', 'created_at',
+        ),
+        'rate_date',
+        lambda since: Q(created_at__gte=since),
+    ),
+}
+
+
+def _resolve_field(model, path):
+    field = None
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        if field.is_relation and field.related_model is not None:
+            model = field.related_model
+    # `<fk>_id` lookups resolve to the ForeignKey itself
+    if isinstance(field, models.ForeignKey):
+        return field.target_field
+    return field
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64()
+    return pa.string()
+
+
+def dataset_schema(name):
+    pa = _pyarrow()
+    model, paths, _, _ = DATASETS[name]
+    return pa.schema([
+        pa.field(path, _arrow_type(pa, _resolve_field(model, path)), nullable=True)
+        for path in paths
+    ])
+
+
+def _to_arrow_value(value, arrow_type, pa):
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type) and not isinstance(value, str):
+        # UUIDs and JSON fields
+        return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+
+class _PartitionWriter:
+    """One open file at a time; rows arrive ordered by partition"""
+
+    def __init__(self, pa, root, schema, file_format, run_id):
+        self.pa = pa
+        self.root = root
+        self.schema = schema
+        self.file_format = file_format
+        self.run_id = run_id
+        self.partition = None
+        self.writer = None
+        self.sink = None
+        self.files = []
+
+    def switch(self, partition):
+        if partition == self.partition and self.writer is not None:
+            return
+        self.close()
+        directory = os.path.join(self.root, f"year={partition}" if partition is not None else 'year=unknown')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{self.run_id}{FORMATS[self.file_format]}")
+        if self.file_format == 'parquet':
+            self.writer = self.pa.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.sink = self.pa.OSFile(path, 'wb')
+            self.writer = self.pa.ipc.new_file(self.sink, self.schema)
+        self.partition = partition
+        self.files.append(path)
+
+    def write(self, batch):
+        self.writer.write_batch(batch)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+
+def load_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(root, state):
+    path = os.path.join(root, STATE_FILE)
+    with open(path + '.tmp', 'w') as handle:
+        json.dump(state, handle, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def export_dataset(name, root, file_format='parquet', since=None, batch_size=BATCH_SIZE, until=None):
+    """
+    Write `name` under root/<name>/year=<YYYY>/ as record batches read
+    straight off a DB cursor. With `since`, only rows changed from then on.
+    Returns (rows written, files written).
+    """
+    pa = _pyarrow()
+    model, paths, partition_path, changed_since = DATASETS[name]
+    schema = dataset_schema(name)
+    types = [field.type for field in schema]
+
+    queryset = model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(changed_since(since))
+    if until is not None:
+        # Mirror of the since filter, so the next incremental run starts exactly here
+        queryset = queryset.exclude(changed_since(until))
+    # Ordered by partition so each year's file is written and closed in turn
+    queryset = queryset.order_by(partition_path, 'pk').values_list(partition_path, *paths)
+
+    run_id = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    writer = _PartitionWriter(pa, os.path.join(root, name), schema, file_format, run_id)
+    total = 0
+    columns = [[] for _ in paths]
+
+    def flush():
+        if columns[0]:
+            writer.write(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=arrow_type) for values, arrow_type in zip(columns, types)],
+                schema=schema,
+            ))
+            for values in columns:
+                values.clear()
+
+    try:
+        for row in queryset.iterator(chunk_size=min(batch_size, 10000)):
+            partition = row[0].year if row[0] is not None else None
+            if partition != writer.partition or writer.writer is None:
+                flush()
+                writer.switch(partition)
+            for values, value, arrow_type in zip(columns, row[1:], types):
+                values.append(_to_arrow_value(value, arrow_type, pa))
+            total += 1
+            if len(columns[0]) >= batch_size:
+                flush()
+        flush()
+    finally:
+        writer.close()
+    return total, writer.files
+
+
+def export_all(root, names=None, file_format='parquet', incremental=False, batch_size=BATCH_SIZE,
+               on_dataset=None):
+    """
+    Export the given datasets (all by default). Incremental runs pick up
+    from the high-water mark stored in root/_export_state.json; each run
+    writes new part files, so consumers keep the latest row per id.
+    `on_dataset(index, total, name)` is called as each dataset starts and
+    once more with index == total at the end.
+    """
+    state = load_state(root) if incremental else {}
+    # Same margin as the change feed, for transactions that commit late
+    started = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    results = {}
+    names = list(names or DATASETS)
+    for index, name in enumerate(names):
+        if on_dataset is not None:
+            on_dataset(index, len(names), name)
+        since = None
+        if incremental and name in state:
+            since = datetime.fromisoformat(state[name]['exported_until'])
+        rows, files = export_dataset(name, root, file_format, since=since, batch_size=batch_size, until=started)
+        results[name] = (rows, files)
+        state[name] = {'exported_until': started.isoformat(), 'rows': rows, 'format': file_format}
+    os.makedirs(root, exist_ok=True)
+    save_state(root, state)
+    if on_dataset is not None:
+        on_dataset(len(names), len(names), '')
+    return results
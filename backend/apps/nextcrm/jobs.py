@@ -0,0 +1,13 @@
+from apps.jobs.registry import job
+from .columnar import BATCH_SIZE, export_all
+
+
+# One at a time: each run reads and rewrites the shared _export_state.json
+@job('columnar_export', concurrency=1)
+def columnar_export(job, output_dir, datasets=None, file_format='parquet', incremental=False,
+                     batch_size=BATCH_SIZE):
+    results = export_all(
+        output_dir, names=datasets, file_format=file_format, incremental=incremental, batch_size=batch_size,
+        on_dataset=lambda index, total, name: job.report_progress(index, total, name),
+    )
+    return {name: {'rows': rows, 'files': len(files)} for name, (rows, files) in results.items()}
@@ -0,0 +1,402 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from http.cookies import SimpleCookie
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'LIVE_EVENTS', {})
+
+EVENTS_PATH = _config.get('PATH', '/api/nextcrm/events/')
+HEARTBEAT_SECONDS = _config.get('HEARTBEAT_SECONDS', 15)
+RETRY_MILLISECONDS = _config.get('RETRY_MILLISECONDS', 5000)
+# How often an open stream re-validates its token and user
+REAUTH_SECONDS = _config.get('REAUTH_SECONDS', 60)
+
+
+def encode_event(event_type, data, event_id=None):
+    lines = [f"event: {event_type}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class Subscriber:
+    """One open stream: a bounded queue of encoded events"""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, chunk):
+        try:
+            self.queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            # A client this far behind gets a resync instead of a partial history
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        return True
+
+
+class Broadcaster:
+    """
+    Per-worker fan-out of live events to open SSE streams.
+
+    Events arrive from the bus on any thread and are handed to the event loop
+    that owns the streams; each event is encoded once and the same bytes go
+    on every subscriber's queue. Contract events also schedule a dashboard
+    refresh, debounced so a burst of saves costs one recomputation per worker
+    and only the changed dashboard keys are sent.
+    """
+
+    def __init__(self, queue_size=100, max_connections=2000, dashboard_debounce=2.0):
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.dashboard_debounce = dashboard_debounce
+        self._subscribers = set()
+        self._loop = None
+        self._sequence = 0
+        self._dashboard = None
+        self._dashboard_pending = False
+
+        self.delivered = 0
+        self.overflows = 0
+        self.rejected = 0
+
+    @property
+    def connections(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a stream; must be called on the event loop. None when full."""
+        if len(self._subscribers) >= self.max_connections:
+            self.rejected += 1
+            return None
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        live_bus.start(self.deliver)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def deliver(self, event):
+        """Thread-safe entry point for the bus"""
+        loop = self._loop
+        if loop is None or not self._subscribers or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event):
+        self._fan_out(event['type'], event['data'])
+        if event['type'] == 'contract' and not self._dashboard_pending:
+            self._dashboard_pending = True
+            self._loop.call_later(
+                self.dashboard_debounce, lambda: self._loop.create_task(self._refresh_dashboard())
+            )
+
+    def _fan_out(self, event_type, data):
+        if not self._subscribers:
+            return
+        self._sequence += 1
+        chunk = encode_event(event_type, data, self._sequence)
+        for subscriber in list(self._subscribers):
+            if subscriber.put(chunk):
+                self.delivered += 1
+            else:
+                self.overflows += 1
+                self._subscribers.discard(subscriber)
+
+    async def _refresh_dashboard(self):
+        self._dashboard_pending = False
+        if not self._subscribers:
+            # Nobody to tell; the next subscriber fetches dashboard_stats itself
+            self._dashboard = None
+            return
+        try:
+            stats = await sync_to_async(_dashboard_snapshot)()
+        except Exception:
+            logger.exception("Dashboard refresh for live events failed")
+            return
+        previous = self._dashboard or {}
+        changed = {key: value for key, value in stats.items() if previous.get(key) != value}
+        self._dashboard = stats
+        if changed:
+            self._fan_out('dashboard', changed)
+
+    def stats(self):
+        return {
+            'connections': self.connections,
+            'max_connections': self.max_connections,
+            'delivered': self.delivered,
+            'overflows': self.overflows,
+            'rejected': self.rejected,
+        }
+
+
+def _dashboard_snapshot():
+    from .serializers import DashboardStatsSerializer
+    from .views import get_dashboard_statistics
+
+    close_old_connections()
+    try:
+        data = DashboardStatsSerializer(get_dashboard_statistics()).data
+        # Round-trip so values compare the same way they are sent
+        return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    finally:
+        close_old_connections()
+
+
+class LocalBus:
+    """Delivers straight to this process's broadcaster; enough for a single worker"""
+
+    def start(self, deliver):
+        pass
+
+    def publish(self, event):
+        broadcaster.deliver(event)
+
+
+class RedisBus:
+    """
+    Redis pub/sub bus so an event published by any worker (WSGI or ASGI)
+    reaches the streams held by every ASGI worker. The subscriber runs on a
+    daemon thread per process and reconnects with backoff.
+    """
+
+    def __init__(self, url, channel):
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._pid = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None or self._pid != os.getpid():
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    def publish(self, event):
+        try:
+            self._get_client().publish(self.channel, json.dumps(event, cls=DjangoJSONEncoder))
+        except Exception:
+            logger.warning("Publishing live event to Redis failed", exc_info=True)
+
+    def start(self, deliver):
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            threading.Thread(target=self._listen, args=(deliver,), name='live-events-bus', daemon=True).start()
+            self._thread_pid = os.getpid()
+
+    def _listen(self, deliver):
+        import redis
+
+        backoff = 1
+        while True:
+            try:
+                pubsub = redis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                backoff = 1
+                for message in pubsub.listen():
+                    deliver(json.loads(message['data']))
+            except Exception:
+                logger.warning("Live events Redis subscription lost, retrying in %ss", backoff, exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+def _make_bus():
+    if _config.get('BUS', 'local') == 'redis' and getattr(settings, 'REDIS_URL', ''):
+        return RedisBus(settings.REDIS_URL, _config.get('CHANNEL', 'nextcrm:live-events'))
+    return LocalBus()
+
+
+live_bus = _make_bus()
+
+broadcaster = Broadcaster(
+    queue_size=_config.get('QUEUE_SIZE', 100),
+    max_connections=_config.get('MAX_CONNECTIONS', 2000),
+    dashboard_debounce=_config.get('DASHBOARD_DEBOUNCE_SECONDS', 2.0),
+)
+
+
+def publish(event_type, data):
+    """Send an event to every subscriber on every worker"""
+    if _config.get('ENABLED', True):
+        live_bus.publish({'type': event_type, 'data': data})
+
+
+def _raw_token(headers):
+    authorization = headers.get(b'authorization', b'').decode('latin-1')
+    if authorization.startswith('Bearer '):
+        return authorization[7:].strip() or None
+    cookie = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookie.get(settings.SIMPLE_JWT['AUTH_COOKIE'])
+    return morsel.value if morsel else None
+
+
+def _authenticate(raw_token):
+    """(user, token expiry as a timestamp) for a valid token of an active user, else None"""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    from apps.authentication.authentication import CachedJWTAuthentication
+
+    if not raw_token:
+        return None
+
+    close_old_connections()
+    try:
+        user, validated_token = CachedJWTAuthentication().authenticate_token(raw_token)
+        return user, validated_token['exp']
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    finally:
+        close_old_connections()
+
+
+def _cors_headers(headers):
+    origin = headers.get(b'origin')
+    if not origin:
+        return []
+    allowed = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or origin.decode('latin-1') in getattr(
+        settings, 'CORS_ALLOWED_ORIGINS', []
+    )
+    if not allowed:
+        return []
+    return [
+        (b'access-control-allow-origin', origin),
+        (b'access-control-allow-credentials', b'true'),
+        (b'vary', b'Origin'),
+    ]
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *extra_headers],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode('utf-8')})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def live_events_app(scope, receive, send):
+    """
+    ASGI app for GET EVENTS_PATH: a text/event-stream of 'contract' and
+    'dashboard' events. Authenticated the same way as the API (Bearer header
+    or access token cookie). There is no replay: after a 'resync' event or a
+    reconnect, clients catch up through the change feed.
+
+    The token is checked again every REAUTH_SECONDS and the stream ends with
+    an 'unauthorized' event once it has expired or been rejected, or its user
+    has been deactivated; clients refresh the token and reconnect.
+    """
+    headers = dict(scope['headers'])
+    cors = _cors_headers(headers)
+
+    if scope['method'] != 'GET':
+        await _send_json(send, 405, {'error': 'Method not allowed'}, cors)
+        return
+    raw_token = _raw_token(headers)
+    auth = await sync_to_async(_authenticate)(raw_token)
+    if auth is None:
+        await _send_json(send, 401, {'error': 'Authentication required', 'code': 'NOT_AUTHENTICATED'}, cors)
+        return
+
+    subscriber = broadcaster.subscribe()
+    if subscriber is None:
+        await _send_json(send, 503, {'error': 'Too many live connections', 'code': 'LIVE_EVENTS_FULL'},
+                         [(b'retry-after', b'5'), *cors])
+        return
+
+    loop = asyncio.get_running_loop()
+    disconnect = loop.create_task(_wait_for_disconnect(receive))
+    getter = None
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+                *cors,
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f"retry: {RETRY_MILLISECONDS}\n: connected\n\n".encode('utf-8'),
+            'more_body': True,
+        })
+
+        _, expires_at = auth
+        reauth_at = time.time() + REAUTH_SECONDS
+        keepalive_at = time.time() + HEARTBEAT_SECONDS
+        while True:
+            now = time.time()
+            if now >= reauth_at or now >= expires_at:
+                auth = None if now >= expires_at else await sync_to_async(_authenticate)(raw_token)
+                if auth is None:
+                    await send({
+                        'type': 'http.response.body', 'body': encode_event('unauthorized', {}), 'more_body': True,
+                    })
+                    break
+                reauth_at = now + REAUTH_SECONDS
+
+            if getter is None:
+                getter = loop.create_task(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                (getter, disconnect), timeout=max(min(keepalive_at, reauth_at, expires_at) - now, 0),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                break
+            if getter in done:
+                chunk = getter.result()
+                getter = None
+                if chunk is None:
+                    await send({'type': 'http.response.body', 'body': encode_event('resync', {}), 'more_body': True})
+                    break
+            elif time.time() >= keepalive_at:
+                chunk = b': keepalive\n\n'
+            else:
+                continue
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            keepalive_at = time.time() + HEARTBEAT_SECONDS
+
+        if not disconnect.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    except OSError:
+        # Client went away mid-write
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        for task in (getter, disconnect):
+            if task is not None:
+                task.cancel()
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.nextcrm.autocomplete import ENTITIES, PrefixIndex, get_version
+
+
+class Command(BaseCommand):
+    help = 'Build the autocomplete prefix indexes and report their size, build time and lookup latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='a', help='Prefix used to time lookups')
+        parser.add_argument('--lookups', type=int, default=10000, help='Number of timed lookups per entity')
+
+    def handle(self, *args, **options):
+        for entity in ENTITIES:
+            index = PrefixIndex.build(entity, get_version(entity))
+            stats = index.stats()
+
+            started = time.perf_counter()
+            for _ in range(options['lookups']):
+                index.search(options['prefix'])
+            per_lookup_us = (time.perf_counter() - started) / max(options['lookups'], 1) * 1_000_000
+
+            self.stdout.write(
+                f"{entity}: {stats['objects']} objects, {stats['entries']} keys, "
+                f"~{stats['approx_bytes'] / 1024:.1f} KiB, built in {stats['build_ms']} ms, "
+                f"{per_lookup_us:.1f} us/lookup"
+            )
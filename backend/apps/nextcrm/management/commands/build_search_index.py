@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.nextcrm.search import SEARCH_MODELS, backfill_search_text, create_search_index
+
+
+class Command(BaseCommand):
+    help = 'Backfill search_text columns and create their trigram indexes (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--skip-backfill', action='store_true')
+
+    def handle(self, *args, **options):
+        for model in SEARCH_MODELS:
+            label = model._meta.label
+            if not options['skip_backfill']:
+                updated = backfill_search_text(model.objects.all(), chunk_size=options['chunk_size'])
+                self.stdout.write(f"{label}: refreshed search_text on {updated} rows")
+
+            if create_search_index(model):
+                self.stdout.write(self.style.SUCCESS(f"{label}: trigram index ready"))
+            else:
+                self.stdout.write(
+                    f"{label}: {connection.vendor} has no trigram support, search keeps using field lookups"
+                )
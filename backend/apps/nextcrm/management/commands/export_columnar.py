@@ -0,0 +1,40 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from apps.jobs.queue import enqueue
+from apps.nextcrm.columnar import BATCH_SIZE, DATASETS, FORMATS, ColumnarUnavailable, export_all
+
+
+class Command(BaseCommand):
+    help = 'Export contracts, amendments and exchange rates to Parquet or Arrow IPC, partitioned by year'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--format', dest='file_format', choices=sorted(FORMATS), default='parquet')
+        parser.add_argument('--dataset', action='append', choices=sorted(DATASETS),
+                            help='Dataset to export; repeat for several (default: all)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only rows changed since the last export into output_dir')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--queue', action='store_true',
+                            help='Queue a columnar_export job for run_jobs instead of exporting here')
+
+    def handle(self, *args, **options):
+        if options['queue']:
+            export_job = enqueue('columnar_export', {
+                'output_dir': os.path.abspath(options['output_dir']), 'datasets': options['dataset'],
+                'file_format': options['file_format'], 'incremental': options['incremental'],
+                'batch_size': options['batch_size'],
+            })
+            self.stdout.write(self.style.SUCCESS(f"Queued job {export_job.pk}"))
+            return
+
+        try:
+            results = export_all(
+                options['output_dir'], names=options['dataset'], file_format=options['file_format'],
+                incremental=options['incremental'], batch_size=options['batch_size'],
+            )
+        except ColumnarUnavailable as exc:
+            raise CommandError(str(exc))
+
+        for name, (rows, files) in results.items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: {rows} rows in {len(files)} files"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.nextcrm.changes import TOMBSTONE_RETENTION_DAYS, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete change-feed tombstones older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TOMBSTONE_RETENTION_DAYS)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        removed = prune_tombstones(older_than_days=options['days'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} tombstones older than {options['days']} days"))
@@ -1,11 +1,119 @@
-from django.db import models
+from django.db import DatabaseError, models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+import copy
 import uuid
 
 
+def build_search_text(instance):
+    """Lowercased values of instance.search_text_fields, one per line"""
+    values = []
+    for path in instance.search_text_fields:
+        value = instance
+        for attr in path.split('__'):
+            value = getattr(value, attr, None) if value is not None else None
+        values.append(str(value or '').lower())
+    return '\n'.join(values)
+
+
+def _snapshot_value(value):
+    # JSONField values are mutable, so copy them or in-place edits go unnoticed
+    return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+
+def _audit_value(value):
+    if value is None or isinstance(value, (str, int, float, bool, dict, list)):
+        return value
+    return str(value)
+
+
+class FieldTrackingMixin:
+    """
+    Snapshot field values when an instance is loaded and diff them at save time.
+
+    Saving a loaded instance only writes the columns that changed (plus
+    auto_now columns), and the editable part of the diff is left on
+    last_changes for the audit log. Instances that were never loaded save
+    every column as usual and report last_changes as None. If the row was
+    deleted after loading, the save falls back to a full insert, the same as
+    a plain Model.save would do.
+    """
+
+    _loaded_values = None
+    last_changes = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot()
+
+    def _snapshot(self):
+        self._loaded_values = {
+            field.attname: _snapshot_value(self.__dict__[field.attname])
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    def get_changed_fields(self):
+        """Map of field name to (old, new) for fields changed since load, or None without a snapshot"""
+        if self._loaded_values is None:
+            return None
+
+        changed = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            new_value = self.__dict__[field.attname]
+            if field.attname not in self._loaded_values:
+                # Deferred when loaded and fetched later, so the old value is unknown
+                changed[field.name] = (None, new_value)
+            elif self._loaded_values[field.attname] != new_value:
+                changed[field.name] = (self._loaded_values[field.attname], new_value)
+        return changed
+
+    def save(self, *args, **kwargs):
+        changed = None
+        if not args and not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            changed = self.get_changed_fields()
+            if changed is not None:
+                auto_now_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False) and field.name not in changed
+                ]
+                kwargs['update_fields'] = list(changed) + auto_now_fields
+
+        # Set before saving so post_save receivers can see it
+        if changed is None:
+            self.last_changes = None
+        else:
+            self.last_changes = {
+                name: {'old': _audit_value(old), 'new': _audit_value(new)}
+                for name, (old, new) in changed.items()
+                if self._meta.get_field(name).editable
+            }
+
+        try:
+            super().save(*args, **kwargs)
+        except DatabaseError as exc:
+            # Only the bare DatabaseError Django raises when update_fields matched no row
+            if changed is None or type(exc) is not DatabaseError:
+                raise
+            # The UPDATE ran fine and matched nothing, so the surrounding transaction is still usable
+            using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+            if transaction.get_connection(using).in_atomic_block:
+                transaction.set_rollback(False, using=using)
+            del kwargs['update_fields']
+            super().save(*args, **kwargs)
+        self._snapshot()
+
+
 class Cost_Center(models.Model):
     cost_center_name = models.CharField(max_length=50, unique=True)
     description = models.TextField(blank=True)
@@ -15,6 +123,8 @@ class Cost_Center(models.Model):
 
     class Meta:
         ordering = ['cost_center_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Cost Center'
         verbose_name_plural = 'Cost Centers'
 
@@ -31,17 +141,26 @@ class Sociedad(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     email = models.EmailField(blank=True)
     is_active = models.BooleanField(default=True)
+    search_text = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    search_text_fields = ('sociedad_name', 'tax_id', 'city', 'country')
+
     class Meta:
         ordering = ['sociedad_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Sociedad'
         verbose_name_plural = 'Sociedades'
 
     def __str__(self):
         return self.sociedad_name
 
+    def save(self, *args, **kwargs):
+        self.search_text = build_search_text(self)
+        super().save(*args, **kwargs)
+
 
 class Trader(models.Model):
     trader_name = models.CharField(max_length=50)
@@ -57,6 +176,8 @@ class Trader(models.Model):
 
     class Meta:
         ordering = ['trader_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
 
     def __str__(self):
         return self.trader_name
@@ -72,6 +193,8 @@ class Commodity_Group(models.Model):
 
     class Meta:
         ordering = ['sort_order', 'commodity_group_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Commodity Group'
         verbose_name_plural = 'Commodity Groups'
 
@@ -89,6 +212,8 @@ class Commodity_Type(models.Model):
 
     class Meta:
         ordering = ['sort_order', 'commodity_type_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Commodity Type'
         verbose_name_plural = 'Commodity Types'
 
@@ -110,6 +235,8 @@ class Commodity(models.Model):
 
     class Meta:
         ordering = ['commodity_name_short']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Commodity'
         verbose_name_plural = 'Commodities'
 
@@ -117,7 +244,7 @@ class Commodity(models.Model):
         return f"{self.commodity_name_short} - {self.commodity_group}"
 
 
-class Counterparty(models.Model):
+class Counterparty(FieldTrackingMixin, models.Model):
     COUNTERPARTY_TYPES = [
         ('supplier', 'Supplier'),
         ('customer', 'Customer'),
@@ -169,17 +296,26 @@ class Counterparty(models.Model):
     
     # Metadata
     notes = models.TextField(blank=True)
+    search_text = models.TextField(blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    search_text_fields = ('counterparty_name', 'counterparty_code', 'city')
+
     class Meta:
         ordering = ['counterparty_name']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Counterparty'
         verbose_name_plural = 'Counterparties'
 
     def __str__(self):
         return f"{self.counterparty_name} ({self.counterparty_type})"
 
+    def save(self, *args, **kwargs):
+        self.search_text = build_search_text(self)
+        super().save(*args, **kwargs)
+
     @property
     def is_supplier(self):
         return self.counterparty_type in ['supplier', 'both']
@@ -201,6 +337,8 @@ class Currency(models.Model):
 
     class Meta:
         ordering = ['currency_code']
+        # Keyset scans for the change feed, see apps.nextcrm.changes
+        indexes = [models.Index(fields=['updated_at', 'id'])]
         verbose_name = 'Currency'
         verbose_name_plural = 'Currencies'
 
@@ -224,7 +362,7 @@ class ExchangeRate(models.Model):
         return f"{self.from_currency.currency_code}/{self.to_currency.currency_code} = {self.rate} ({self.rate_date})"
 
 
-class Contract(models.Model):
+class Contract(FieldTrackingMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('pending_approval', 'Pending Approval'),
@@ -307,12 +445,17 @@ class Contract(models.Model):
     internal_reference = models.CharField(max_length=50, blank=True)
     profit_center = models.CharField(max_length=50, blank=True)
     
+    # Denormalized search column, see apps.nextcrm.search
+    search_text = models.TextField(blank=True, editable=False)
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_contracts')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='updated_contracts')
 
+    search_text_fields = ('contract_number', 'counterparty__counterparty_name', 'commodity__commodity_name_short')
+
     class Meta:
         ordering = ['-contract_date', '-created_at']
         indexes = [
@@ -320,6 +463,7 @@ class Contract(models.Model):
             models.Index(fields=['counterparty', 'status']),
             models.Index(fields=['trader', 'contract_date']),
             models.Index(fields=['commodity', 'delivery_period_start']),
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def __str__(self):
@@ -345,8 +489,20 @@ class Contract(models.Model):
         if self.quantity and self.price:
             self.total_value = self.quantity * self.price
         
+        if self._search_text_stale():
+            self.search_text = build_search_text(self)
+        
         super().save(*args, **kwargs)
 
+    def _search_text_stale(self):
+        # search_text follows counterparty and commodity, so only rebuild when a
+        # source column moved rather than fetching both on every save
+        changed = self.get_changed_fields()
+        if changed is None:
+            return True
+        sources = {path.split('__', 1)[0] for path in self.search_text_fields}
+        return not sources.isdisjoint(changed)
+
     @property
     def days_to_delivery(self):
         if self.delivery_period_start:
@@ -370,7 +526,7 @@ class Contract(models.Model):
         return 0
 
 
-class ContractAmendment(models.Model):
+class ContractAmendment(FieldTrackingMixin, models.Model):
     AMENDMENT_TYPES = [
         ('quantity', 'Quantity Change'),
         ('price', 'Price Change'),
@@ -400,4 +556,20 @@ class ContractAmendment(models.Model):
         unique_together = ['contract', 'amendment_number']
 
     def __str__(self):
-        return f"{self.contract.contract_number} - Amendment {self.amendment_number}"
\ No newline at end of file
+        return f"{self.contract.contract_number} - Amendment {self.amendment_number}"
+
+
+class Tombstone(models.Model):
+    """Hard-deleted rows, kept so change-feed clients can drop their copies"""
+    model_name = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['model_name', 'deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} {self.object_id} deleted {self.deleted_at}"
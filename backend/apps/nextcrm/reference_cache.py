@@ -0,0 +1,136 @@
+import hashlib
+import random
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+VERSION_KEY = 'refdata_version:{label}'
+CHANGED_KEY = 'refdata_changed:{label}'
+
+_config = getattr(settings, 'REFERENCE_CACHE', {})
+CACHE_TIMEOUT = _config.get('TIMEOUT', 3600)
+
+
+def _version_key(model):
+    return VERSION_KEY.format(label=model._meta.label_lower)
+
+
+def _changed_key(model):
+    return CHANGED_KEY.format(label=model._meta.label_lower)
+
+
+def _initial_version():
+    # Random start so a flushed cache never hands out an old ETag for new content
+    return random.randint(0, 2 ** 30)
+
+
+def get_versions(models):
+    """Current version of each model, in order, in one cache round trip"""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial_version(), None)
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key) for key in keys)
+
+
+def bump_version(model):
+    key = _version_key(model)
+    # add() is a no-op when the key exists, so incr() below is always safe
+    cache.add(key, _initial_version(), None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+    cache.set(_changed_key(model), time.time(), None)
+
+
+def changed_at(models):
+    """
+    When each model's version last moved, as timestamps. A deleted row
+    leaves nothing behind for updated_at to show, so this is what lets
+    Last-Modified advance on deletes. Unknown (flushed) entries start now.
+    """
+    keys = [_changed_key(model) for model in models]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, None)
+        values.update(cache.get_many(missing))
+    return [values.get(key) for key in keys]
+
+
+def last_modified(models):
+    """Latest updated_at or version change across models, as a timestamp, or None"""
+    timestamps = [
+        model.objects.aggregate(latest=Max('updated_at'))['latest']
+        for model in models
+    ]
+    timestamps = [value.timestamp() for value in timestamps if value is not None]
+    timestamps += [value for value in changed_at(models) if value is not None]
+    return max(timestamps) if timestamps else None
+
+
+class ReferenceDataCacheMixin:
+    """
+    Cache rendered list responses for slow-changing reference data.
+
+    The ETag is derived from the versions of `cache_models` (bumped by the
+    post_save/post_delete receivers in signals.py) and the request URL, so a
+    matching If-None-Match is answered with 304 before any query runs. On a
+    version change the key moves and the next request renders afresh.
+    Last-Modified also covers the time of the last version change, so
+    If-Modified-Since sees deletes as well as updates.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        versions = get_versions(self.cache_models)
+        fingerprint = hashlib.sha1(repr((
+            self.basename, versions, request.get_host(), request.get_full_path(), request.accepted_media_type
+        )).encode('utf-8')).hexdigest()
+        etag = f'"{fingerprint}"'
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            return self._not_modified(etag)
+
+        cache_key = f"refdata:{fingerprint}"
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            body = request.accepted_renderer.render(
+                response.data, request.accepted_media_type, self.get_renderer_context()
+            )
+            cached = (body, request.accepted_media_type, last_modified(self.cache_models))
+            cache.set(cache_key, cached, CACHE_TIMEOUT)
+
+        body, content_type, modified = cached
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if not if_none_match and modified and if_modified_since and int(modified) <= if_modified_since:
+            return self._not_modified(etag)
+
+        response = HttpResponse(body, content_type=content_type)
+        response['ETag'] = etag
+        if modified:
+            response['Last-Modified'] = http_date(modified)
+        # Browsers may keep a copy but must revalidate it on every use
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _not_modified(self, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
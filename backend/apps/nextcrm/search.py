@@ -0,0 +1,117 @@
+import time
+from django.db import connection
+from rest_framework import filters
+from .models import Contract, Counterparty, Sociedad, build_search_text
+
+
+SEARCH_MODELS = [Contract, Counterparty, Sociedad]
+
+# How long a worker trusts its answer to "does this table have a search index"
+INDEX_CHECK_TTL = 300
+
+_index_checks = {}
+
+
+def search_index_name(model):
+    return f"{model._meta.db_table}_search_trgm"
+
+
+def has_search_index(model):
+    """Whether the trigram index on model.search_text exists (cached per worker)"""
+    if connection.vendor != 'postgresql':
+        return False
+
+    now = time.monotonic()
+    checked = _index_checks.get(model)
+    if checked and now - checked[1] < INDEX_CHECK_TTL:
+        return checked[0]
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    exists = search_index_name(model) in constraints
+    _index_checks[model] = (exists, now)
+    return exists
+
+
+def create_search_index(model):
+    """Create the pg_trgm GIN index backing model.search_text (PostgreSQL only)"""
+    if connection.vendor != 'postgresql':
+        return False
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    index = connection.ops.quote_name(search_index_name(model))
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} '
+            f'ON {table} USING gin (search_text gin_trgm_ops)'
+        )
+    _index_checks.pop(model, None)
+    return True
+
+
+def backfill_search_text(queryset, chunk_size=2000):
+    """Recompute search_text for queryset in primary-key ordered chunks"""
+    model = queryset.model
+    related = [path.rsplit('__', 1)[0] for path in model.search_text_fields if '__' in path]
+    queryset = queryset.select_related(*related).order_by('pk')
+
+    updated = 0
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return updated
+
+        stale = []
+        for obj in chunk:
+            search_text = build_search_text(obj)
+            if obj.search_text != search_text:
+                obj.search_text = search_text
+                stale.append(obj)
+        model.objects.bulk_update(stale, ['search_text'])
+        updated += len(stale)
+        last_pk = chunk[-1].pk
+
+
+def refresh_contract_search_text(instance):
+    """Re-derive Contract.search_text after a counterparty or commodity rename"""
+    # Skip contracts that already carry the current name
+    if isinstance(instance, Counterparty):
+        queryset = Contract.objects.filter(counterparty=instance).exclude(
+            search_text__contains=f"\n{instance.counterparty_name.lower()}\n"
+        )
+    else:
+        queryset = Contract.objects.filter(commodity=instance).exclude(
+            search_text__endswith=f"\n{instance.commodity_name_short.lower()}"
+        )
+    return backfill_search_text(queryset)
+
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that answers ?search= from the model's search_text column
+    when it carries a trigram index, and falls back to the per-field
+    icontains ORs otherwise
+    """
+
+    def can_use_index(self, queryset, search_fields):
+        model = queryset.model
+        if model not in SEARCH_MODELS or not search_fields:
+            return False
+        # Prefixed lookups (^, =, @, $) keep their own semantics
+        if set(search_fields) != set(model.search_text_fields):
+            return False
+        return has_search_index(model)
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if not search_terms or not self.can_use_index(queryset, search_fields):
+            return super().filter_queryset(request, queryset, view)
+
+        for search_term in search_terms:
+            queryset = queryset.filter(search_text__contains=search_term.lower())
+        return queryset
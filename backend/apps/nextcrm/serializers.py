@@ -18,7 +18,7 @@ class CostCenterSerializer(serializers.ModelSerializer):
 class SociedadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sociedad
-        fields = '__all__'
+        exclude = ('search_text',)
         read_only_fields = ('created_at', 'updated_at')
 
 
@@ -76,7 +76,7 @@ class CounterpartySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Counterparty
-        fields = '__all__'
+        exclude = ('search_text',)
         read_only_fields = ('created_at', 'updated_at')
     
     def get_contracts_count(self, obj):
@@ -148,7 +148,7 @@ class ContractDetailSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Contract
-        fields = '__all__'
+        exclude = ('search_text',)
         read_only_fields = ('id', 'contract_number', 'total_value', 'created_at', 'updated_at')
     
     def get_amendments(self, obj):
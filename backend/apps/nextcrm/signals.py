@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import (
+    Cost_Center, Sociedad, Trader, Commodity_Group, Commodity_Type,
+    Commodity, Counterparty, Currency, Contract
+)
+from .autocomplete import bump_version
+from . import reference_cache
+from .changes import record_tombstone
+from . import live
+from .search import refresh_contract_search_text
+
+
+@receiver([post_save, post_delete], sender=Counterparty)
+def invalidate_counterparty_autocomplete(sender, **kwargs):
+    bump_version('counterparty')
+
+
+@receiver([post_save, post_delete], sender=Commodity)
+@receiver([post_save, post_delete], sender=Commodity_Group)
+def invalidate_commodity_autocomplete(sender, **kwargs):
+    bump_version('commodity')
+
+
+@receiver([post_save, post_delete], sender=Trader)
+def invalidate_trader_autocomplete(sender, **kwargs):
+    bump_version('trader')
+
+
+@receiver(post_save, sender=Counterparty)
+def refresh_contracts_for_counterparty(sender, instance, created, **kwargs):
+    # last_changes is None when the instance was never loaded, so the name may have changed
+    if created or (instance.last_changes is not None and 'counterparty_name' not in instance.last_changes):
+        return
+    refresh_contract_search_text(instance)
+
+
+@receiver(post_save, sender=Commodity)
+def refresh_contracts_for_commodity(sender, instance, created, **kwargs):
+    if created:
+        return
+    refresh_contract_search_text(instance)
+
+
+@receiver([post_save, post_delete], sender=Cost_Center)
+@receiver([post_save, post_delete], sender=Sociedad)
+@receiver([post_save, post_delete], sender=Trader)
+@receiver([post_save, post_delete], sender=Commodity_Group)
+@receiver([post_save, post_delete], sender=Commodity_Type)
+@receiver([post_save, post_delete], sender=Commodity)
+@receiver([post_save, post_delete], sender=Currency)
+@receiver([post_save, post_delete], sender=Counterparty)
+@receiver([post_save, post_delete], sender=Contract)
+def invalidate_reference_cache(sender, **kwargs):
+    reference_cache.bump_version(sender)
+
+
+@receiver(post_delete, sender=Cost_Center)
+@receiver(post_delete, sender=Sociedad)
+@receiver(post_delete, sender=Trader)
+@receiver(post_delete, sender=Commodity_Group)
+@receiver(post_delete, sender=Commodity_Type)
+@receiver(post_delete, sender=Commodity)
+@receiver(post_delete, sender=Counterparty)
+@receiver(post_delete, sender=Currency)
+@receiver(post_delete, sender=Contract)
+def record_change_feed_tombstone(sender, instance, **kwargs):
+    record_tombstone(sender, instance.pk)
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def publish_contract_event(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_delete:
+        action = 'deleted'
+    else:
+        action = 'created' if created else 'updated'
+    data = {
+        'action': action,
+        'id': str(instance.pk),
+        'contract_number': instance.contract_number,
+        'status': instance.status,
+        'updated_at': instance.updated_at,
+    }
+    transaction.on_commit(lambda: live.publish('contract', data))
@@ -0,0 +1,44 @@
+import itertools
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication.models import UserProfile
+from apps.nextcrm.models import Commodity, Commodity_Group, Commodity_Type, Contract, Counterparty, Currency, Trader
+
+_sequence = itertools.count(1)
+
+
+def make_user(username='trader', **kwargs):
+    user = User.objects.create_user(username, f'{username}@example.com', 'traderpass123', **kwargs)
+    UserProfile.objects.create(user=user)
+    return user
+
+
+def authenticate(client, user):
+    """Log `client` in the way the frontend does, with the access token cookie"""
+    client.cookies['access_token'] = str(AccessToken.for_user(user))
+    return client
+
+
+def make_counterparty(name='Acme Grain', **kwargs):
+    kwargs.setdefault('counterparty_code', f'CP{next(_sequence):04d}')
+    return Counterparty.objects.create(counterparty_name=name, **kwargs)
+
+
+def make_contract(counterparty=None, **kwargs):
+    n = next(_sequence)
+    if 'commodity' not in kwargs:
+        kwargs['commodity'] = Commodity.objects.create(
+            commodity_name_short=f'Wheat {n}', commodity_code=f'CM{n:04d}',
+            commodity_group=Commodity_Group.objects.get_or_create(commodity_group_name='Grains')[0],
+            commodity_type=Commodity_Type.objects.get_or_create(commodity_type_name='Physical')[0],
+        )
+    kwargs.setdefault('trader', Trader.objects.get_or_create(trader_name='Ana')[0])
+    kwargs.setdefault('trade_currency', Currency.objects.get_or_create(
+        currency_code='USD', defaults={'currency_name': 'US Dollar'})[0])
+    kwargs.setdefault('quantity', Decimal('100.000'))
+    kwargs.setdefault('price', Decimal('250.00'))
+    kwargs.setdefault('delivery_period_start', date(2024, 3, 1))
+    kwargs.setdefault('delivery_period_end', date(2024, 3, 31))
+    return Contract.objects.create(counterparty=counterparty or make_counterparty(), **kwargs)
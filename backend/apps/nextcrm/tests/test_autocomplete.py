@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import TestCase
+from apps.nextcrm import autocomplete
+from .helpers import authenticate, make_counterparty, make_user
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete._indexes.clear()
+        self.addCleanup(autocomplete._indexes.clear)
+        self.acme = make_counterparty('Acme Grain')
+        make_counterparty('Borealis Corp')
+
+    def names(self, prefix):
+        return [result['counterparty_name'] for result in autocomplete.autocomplete('counterparty', prefix)]
+
+    def test_prefix_and_word_start(self):
+        self.assertEqual(self.names('ac'), ['Acme Grain'])
+        self.assertEqual(self.names('CORP'), ['Borealis Corp'])
+        self.assertEqual(self.names(''), [])
+
+    def test_write_rebuilds(self):
+        self.assertEqual(self.names('zen'), [])
+        make_counterparty('Zenith Trading')
+        self.assertEqual(self.names('zen'), ['Zenith Trading'])
+
+    def test_evicted_version_rebuilds(self):
+        key = autocomplete.VERSION_KEY.format(entity='counterparty')
+        cache.set(key, 1, None)
+        self.assertEqual(self.names('ac'), ['Acme Grain'])
+        # Evicted, then a write: counting up from a fixed start would land
+        # on 1 again and this worker would keep its stale index
+        cache.delete(key)
+        self.acme.counterparty_name = 'Apex Grain'
+        self.acme.save()
+        self.assertNotEqual(autocomplete.get_version('counterparty'), 1)
+        self.assertEqual(self.names('ap'), ['Apex Grain'])
+
+    def test_endpoint(self):
+        authenticate(self.client, make_user())
+        data = self.client.get('/api/nextcrm/autocomplete/', {'q': 'bor', 'type': 'counterparty'}).json()
+        self.assertEqual([result['counterparty_name'] for result in data['counterparty']], ['Borealis Corp'])
+        self.assertEqual(self.client.get('/api/nextcrm/autocomplete/', {'type': 'nope'}).status_code, 400)
@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.test import TestCase
+from apps.nextcrm.bootstrap import BOOTSTRAP_ENTITIES
+from apps.nextcrm.models import Currency
+from .helpers import authenticate, make_user
+
+BOOTSTRAP_URL = '/api/nextcrm/bootstrap/'
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Currency.objects.create(currency_code='USD', currency_name='US Dollar')
+        authenticate(self.client, make_user())
+
+    def fetch(self, since=None, etag=None):
+        params = {'since': since} if since is not None else {}
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag is not None else {}
+        return self.client.get(BOOTSTRAP_URL, params, **headers)
+
+    def assertFull(self, response):
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['full'])
+        self.assertEqual(set(data['entities']), set(BOOTSTRAP_ENTITIES))
+        self.assertEqual(response['ETag'], f'"{data["version"]}"')
+        return data
+
+    def test_full_payload(self):
+        data = self.assertFull(self.fetch())
+        self.assertEqual(data['entities']['currencies']['rows'][0][1], 'USD')
+        self.assertEqual(self.fetch()['Cache-Control'], 'private, no-cache')
+
+    def test_not_modified(self):
+        etag = self.fetch()['ETag']
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                response = self.fetch(etag=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+
+    def test_modified_after_change(self):
+        etag = self.fetch()['ETag']
+        Currency.objects.create(currency_code='EUR', currency_name='Euro')
+        data = self.assertFull(self.fetch(etag=etag))
+        self.assertNotEqual(f'"{data["version"]}"', etag)
+        self.assertEqual(len(data['entities']['currencies']['rows']), 2)
+
+    def test_delta_only_changed_entities(self):
+        version = self.fetch().json()['version']
+        Currency.objects.create(currency_code='EUR', currency_name='Euro')
+
+        response = self.fetch(since=version)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['full'])
+        self.assertEqual(list(data['entities']), ['currencies'])
+        self.assertNotEqual(data['version'], version)
+        # A partial body must not be cached under the full payload's validator
+        self.assertFalse(response.has_header('ETag'))
+
+        unchanged = self.fetch(since=data['version']).json()
+        self.assertEqual(unchanged['entities'], {})
+
+    def test_stale_or_malformed_token_gets_full_payload(self):
+        version = self.fetch().json()['version']
+        stale_layout = 'v0' + version[2:]
+        too_short = version.rsplit('.', 1)[0]
+        for since in ('garbage', stale_layout, too_short, version[:-1] + 'z', ''):
+            with self.subTest(since=since):
+                self.assertFull(self.fetch(since=since))
+
+    def test_malformed_if_none_match_ignored(self):
+        for header in ('not-quoted', '"unterminated', ''):
+            with self.subTest(header=header):
+                self.assertFull(self.fetch(etag=header))
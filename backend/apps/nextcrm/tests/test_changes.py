@@ -0,0 +1,67 @@
+from unittest import mock
+from django.test import TestCase
+from apps.nextcrm.changes import encode_cursor
+from .helpers import authenticate, make_contract, make_counterparty, make_user
+
+
+@mock.patch('apps.nextcrm.changes.SETTLE_SECONDS', 0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        authenticate(self.client, make_user())
+
+    def feed(self, resource, cursor=None):
+        url = f'/api/nextcrm/changes/{resource}/'
+        return self.client.get(url, {'cursor': cursor} if cursor else {})
+
+    def test_pages_and_tombstones(self):
+        first, second = make_counterparty('First'), make_counterparty('Second')
+        page = self.feed('counterparties').json()
+        self.assertEqual([row['id'] for row in page['results']], [first.pk, second.pk])
+
+        second.is_active = False
+        second.save()
+        deleted_pk = first.pk
+        first.delete()
+        page = self.feed('counterparties', page['cursor']).json()
+        self.assertEqual(page['results'], [])
+        self.assertEqual(
+            sorted((tombstone['id'], tombstone['reason']) for tombstone in page['tombstones']),
+            sorted([(str(second.pk), 'deactivated'), (str(deleted_pk), 'deleted')]),
+        )
+
+    def test_contract_cursor_round_trips_uuid(self):
+        make_contract()
+        page = self.feed('contracts').json()
+        self.assertEqual(len(page['results']), 1)
+        self.assertEqual(self.feed('contracts', page['cursor']).json()['results'], [])
+
+    def test_invalid_cursors_are_400(self):
+        valid_t = ['2030-01-01T00:00:00+00:00', 0]
+        cursors = [
+            ('counterparties', 'not base64 !'),
+            ('counterparties', encode_cursor('x')),
+            ('counterparties', encode_cursor({'r': ['2024-01-01T00:00:00+00:00', 'x'], 't': valid_t})),
+            ('counterparties', encode_cursor({'r': ['2024-13-45T00:00:00+00:00', 1], 't': valid_t})),
+            ('counterparties', encode_cursor({'r': ['2024-01-01T00:00:00', 1], 't': valid_t})),
+            ('counterparties', encode_cursor({'r': [None, 1], 't': valid_t})),
+            ('counterparties', encode_cursor({'t': ['2030-01-01T00:00:00+00:00', 'x']})),
+            ('counterparties', encode_cursor({})),
+            ('contracts', encode_cursor({'r': ['2024-01-01T00:00:00+00:00', 'x'], 't': valid_t})),
+        ]
+        for resource, cursor in cursors:
+            with self.subTest(resource=resource, cursor=cursor):
+                response = self.feed(resource, cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['code'], 'INVALID_CURSOR')
+
+    def test_invalid_per_resource_positions_are_400(self):
+        for positions in ({'counterparties': 'x'}, {'contracts': ['2024-01-01T00:00:00Z', 'x']}):
+            with self.subTest(positions=positions):
+                response = self.client.get('/api/nextcrm/changes/', {'cursor': encode_cursor(positions)})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['code'], 'INVALID_CURSOR')
+
+    def test_expired_cursor_is_410(self):
+        response = self.feed('counterparties', encode_cursor({'t': ['2000-01-01T00:00:00+00:00', 0]}))
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['code'], 'RESYNC_REQUIRED')
@@ -0,0 +1,160 @@
+import threading
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from apps.nextcrm.coalescing import _cached_call, coalesce, single_flight
+from apps.nextcrm.models import Commodity
+from apps.nextcrm.views import ContractViewSet, get_dashboard_statistics
+from .helpers import authenticate, make_contract, make_user
+
+
+def wait_for_waiters(count, started, timeout=5):
+    """Block the leader until `count` other callers have joined its flight"""
+    deadline = time.monotonic() + timeout
+    while single_flight.coalesced - started < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target(index)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_calls_share_one_execution(self):
+        executions = []
+        started = single_flight.coalesced
+
+        @coalesce()
+        def compute(value):
+            executions.append(value)
+            wait_for_waiters(9, started)
+            return {'value': value}
+
+        results = run_threads(10, lambda index: compute(1))
+        self.assertEqual(executions, [1])
+        self.assertEqual(results, [{'value': 1}] * 10)
+
+    def test_error_reaches_every_waiter(self):
+        started = single_flight.coalesced
+
+        @coalesce()
+        def compute():
+            wait_for_waiters(4, started)
+            raise ValueError('boom')
+
+        def call(index):
+            try:
+                compute()
+            except ValueError as exc:
+                return str(exc)
+
+        self.assertEqual(run_threads(5, call), ['boom'] * 5)
+
+    def test_stampede_lock_across_workers(self):
+        executions = []
+
+        def compute():
+            executions.append(1)
+            time.sleep(0.2)
+            return 42
+
+        # Distinct single-flight keys stand in for separate workers sharing the cache
+        with mock.patch('apps.nextcrm.coalescing.POLL_INTERVAL', 0.01):
+            results = run_threads(5, lambda index: single_flight.do(
+                f'worker-{index}', _cached_call, 'stampede', 60, True, compute, (), {},
+            ))
+        self.assertEqual(results, [42] * 5)
+        self.assertEqual(len(executions), 1)
+        self.assertIsNone(cache.get('coalesce_lock:stampede'))
+
+    def test_waiter_leaves_holders_lock_alone(self):
+        # Another worker holds the lock and outlives this caller's wait
+        cache.set('coalesce_lock:slow', 1, 60)
+        with mock.patch('apps.nextcrm.coalescing.POLL_INTERVAL', 0.01), \
+                mock.patch('apps.nextcrm.coalescing.LOCK_TIMEOUT', 0.05):
+            self.assertEqual(_cached_call('slow', 60, True, lambda: 42, (), {}), 42)
+        self.assertEqual(cache.get('coalesce_lock:slow'), 1)
+
+
+class DashboardVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.contract = make_contract()
+
+    def test_commodity_change_retires_cached_statistics(self):
+        first = get_dashboard_statistics()
+        with self.assertNumQueries(0):
+            get_dashboard_statistics()
+
+        Commodity.objects.filter(pk=self.contract.commodity_id).update(commodity_name_short='Barley')
+        # A queryset update sends no signal, so the cached copy is still served
+        self.assertEqual(get_dashboard_statistics(), first)
+
+        commodity = self.contract.commodity
+        commodity.commodity_name_short = 'Barley'
+        commodity.save()
+        stats = get_dashboard_statistics()
+        self.assertEqual(stats['top_commodities'][0]['commodity_name'], 'Barley')
+
+
+class CoalescedListTests(TransactionTestCase):
+    """Threads read through their own connections, so the rows must be committed"""
+    requests = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        for _ in range(3):
+            make_contract()
+
+    def test_identical_requests_share_one_query(self):
+        executions = []
+        started = single_flight.coalesced
+        filter_queryset = ContractViewSet.filter_queryset
+
+        def counting_filter_queryset(view, queryset):
+            executions.append(1)
+            wait_for_waiters(self.requests - 1, started)
+            return filter_queryset(view, queryset)
+
+        def fetch(index):
+            client = authenticate(self.client_class(), self.user)
+            response = client.get('/api/nextcrm/contracts/?status=draft')
+            return response.status_code, response.json()
+
+        with mock.patch.object(ContractViewSet, 'filter_queryset', counting_filter_queryset):
+            results = run_threads(self.requests, fetch)
+
+        self.assertEqual(len(executions), 1)
+        self.assertEqual({status_code for status_code, _ in results}, {200})
+        self.assertEqual(len({repr(body) for _, body in results}), 1)
+
+    def test_users_do_not_share(self):
+        other = make_user('other')
+        executions = []
+        filter_queryset = ContractViewSet.filter_queryset
+
+        def counting_filter_queryset(view, queryset):
+            executions.append(view.request.user.pk)
+            return filter_queryset(view, queryset)
+
+        with mock.patch.object(ContractViewSet, 'filter_queryset', counting_filter_queryset):
+            for user in (self.user, other):
+                authenticate(self.client_class(), user).get('/api/nextcrm/contracts/')
+        self.assertEqual(sorted(executions), sorted([self.user.pk, other.pk]))
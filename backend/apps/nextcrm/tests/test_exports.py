@@ -0,0 +1,97 @@
+import csv
+import io
+import zipfile
+from unittest import mock
+from django.test import TestCase
+from apps.nextcrm import exports
+from apps.nextcrm.exports import CONTRACT_EXPORT_COLUMNS, csv_stream
+from .helpers import authenticate, make_contract, make_counterparty, make_user
+
+
+class CsvInjectionTests(TestCase):
+    def test_formula_prefixes_are_quoted(self):
+        rows = [('=HYPERLINK("http://evil","x")',), ('+1',), ('-1',), ('@SUM(A1)',), ('\tx',), ('\rx',), ('plain',), (-5,)]
+        columns = (('Value', 'value'),)
+        data = b''.join(csv_stream(iter(rows), columns)).decode('utf-8')
+        values = [row[0] for row in csv.reader(io.StringIO(data))][1:]
+        self.assertEqual(values, [
+            '\'=HYPERLINK("http://evil","x")', "'+1", "'-1", "'@SUM(A1)", "'\tx", "'\rx", 'plain', '-5',
+        ])
+
+
+class ContractExportTests(TestCase):
+    def setUp(self):
+        authenticate(self.client, make_user())
+        make_contract(counterparty=make_counterparty('=HYPERLINK("http://evil","x")'))
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response = self.client.get('/api/nextcrm/contracts/export/', {'file_format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(self.read(response).decode('utf-8'))))
+        self.assertEqual(rows[0], [header for header, _ in CONTRACT_EXPORT_COLUMNS])
+        counterparty = rows[1][[path for _, path in CONTRACT_EXPORT_COLUMNS].index('counterparty__counterparty_name')]
+        self.assertEqual(counterparty, '\'=HYPERLINK("http://evil","x")')
+
+    def test_xlsx(self):
+        response = self.client.get('/api/nextcrm/contracts/export/', {'file_format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(self.read(response))) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        # Inline strings are never evaluated as formulas
+        self.assertIn('t="inlineStr"><is><t xml:space="preserve">=HYPERLINK(', sheet)
+        self.assertNotIn('<f>', sheet)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/nextcrm/contracts/export/', {'file_format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsgiContractExportTests(TestCase):
+    def setUp(self):
+        authenticate(self.async_client, make_user())
+        for _ in range(5):
+            make_contract()
+
+    async def test_streams_one_chunk_at_a_time(self):
+        rows_read = []
+        export_rows = exports.export_rows
+
+        def counting_rows(queryset):
+            for row in export_rows(queryset):
+                rows_read.append(row)
+                yield row
+
+        with mock.patch('apps.nextcrm.views.export_rows', counting_rows), \
+                mock.patch('apps.nextcrm.exports.FLUSH_BYTES', 1):
+            response = await self.async_client.get('/api/nextcrm/contracts/export/', {'file_format': 'csv'})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+
+            chunks = []
+            async for chunk in response.streaming_content:
+                # A buffered body would have read every row before the first chunk
+                if not chunks:
+                    self.assertLess(len(rows_read), 5)
+                chunks.append(chunk)
+
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(len(rows_read), 5)
+
+    async def test_closing_early_closes_the_generator(self):
+        closed = []
+
+        def chunks():
+            try:
+                yield b'first'
+                yield b'second'
+            finally:
+                closed.append(True)
+
+        iterator = exports.async_chunks(chunks())
+        self.assertEqual(await iterator.__anext__(), b'first')
+        await iterator.aclose()
+        self.assertEqual(closed, [True])
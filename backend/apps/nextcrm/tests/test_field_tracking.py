@@ -0,0 +1,136 @@
+import re
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from apps.nextcrm.models import Contract, ContractAmendment
+from .helpers import make_contract, make_counterparty, make_user
+
+
+def updated_columns(queries):
+    """Column names set by the single UPDATE among `queries`"""
+    updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+    assert len(updates) == 1, updates
+    assignments = updates[0].split(' SET ', 1)[1].rsplit(' WHERE ', 1)[0]
+    return set(re.findall(r'"(\w+)" = ', assignments))
+
+
+class FieldTrackingTests(TestCase):
+    def setUp(self):
+        self.contract = Contract.objects.get(pk=make_contract().pk)
+
+    def test_update_writes_changed_and_auto_now_columns(self):
+        self.contract.notes = 'Revised'
+        self.contract.price = Decimal('260.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.save()
+        # total_value is recomputed on every save but only price moved it
+        self.assertEqual(updated_columns(queries), {'notes', 'price', 'total_value', 'updated_at'})
+
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.notes, 'Revised')
+        self.assertEqual(self.contract.total_value, Decimal('26000.00'))
+
+    def test_unchanged_save_only_touches_updated_at(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.save()
+        self.assertEqual(updated_columns(queries), {'updated_at'})
+        self.assertEqual(self.contract.last_changes, {})
+
+    def test_last_changes(self):
+        self.contract.status = 'approved'
+        self.contract.notes = 'Signed'
+        self.contract.save()
+        self.assertEqual(self.contract.last_changes, {
+            'status': {'old': 'draft', 'new': 'approved'},
+            'notes': {'old': '', 'new': 'Signed'},
+        })
+        # The snapshot moves forward, so a second save reports only what changed since
+        self.contract.notes = 'Countersigned'
+        self.contract.save()
+        self.assertEqual(self.contract.last_changes, {'notes': {'old': 'Signed', 'new': 'Countersigned'}})
+
+    def test_last_changes_stringifies_values(self):
+        self.contract.price = Decimal('300.00')
+        self.contract.save()
+        self.assertEqual(self.contract.last_changes['price'], {'old': '250.00', 'new': '300.00'})
+        self.assertEqual(self.contract.last_changes['total_value']['old'], '25000.00')
+
+    def test_non_editable_written_but_not_reported(self):
+        self.contract.counterparty = make_counterparty('Delta Feeds')
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.save()
+        self.assertEqual(updated_columns(queries), {'counterparty_id', 'search_text', 'updated_at'})
+        self.assertEqual(set(self.contract.last_changes), {'counterparty'})
+
+    def test_created_instance_is_tracked(self):
+        contract = make_contract()
+        # The first save was an insert, so there is no diff to report
+        self.assertIsNone(contract.last_changes)
+        contract.notes = 'Fresh'
+        with CaptureQueriesContext(connection) as queries:
+            contract.save()
+        self.assertEqual(updated_columns(queries), {'notes', 'updated_at'})
+
+    def test_explicit_update_fields_respected(self):
+        self.contract.notes = 'Only this'
+        self.contract.price = Decimal('999.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.contract.save(update_fields=['notes'])
+        self.assertEqual(updated_columns(queries), {'notes'})
+        self.assertEqual(Contract.objects.get(pk=self.contract.pk).price, Decimal('250.00'))
+
+    def test_deferred_field(self):
+        contract = Contract.objects.defer('notes').get(pk=self.contract.pk)
+        contract.status = 'approved'
+        with CaptureQueriesContext(connection) as queries:
+            contract.save()
+        self.assertNotIn('notes', updated_columns(queries))
+        self.assertEqual(contract.last_changes, {'status': {'old': 'draft', 'new': 'approved'}})
+
+        # Assigned without loading it first, so the old value is unknown
+        contract = Contract.objects.defer('notes').get(pk=self.contract.pk)
+        contract.notes = 'Set blind'
+        contract.save()
+        self.assertEqual(contract.last_changes, {'notes': {'old': None, 'new': 'Set blind'}})
+        self.assertEqual(Contract.objects.get(pk=self.contract.pk).notes, 'Set blind')
+
+    def test_deleted_row_is_inserted_again(self):
+        Contract.objects.filter(pk=self.contract.pk).delete()
+        self.contract.notes = 'Still here'
+        self.contract.save()
+
+        saved = Contract.objects.get(pk=self.contract.pk)
+        self.assertEqual(saved.notes, 'Still here')
+        self.assertEqual(saved.quantity, Decimal('100.000'))
+        self.assertEqual(self.contract.last_changes, {'notes': {'old': '', 'new': 'Still here'}})
+
+
+class JSONFieldTrackingTests(TestCase):
+    def setUp(self):
+        contract = make_contract()
+        amendment = ContractAmendment.objects.create(
+            contract=contract, amendment_number='A1', amendment_type='price', description='Reprice',
+            old_values={'price': '250.00'}, new_values={'price': '260.00'}, requested_by=make_user(),
+        )
+        self.amendment = ContractAmendment.objects.get(pk=amendment.pk)
+
+    def test_in_place_edit_detected(self):
+        self.amendment.new_values['price'] = '270.00'
+        self.amendment.new_values['quantity'] = '90.000'
+        with CaptureQueriesContext(connection) as queries:
+            self.amendment.save()
+        self.assertEqual(updated_columns(queries), {'new_values'})
+        self.assertEqual(self.amendment.last_changes, {'new_values': {
+            'old': {'price': '260.00'},
+            'new': {'price': '270.00', 'quantity': '90.000'},
+        }})
+        self.assertEqual(ContractAmendment.objects.get(pk=self.amendment.pk).new_values['price'], '270.00')
+
+    def test_nested_edit_detected(self):
+        self.amendment.old_values['history'] = []
+        self.amendment.save()
+        self.amendment.old_values['history'].append('first')
+        self.amendment.save()
+        self.assertEqual(self.amendment.last_changes['old_values']['old']['history'], [])
+        self.assertEqual(ContractAmendment.objects.get(pk=self.amendment.pk).old_values['history'], ['first'])
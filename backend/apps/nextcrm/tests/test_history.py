@@ -0,0 +1,36 @@
+from django.test import TestCase
+from django.utils import timezone
+from apps.authentication.models import AuditLog
+from .helpers import authenticate, make_contract, make_user
+
+
+class ContractHistoryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        authenticate(self.client, self.user)
+        self.contract = make_contract()
+
+    def test_invalid_pk_is_404(self):
+        response = self.client.get('/api/nextcrm/contracts/not-a-uuid/history/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unauthenticated(self):
+        self.client.cookies.clear()
+        response = self.client.get(f'/api/nextcrm/contracts/{self.contract.pk}/history/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_pages_through_equal_timestamps(self):
+        # More rows than one page, all sharing one timestamp
+        timestamp = timezone.now()
+        AuditLog.objects.bulk_create(
+            AuditLog(action='UPDATE', model_name='Contract', object_id=str(self.contract.pk), timestamp=timestamp)
+            for _ in range(25)
+        )
+        seen = []
+        url = f'/api/nextcrm/contracts/{self.contract.pk}/history/?page_size=10'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(entry['id'] for entry in page['results'])
+            url = page['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.nextcrm import live
+from .helpers import make_user
+
+
+class FakeClient:
+    """Drives live_events_app the way an ASGI server would for one connection"""
+
+    def __init__(self, token=None):
+        self.inbox = asyncio.Queue()
+        self.sent = []
+        headers = [(b'cookie', f'access_token={token}'.encode())] if token else []
+        self.scope = {'type': 'http', 'method': 'GET', 'path': live.EVENTS_PATH, 'headers': headers}
+        self.task = None
+
+    def open(self):
+        self.task = asyncio.get_running_loop().create_task(live.live_events_app(self.scope, self.receive, self.send))
+        return self
+
+    async def receive(self):
+        return await self.inbox.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def disconnect(self):
+        self.inbox.put_nowait({'type': 'http.disconnect'})
+
+    @property
+    def status(self):
+        return next((message['status'] for message in self.sent if message['type'] == 'http.response.start'), None)
+
+    @property
+    def body(self):
+        return b''.join(message.get('body', b'') for message in self.sent if message['type'] == 'http.response.body')
+
+    @property
+    def ended(self):
+        return any(message['type'] == 'http.response.body' and not message.get('more_body') for message in self.sent)
+
+
+async def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out waiting for the stream')
+        await asyncio.sleep(0.01)
+
+
+class LiveEventsTests(TransactionTestCase):
+    """The stream closes its connection around each token check, which a TestCase transaction would not survive"""
+
+    def setUp(self):
+        self.user = make_user()
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def test_requires_token(self):
+        client = FakeClient().open()
+        await client.task
+        self.assertEqual(client.status, 401)
+
+    async def test_streams_events(self):
+        client = FakeClient(self.token).open()
+        await wait_until(lambda: b': connected' in client.body)
+        self.assertEqual(client.status, 200)
+
+        live.publish('note', {'id': 1})
+        await wait_until(lambda: b'event: note' in client.body)
+        self.assertIn(b'data: {"id":1}', client.body)
+
+        client.disconnect()
+        await client.task
+        self.assertEqual(live.broadcaster.connections, 0)
+
+    async def test_closed_when_user_deactivated(self):
+        with mock.patch('apps.nextcrm.live.REAUTH_SECONDS', 0.05):
+            client = FakeClient(self.token).open()
+            await wait_until(lambda: b': connected' in client.body)
+
+            self.user.is_active = False
+            await sync_to_async(self.user.save)()
+            await asyncio.wait_for(client.task, 5)
+
+        self.assertIn(b'event: unauthorized', client.body)
+        self.assertTrue(client.ended)
+        self.assertEqual(live.broadcaster.connections, 0)
+
+    async def test_active_user_stays_connected(self):
+        with mock.patch('apps.nextcrm.live.REAUTH_SECONDS', 0.05):
+            client = FakeClient(self.token).open()
+            await asyncio.sleep(0.3)
+            self.assertFalse(client.task.done())
+            client.disconnect()
+            await client.task
+        self.assertNotIn(b'unauthorized', client.body)
+
+    async def test_closed_when_token_expires(self):
+        token = AccessToken.for_user(self.user)
+        token.set_exp(lifetime=timedelta(seconds=1))
+        client = FakeClient(str(token)).open()
+        await wait_until(lambda: b': connected' in client.body)
+        await asyncio.wait_for(client.task, 5)
+        self.assertIn(b'event: unauthorized', client.body)
+
+
+class LiveEventsLoadTests(TransactionTestCase):
+    connections = 1000
+
+    def setUp(self):
+        self.token = str(AccessToken.for_user(make_user()))
+
+    async def test_idle_connections(self):
+        clients = [FakeClient(self.token).open() for _ in range(self.connections)]
+        await wait_until(lambda: live.broadcaster.connections == self.connections, timeout=60)
+        self.assertTrue(all(client.status == 200 for client in clients))
+
+        live.publish('note', {'id': 1})
+        await wait_until(lambda: all(b'event: note' in client.body for client in clients))
+
+        for client in clients:
+            client.disconnect()
+        await asyncio.wait_for(asyncio.gather(*(client.task for client in clients)), 30)
+        self.assertEqual(live.broadcaster.connections, 0)
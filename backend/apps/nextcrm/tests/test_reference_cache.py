@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from apps.nextcrm.models import Currency
+from .helpers import authenticate, make_user
+
+URL = '/api/nextcrm/currencies/'
+
+
+class ReferenceDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authenticate(self.client, make_user())
+        self.usd = Currency.objects.create(currency_code='USD', currency_name='US Dollar')
+        self.eur = Currency.objects.create(currency_code='EUR', currency_name='Euro')
+        # Everything last changed an hour ago
+        self.an_hour_ago = time.time() - 3600
+        Currency.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        cache.clear()
+
+    def first_response(self):
+        with mock.patch('apps.nextcrm.reference_cache.time.time', return_value=self.an_hour_ago):
+            response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_etag_revalidation(self):
+        etag = self.first_response()['ETag']
+        self.assertEqual(self.client.get(URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.eur.delete()
+        self.assertEqual(self.client.get(URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_unchanged(self):
+        last_modified = self.first_response()['Last-Modified']
+        self.assertEqual(self.client.get(URL, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_if_modified_since_after_hard_delete(self):
+        last_modified = self.first_response()['Last-Modified']
+        # Deleting leaves max(updated_at) where it was
+        self.eur.delete()
+        response = self.client.get(URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'EUR', response.content)
+        self.assertEqual(self.client.get(URL, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from apps.nextcrm.models import Commodity, Contract, Counterparty, Sociedad
+from apps.nextcrm.search import IndexedSearchFilter
+from apps.nextcrm.views import ContractViewSet, CounterpartyViewSet, SociedadViewSet
+from .helpers import make_contract, make_counterparty
+
+
+def search_request(term):
+    return Request(APIRequestFactory().get('/', {'search': term}))
+
+
+class IndexedSearchFilterTests(TestCase):
+    terms = ['acme', 'ACME grain', 'wheat', 'cont-', 'Borealis Barley', 'rotterdam', 'gb', 'nothing-matches']
+
+    def setUp(self):
+        acme = make_counterparty('Acme Grain', city='Rotterdam')
+        borealis = make_counterparty('Borealis Corp', city='Oslo')
+        make_contract(acme)
+        make_contract(borealis)
+        make_contract(borealis, commodity=Commodity.objects.get(pk=make_contract(acme).commodity_id))
+        barley = make_contract(borealis).commodity
+        barley.commodity_name_short = 'Barley'
+        barley.save()
+        Sociedad.objects.create(sociedad_name='Acme Holdings', tax_id='GB123', city='London', country='UK')
+        Sociedad.objects.create(sociedad_name='Nordic Trading', tax_id='NO456', city='Oslo', country='Norway')
+
+    def indexed(self, view, term):
+        view = view()
+        queryset = view.queryset if view.queryset is not None else view.get_queryset()
+        with mock.patch('apps.nextcrm.search.has_search_index', return_value=True):
+            with CaptureQueriesContext(connection) as queries:
+                ids = set(IndexedSearchFilter().filter_queryset(search_request(term), queryset, view).values_list('pk', flat=True))
+        self.assertIn('"search_text" LIKE', queries[0]['sql'])
+        return ids
+
+    def stock(self, view, term):
+        view = view()
+        queryset = view.queryset if view.queryset is not None else view.get_queryset()
+        return set(filters.SearchFilter().filter_queryset(search_request(term), queryset, view).values_list('pk', flat=True))
+
+    def test_matches_stock_filter(self):
+        for view in (ContractViewSet, CounterpartyViewSet, SociedadViewSet):
+            for term in self.terms:
+                with self.subTest(view=view.__name__, term=term):
+                    self.assertEqual(self.indexed(view, term), self.stock(view, term))
+
+    def test_terms_are_anded(self):
+        self.assertEqual(len(self.indexed(ContractViewSet, 'borealis')), 3)
+        self.assertEqual(len(self.indexed(ContractViewSet, 'borealis barley')), 1)
+
+    def test_falls_back_without_index(self):
+        view = ContractViewSet()
+        with CaptureQueriesContext(connection) as queries:
+            list(IndexedSearchFilter().filter_queryset(search_request('acme'), view.get_queryset(), view))
+        self.assertNotIn('"search_text" LIKE', queries[0]['sql'])
+
+
+class SearchTextTests(TestCase):
+    def setUp(self):
+        self.counterparty = make_counterparty('Acme Grain')
+        self.contract = make_contract(self.counterparty)
+
+    def search_text(self):
+        return Contract.objects.get(pk=self.contract.pk).search_text
+
+    def test_counterparty_rename(self):
+        counterparty = Counterparty.objects.get(pk=self.counterparty.pk)
+        counterparty.counterparty_name = 'Zenith Trading'
+        counterparty.save()
+        self.assertIn('\nzenith trading\n', self.search_text())
+        self.assertNotIn('acme', self.search_text())
+
+    def test_commodity_rename(self):
+        commodity = Commodity.objects.get(pk=self.contract.commodity_id)
+        commodity.commodity_name_short = 'Barley'
+        commodity.save()
+        self.assertTrue(self.search_text().endswith('\nbarley'))
+
+    def test_unrelated_save_skips_related_lookups(self):
+        contract = Contract.objects.get(pk=self.contract.pk)
+        contract.notes = 'Revised'
+        with CaptureQueriesContext(connection) as queries:
+            contract.save()
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('UPDATE'))
+
+    def test_counterparty_change_rebuilds(self):
+        contract = Contract.objects.get(pk=self.contract.pk)
+        contract.counterparty_id = make_counterparty('Delta Feeds').pk
+        contract.save()
+        self.assertIn('\ndelta feeds\n', self.search_text())
+
+    def test_build_search_index_backfills(self):
+        Contract.objects.filter(pk=self.contract.pk).update(search_text='')
+        out = StringIO()
+        call_command('build_search_index', stdout=out)
+        self.assertIn('nextcrm.Contract: refreshed search_text on 1 rows', out.getvalue())
+        self.assertIn('\nacme grain\n', self.search_text())
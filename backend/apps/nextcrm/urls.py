@@ -18,4 +18,8 @@ router.register(r'contract-amendments', views.ContractAmendmentViewSet, basename
 urlpatterns = [
     path('', include(router.urls)),
     path('search/', views.search_global, name='global_search'),
+    path('autocomplete/', views.autocomplete_lookup, name='autocomplete'),
+    path('bootstrap/', views.bootstrap, name='bootstrap'),
+    path('changes/', views.change_feed, name='change_feed'),
+    path('changes/<str:resource>/', views.change_feed, name='change_feed_resource'),
 ]
\ No newline at end of file
@@ -2,8 +2,11 @@ from rest_framework import generics, viewsets, status, filters
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
+from django.http import HttpResponse
 from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from datetime import datetime, timedelta
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
@@ -17,12 +20,39 @@ from .serializers import (
     ContractListSerializer, ContractDetailSerializer, ContractCreateUpdateSerializer,
     ContractAmendmentSerializer, DashboardStatsSerializer
 )
+from apps.authentication.models import AuditLog
+from apps.authentication.serializers import AuditLogSerializer
 from apps.authentication.utils import log_audit_event
+from .autocomplete import ENTITIES as AUTOCOMPLETE_ENTITIES, autocomplete
+from .search import IndexedSearchFilter
+from .reference_cache import ReferenceDataCacheMixin, get_versions
+from .coalescing import DASHBOARD_CACHE_TIMEOUT, CoalescedListMixin, coalesce
+from .exports import EXPORT_FORMATS, export_rows, streaming_response
+from .bootstrap import (
+    BOOTSTRAP_ENTITIES, build_payload, changed_entities, current_versions,
+    parse_version_token, version_token
+)
+from .changes import (
+    FEEDS as CHANGE_FEEDS, InvalidCursor, ResyncRequired, MAX_PAGE_SIZE as CHANGES_MAX_PAGE_SIZE,
+    PAGE_SIZE as CHANGES_PAGE_SIZE, decode_cursor, encode_cursor, read_changes
+)
+
 
+class AuditHistoryPagination(CursorPagination):
+    """
+    Keyset pagination over the (model_name, object_id, timestamp) index; id
+    breaks timestamp ties so the cursor never skips or repeats a row
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
-class CostCenterViewSet(viewsets.ModelViewSet):
+
+class CostCenterViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Cost_Center.objects.filter(is_active=True)
     serializer_class = CostCenterSerializer
+    cache_models = (Cost_Center,)
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['cost_center_name', 'description']
@@ -30,19 +60,21 @@ class CostCenterViewSet(viewsets.ModelViewSet):
     ordering = ['cost_center_name']
 
 
-class SociedadViewSet(viewsets.ModelViewSet):
+class SociedadViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Sociedad.objects.filter(is_active=True)
     serializer_class = SociedadSerializer
+    cache_models = (Sociedad,)
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [IndexedSearchFilter, filters.OrderingFilter]
     search_fields = ['sociedad_name', 'tax_id', 'city', 'country']
     ordering_fields = ['sociedad_name', 'created_at']
     ordering = ['sociedad_name']
 
 
-class TraderViewSet(viewsets.ModelViewSet):
+class TraderViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Trader.objects.filter(is_active=True)
     serializer_class = TraderSerializer
+    cache_models = (Trader,)
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['trader_name', 'email', 'employee_id']
@@ -50,9 +82,11 @@ class TraderViewSet(viewsets.ModelViewSet):
     ordering = ['trader_name']
 
 
-class CommodityGroupViewSet(viewsets.ModelViewSet):
+class CommodityGroupViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Commodity_Group.objects.filter(is_active=True)
     serializer_class = CommodityGroupSerializer
+    # commodities_count depends on commodities
+    cache_models = (Commodity_Group, Commodity)
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['commodity_group_name', 'description']
@@ -60,9 +94,11 @@ class CommodityGroupViewSet(viewsets.ModelViewSet):
     ordering = ['sort_order', 'commodity_group_name']
 
 
-class CommodityTypeViewSet(viewsets.ModelViewSet):
+class CommodityTypeViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Commodity_Type.objects.filter(is_active=True)
     serializer_class = CommodityTypeSerializer
+    # commodities_count depends on commodities
+    cache_models = (Commodity_Type, Commodity)
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['commodity_type_name', 'description']
@@ -70,9 +106,11 @@ class CommodityTypeViewSet(viewsets.ModelViewSet):
     ordering = ['sort_order', 'commodity_type_name']
 
 
-class CommodityViewSet(viewsets.ModelViewSet):
+class CommodityViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Commodity.objects.filter(is_active=True).select_related('commodity_group', 'commodity_type')
     serializer_class = CommoditySerializer
+    # active_contracts_count depends on contract status
+    cache_models = (Commodity, Commodity_Group, Commodity_Type, Contract)
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['commodity_group', 'commodity_type']
@@ -81,11 +119,11 @@ class CommodityViewSet(viewsets.ModelViewSet):
     ordering = ['commodity_name_short']
 
 
-class CounterpartyViewSet(viewsets.ModelViewSet):
+class CounterpartyViewSet(CoalescedListMixin, viewsets.ModelViewSet):
     queryset = Counterparty.objects.filter(is_active=True)
     serializer_class = CounterpartySerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['counterparty_type', 'country', 'credit_rating']
     search_fields = ['counterparty_name', 'counterparty_code', 'city']
     ordering_fields = ['counterparty_name', 'created_at']
@@ -97,12 +135,13 @@ class CounterpartyViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         instance = serializer.save()
-        log_audit_event(self.request, 'UPDATE', 'Counterparty', instance.id, str(instance))
+        log_audit_event(self.request, 'UPDATE', 'Counterparty', instance.id, str(instance), instance.last_changes)
 
 
-class CurrencyViewSet(viewsets.ModelViewSet):
+class CurrencyViewSet(ReferenceDataCacheMixin, viewsets.ModelViewSet):
     queryset = Currency.objects.filter(is_active=True)
     serializer_class = CurrencySerializer
+    cache_models = (Currency,)
     permission_classes = [IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['currency_code', 'currency_name']
@@ -120,9 +159,9 @@ class ExchangeRateViewSet(viewsets.ModelViewSet):
     ordering = ['-rate_date']
 
 
-class ContractViewSet(viewsets.ModelViewSet):
+class ContractViewSet(CoalescedListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'trader', 'counterparty', 'commodity__commodity_group', 'contract_date']
     search_fields = ['contract_number', 'counterparty__counterparty_name', 'commodity__commodity_name_short']
     ordering_fields = ['contract_date', 'total_value', 'delivery_period_start', 'created_at']
@@ -147,7 +186,7 @@ class ContractViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         instance = serializer.save()
-        log_audit_event(self.request, 'UPDATE', 'Contract', str(instance.id), str(instance))
+        log_audit_event(self.request, 'UPDATE', 'Contract', str(instance.id), str(instance), instance.last_changes)
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -163,7 +202,7 @@ class ContractViewSet(viewsets.ModelViewSet):
         contract.approved_by = request.user
         contract.save()
         
-        log_audit_event(request, 'UPDATE', 'Contract', str(contract.id), f'Contract approved: {contract}')
+        log_audit_event(request, 'UPDATE', 'Contract', str(contract.id), f'Contract approved: {contract}', contract.last_changes)
         
         return Response({'message': 'Contract approved successfully'})
     
@@ -182,10 +221,49 @@ class ContractViewSet(viewsets.ModelViewSet):
             contract.notes = f"{contract.notes}\n\nCancelled: {reason}".strip()
         contract.save()
         
-        log_audit_event(request, 'UPDATE', 'Contract', str(contract.id), f'Contract cancelled: {contract}')
+        log_audit_event(request, 'UPDATE', 'Contract', str(contract.id), f'Contract cancelled: {contract}', contract.last_changes)
         
         return Response({'message': 'Contract cancelled successfully'})
     
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        contract = self.get_object()
+        queryset = AuditLog.objects.filter(
+            model_name='Contract', object_id=str(contract.id)
+        ).select_related('user')
+        
+        paginator = AuditHistoryPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = AuditLogSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Every contract matching the list filters, streamed as CSV or XLSX
+        (?file_format=, since ?format= picks the API renderer)
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported export format. Use one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        writer, content_type, extension = EXPORT_FORMATS[file_format]
+
+        queryset = self.filter_queryset(Contract.objects.all())
+        response = streaming_response(request, writer(export_rows(queryset)), content_type)
+        filename = f"contracts-{timezone.now():%Y%m%d-%H%M%S}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+
+        filters_used = {key: request.query_params.getlist(key) for key in request.query_params if key != 'file_format'}
+        log_audit_event(
+            request, 'EXPORT', 'Contract', object_repr=f'Contract export ({file_format})',
+            changes={'format': file_format, 'filters': filters_used}
+        )
+        return response
+
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         stats = get_dashboard_statistics()
@@ -221,11 +299,17 @@ class ContractAmendmentViewSet(viewsets.ModelViewSet):
         amendment.approval_date = timezone.now()
         amendment.save()
         
-        log_audit_event(request, 'UPDATE', 'ContractAmendment', amendment.id, f'Amendment approved: {amendment}')
+        log_audit_event(request, 'UPDATE', 'ContractAmendment', amendment.id, f'Amendment approved: {amendment}', amendment.last_changes)
         
         return Response({'message': 'Amendment approved successfully'})
 
 
+# Every tab asks for this at once when the cached copy expires, so concurrent
+# calls share one computation and one worker fills the cache for the rest
+@coalesce(
+    cache_timeout=DASHBOARD_CACHE_TIMEOUT, lock=True,
+    version=lambda: get_versions((Contract, Counterparty, Commodity)),
+)
 def get_dashboard_statistics():
     """Calculate dashboard statistics"""
     now = timezone.now()
@@ -431,4 +515,106 @@ def search_global(request):
             'department': trader.department
         })
     
-    return Response(results)
\ No newline at end of file
+    return Response(results)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def autocomplete_lookup(request):
+    """Typeahead lookup served from the in-memory prefix indexes"""
+    query = request.GET.get('q', '').strip()
+    entity_types = request.GET.get('type')
+    entity_types = entity_types.split(',') if entity_types else list(AUTOCOMPLETE_ENTITIES)
+
+    unknown = [entity for entity in entity_types if entity not in AUTOCOMPLETE_ENTITIES]
+    if unknown:
+        return Response({'error': f"Unknown type: {', '.join(unknown)}"}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    return Response({
+        entity: autocomplete(entity, query, limit=limit) if query else []
+        for entity in entity_types
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bootstrap(request):
+    """
+    All active reference data in one payload, tagged with a version token.
+    With ?since=<token> only the entity lists that changed are returned.
+    """
+    versions = current_versions()
+    etag = f'"{version_token(versions)}"'
+
+    # Handles lists, weak validators and * the way Django's ConditionalGetMiddleware does
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+
+    names = list(BOOTSTRAP_ENTITIES)
+    since = parse_version_token(request.GET.get('since'))
+    if since is not None:
+        names = changed_entities(versions, since)
+
+    response = HttpResponse(build_payload(versions, names), content_type='application/json')
+    if since is None:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request, resource=None):
+    """
+    Records created or updated since ?cursor=, plus tombstones for rows that
+    were deactivated or deleted. Without a resource every feed is read, each
+    with its own position inside the one cursor. Keep calling with the
+    returned cursor until has_more is false.
+    """
+    if resource is not None and resource not in CHANGE_FEEDS:
+        return Response({'error': f'Unknown resource: {resource}'}, status=status.HTTP_404_NOT_FOUND)
+    resources = [resource] if resource else list(CHANGE_FEEDS)
+
+    try:
+        limit = min(int(request.GET.get('limit', CHANGES_PAGE_SIZE)), CHANGES_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = CHANGES_PAGE_SIZE
+    limit = max(limit, 1)
+
+    positions = {}
+    token = request.GET.get('cursor')
+    try:
+        if token:
+            positions = decode_cursor(token)
+            if resource:
+                positions = {resource: positions}
+
+        pages, next_positions = {}, {}
+        for name in resources:
+            pages[name], next_positions[name] = read_changes(name, positions.get(name), limit, request)
+    except InvalidCursor:
+        return Response({'error': 'Invalid cursor', 'code': 'INVALID_CURSOR'}, status=status.HTTP_400_BAD_REQUEST)
+    except ResyncRequired:
+        return Response({
+            'error': 'Cursor is older than the change feed retention. Please sync again from scratch.',
+            'code': 'RESYNC_REQUIRED'
+        }, status=status.HTTP_410_GONE)
+
+    if resource:
+        return Response({
+            'resource': resource,
+            **pages[resource],
+            'cursor': encode_cursor(next_positions[resource]),
+        })
+    return Response({
+        'resources': pages,
+        'cursor': encode_cursor(next_positions),
+        'has_more': any(page['has_more'] for page in pages.values()),
+    })
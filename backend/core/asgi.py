@@ -2,5 +2,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.production')
+# Login, register and password change run their password hashes on a bounded pool
+os.environ.setdefault('AUTH_ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported after setup: the live events app needs settings and the app registry
+from apps.nextcrm.live import EVENTS_PATH, live_events_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Long-lived SSE streams bypass the Django handler and its middleware
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await live_events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
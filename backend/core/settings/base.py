@@ -23,6 +23,7 @@ DJANGO_APPS = [
 THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_extensions',
 ]
@@ -30,6 +31,7 @@ THIRD_PARTY_APPS = [
 LOCAL_APPS = [
     'apps.authentication',
     'apps.nextcrm',
+    'apps.jobs',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -37,18 +39,24 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'apps.authentication.debug_middleware.CORSDebugMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'apps.authentication.middleware.CORSAuthMiddleware',
+    'apps.authentication.middleware.ResponseHeadersMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'apps.authentication.middleware.BrowserSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.authentication.middleware.BrowserCsrfViewMiddleware',
+    'apps.authentication.middleware.BrowserAuthenticationMiddleware',
     'apps.authentication.middleware.JWTCookieMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.authentication.middleware.AuditLogMiddleware',
+    'apps.authentication.middleware.BrowserMessageMiddleware',
 ]
 
+# 'lean' skips session, CSRF, session auth and messages middleware for
+# API_PATH_PREFIX requests, which authenticate with the JWT cookie instead.
+# 'full' runs the whole chain for every request.
+API_MIDDLEWARE_PROFILE = config('API_MIDDLEWARE_PROFILE', default='lean')
+API_PATH_PREFIX = '/api/'
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -81,6 +89,9 @@ DATABASES = {
     }
 }
 
+# Password checks go through apps.authentication.hashing so offloaded views hash on its pool
+AUTHENTICATION_BACKENDS = ['apps.authentication.hashing.HashingModelBackend']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -108,7 +119,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -144,6 +155,175 @@ SIMPLE_JWT = {
     'REFRESH_COOKIE_SAMESITE': 'Lax',
 }
 
+# Shared cache. Set REDIS_URL (e.g. redis://redis:6379/1) to use Redis; without it
+# each process gets its own locmem cache, which is fine for a single worker.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'nextcrm',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'nextcrm',
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Rendered reference-data list responses, see apps.nextcrm.reference_cache
+REFERENCE_CACHE = {
+    'TIMEOUT': config('REFERENCE_CACHE_TIMEOUT', default=3600, cast=int),
+}
+
+# Delta-sync change feed, see apps.nextcrm.changes
+CHANGE_FEED = {
+    'PAGE_SIZE': config('CHANGE_FEED_PAGE_SIZE', default=200, cast=int),
+    'MAX_PAGE_SIZE': 1000,
+    'SETTLE_SECONDS': config('CHANGE_FEED_SETTLE_SECONDS', default=5, cast=int),
+    'TOMBSTONE_RETENTION_DAYS': config('CHANGE_FEED_RETENTION_DAYS', default=30, cast=int),
+}
+
+# Server-sent events under ASGI, see apps.nextcrm.live. BUS is 'local'
+# (one worker) or 'redis' (needs REDIS_URL; reaches every worker)
+LIVE_EVENTS = {
+    'ENABLED': config('LIVE_EVENTS_ENABLED', default=True, cast=bool),
+    'PATH': '/api/nextcrm/events/',
+    'BUS': config('LIVE_EVENTS_BUS', default='redis' if REDIS_URL else 'local'),
+    'CHANNEL': 'nextcrm:live-events',
+    'HEARTBEAT_SECONDS': 15,
+    'RETRY_MILLISECONDS': 5000,
+    'REAUTH_SECONDS': 60,
+    'QUEUE_SIZE': 100,
+    'MAX_CONNECTIONS': config('LIVE_EVENTS_MAX_CONNECTIONS', default=2000, cast=int),
+    'DASHBOARD_DEBOUNCE_SECONDS': config('LIVE_EVENTS_DASHBOARD_DEBOUNCE', default=2.0, cast=float),
+}
+
+# Single-flight coalescing of expensive computations, see apps.nextcrm.coalescing
+REQUEST_COALESCING = {
+    'LOCK_TIMEOUT': 30,
+    'POLL_INTERVAL': 0.05,
+    'DASHBOARD_CACHE_TIMEOUT': config('DASHBOARD_CACHE_TIMEOUT', default=60, cast=int),
+}
+
+# Parquet/Arrow snapshots for analytics (needs pyarrow), see apps.nextcrm.columnar
+COLUMNAR_EXPORT = {
+    'BATCH_SIZE': config('COLUMNAR_EXPORT_BATCH_SIZE', default=50000, cast=int),
+}
+
+# Streaming contract export, see apps.nextcrm.exports
+CONTRACT_EXPORT = {
+    'CHUNK_SIZE': config('CONTRACT_EXPORT_CHUNK_SIZE', default=2000, cast=int),
+    'FLUSH_BYTES': 64 * 1024,
+}
+
+# GDPR data export, see apps.authentication.data_export
+GDPR_EXPORT = {
+    'CHUNK_SIZE': 2000,
+    'INLINE_MAX_ROWS': config('GDPR_EXPORT_INLINE_MAX_ROWS', default=20000, cast=int),
+    'STORAGE_DIR': config('GDPR_EXPORT_DIR', default=str(BASE_DIR / 'var' / 'gdpr_exports')),
+    'TOKEN_MAX_AGE': config('GDPR_EXPORT_TOKEN_MAX_AGE', default=86400, cast=int),
+}
+
+# Database-backed background jobs, see apps.jobs.queue
+JOBS = {
+    'POLL_INTERVAL': config('JOBS_POLL_INTERVAL', default=2, cast=float),
+    'STALE_AFTER_SECONDS': 300,
+    'RETRY_BASE_DELAY': 30,
+    'RETRY_MAX_DELAY': 3600,
+    'MAX_ATTEMPTS': 3,
+    # job type -> jobs allowed to run at once, overriding the handler's default
+    'CONCURRENCY': {},
+    'RETENTION_DAYS': config('JOBS_RETENTION_DAYS', default=14, cast=int),
+}
+
+# Per-worker cache of authenticated users, see apps.authentication.user_cache
+AUTH_USER_CACHE = {
+    'MAX_SIZE': config('AUTH_USER_CACHE_SIZE', default=1024, cast=int),
+    'TTL': config('AUTH_USER_CACHE_TTL', default=60, cast=int),
+}
+
+# Batched audit log writer, see apps.authentication.audit
+AUDIT_LOG = {
+    'MODE': config('AUDIT_LOG_MODE', default='async'),  # 'async' or 'sync'
+    'QUEUE_SIZE': config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int),
+    'BATCH_SIZE': config('AUDIT_LOG_BATCH_SIZE', default=200, cast=int),
+    'FLUSH_INTERVAL': config('AUDIT_LOG_FLUSH_INTERVAL', default=2.0, cast=float),
+    'ON_FULL': config('AUDIT_LOG_ON_FULL', default='inline'),  # 'block', 'drop' or 'inline'
+    'STATS_INTERVAL': config('AUDIT_LOG_STATS_INTERVAL', default=300.0, cast=float),  # seconds, 0 disables
+}
+
+# Interned User-Agent strings, see apps.authentication.utils
+USER_AGENTS = {
+    'CACHE_SIZE': config('USER_AGENT_CACHE_SIZE', default=2048, cast=int),
+}
+
+# Retention for AuditLog and LoginAttempt, see apps.authentication.retention
+AUDIT_RETENTION = {
+    'AUDIT_LOG_DAYS': config('AUDIT_LOG_RETENTION_DAYS', default=365, cast=int),
+    'LOGIN_ATTEMPT_DAYS': config('LOGIN_ATTEMPT_RETENTION_DAYS', default=90, cast=int),
+    'ARCHIVE_DIR': config('AUDIT_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive')),
+}
+
+# GDPR erasure and PII retention sweep, see apps.authentication.erasure
+GDPR_ERASURE = {
+    'CHUNK_SIZE': config('GDPR_ERASURE_CHUNK_SIZE', default=5000, cast=int),
+    'STALE_AFTER_MINUTES': 10,
+    'IP_RETENTION_DAYS': config('IP_RETENTION_DAYS', default=90, cast=int),
+}
+
+# Off-thread password hashing for ASGI, see apps.authentication.hashing
+PASSWORD_HASHING = {
+    'ASYNC_VIEWS': config('AUTH_ASYNC_VIEWS', default=False, cast=bool),
+    'MAX_WORKERS': config('PASSWORD_HASHING_WORKERS', default=4, cast=int),
+    'MAX_PENDING': config('PASSWORD_HASHING_MAX_PENDING', default=64, cast=int),
+}
+
+# Bloom-filter fast path for refresh token blacklist checks, see apps.authentication.tokens.
+# Only used with a shared cache (REDIS_URL); with locmem every check queries the database.
+# Off by default: with ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh
+# blacklists a token, so the next check in each worker pays a catch-up query anyway.
+# Measure with `manage.py benchmark_token_blacklist` before turning it on.
+TOKEN_BLACKLIST = {
+    'FAST_PATH': config('TOKEN_BLACKLIST_FAST_PATH', default=False, cast=bool),
+    'CAPACITY': config('TOKEN_BLACKLIST_CAPACITY', default=1000000, cast=int),
+    'ERROR_RATE': config('TOKEN_BLACKLIST_ERROR_RATE', default=0.001, cast=float),
+    'REBUILD_INTERVAL': config('TOKEN_BLACKLIST_REBUILD_INTERVAL', default=3600, cast=int),
+}
+
+# Cache-backed failed-login counters, see apps.authentication.throttling
+LOGIN_THROTTLE = {
+    'MAX_FAILURES': config('LOGIN_MAX_FAILURES', default=5, cast=int),
+    'LOCKOUT_SECONDS': config('LOGIN_LOCKOUT_SECONDS', default=1800, cast=int),
+    'IP_MAX_FAILURES': config('LOGIN_IP_MAX_FAILURES', default=20, cast=int),
+    'IP_WINDOW_SECONDS': config('LOGIN_IP_WINDOW_SECONDS', default=300, cast=int),
+}
+
+# Per-IP sliding-window limits for token refresh and registration
+RATE_LIMITS = {
+    'REFRESH_MAX_FAILURES': config('REFRESH_MAX_FAILURES', default=5, cast=int),
+    'REFRESH_WINDOW_SECONDS': config('REFRESH_WINDOW_SECONDS', default=300, cast=int),
+    'REGISTER_MAX_ATTEMPTS': config('REGISTER_MAX_ATTEMPTS', default=10, cast=int),
+    'REGISTER_WINDOW_SECONDS': config('REGISTER_WINDOW_SECONDS', default=3600, cast=int),
+}
+
+# Sampled CORS/JWT request diagnostics, see apps.authentication.debug_middleware
+CORS_DEBUG = {
+    'ENABLED': config('CORS_DEBUG', default=False, cast=bool),
+    'SAMPLE_RATE': config('CORS_DEBUG_SAMPLE_RATE', default=1.0, cast=float),
+    'PATH_SAMPLE_RATES': {},  # path prefix -> sample rate, e.g. {'/api/auth/': 1.0, '/api/': 0.1}
+    'MAX_TRACKED_KEYS': 1024,
+    'MAX_REPEATS': 3,
+    'TIME_WINDOW': 60,
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "https://localhost:3000",
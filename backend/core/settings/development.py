@@ -13,6 +13,8 @@ DATABASES = {
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+CORS_DEBUG['ENABLED'] = config('CORS_DEBUG', default=True, cast=bool)
+
 # Additional CORS settings for development
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -37,6 +39,9 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'apps.authentication.log_handlers.JSONFormatter',
+        },
     },
     'filters': {
         'auth_filter': {
@@ -44,9 +49,11 @@ LOGGING = {
         },
     },
     'handlers': {
+        # Formats and writes on a background thread, see apps.authentication.log_handlers
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'detailed',
+            '()': 'apps.authentication.log_handlers.QueuedStreamHandler',
+            'queue_size': config('LOG_QUEUE_SIZE', default=10000, cast=int),
+            'formatter': config('LOG_FORMAT', default='detailed'),  # 'detailed', 'simple' or 'json'
             'filters': ['auth_filter'],
         },
     },
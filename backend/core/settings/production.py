@@ -22,19 +22,35 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'apps.authentication.log_handlers.JSONFormatter',
+        },
+    },
+    'filters': {
+        'auth_filter': {
+            '()': 'apps.authentication.log_filters.AuthenticationLogFilter',
+        },
     },
     'handlers': {
+        # Formats and writes on a background thread, see apps.authentication.log_handlers
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            '()': 'apps.authentication.log_handlers.QueuedStreamHandler',
+            'queue_size': config('LOG_QUEUE_SIZE', default=10000, cast=int),
+            'formatter': config('LOG_FORMAT', default='json'),  # 'json' or 'verbose'
+            'filters': ['auth_filter'],
         },
     },
     'loggers': {
         'django': {
             'handlers': ['console'],
-            'level': 'INFO',
+            'level': config('DJANGO_LOG_LEVEL', default='INFO'),
             'propagate': True,
         },
+        'apps': {
+            'handlers': ['console'],
+            'level': config('APP_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
     },
-}
\ No newline at end of file
+}
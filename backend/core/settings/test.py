@@ -0,0 +1,9 @@
+from .development import *
+
+# Audit entries are written inline: the batched writer's thread would
+# otherwise flush after the test database is gone
+AUDIT_LOG['MODE'] = 'sync'
+
+CORS_DEBUG['ENABLED'] = False
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
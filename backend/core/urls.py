@@ -5,4 +5,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('apps.authentication.urls')),
     path('api/nextcrm/', include('apps.nextcrm.urls')),
+    path('api/jobs/', include('apps.jobs.urls')),
 ]
\ No newline at end of file